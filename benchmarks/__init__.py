@@ -0,0 +1,4 @@
+"""Бенчмарки конвертера на синтетических данных.
+
+Запуск: ``python -m benchmarks.<модуль> --help``.
+"""
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+from benchmarks.synthetic import LAYOUTS, alupro_rows, as_text_rows
+from sibglass_app.repositories.excel_repository import ExcelRepository
+from sibglass_app.services.alupro_parser import AluProParserService
+
+
+def run(rows_count: int, repeat: int) -> None:
+    parser = AluProParserService(ExcelRepository())
+    for name in LAYOUTS:
+        rows = as_text_rows(alupro_rows(name, rows_count))
+        best = float("inf")
+        items = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            items = len(parser.parse_rows(iter(rows)))
+            best = min(best, time.perf_counter() - started)
+        print(f"{name:9} rows={rows_count:>7} items={items:>7} best={best:.3f}s {rows_count / best:,.0f} rows/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Скорость разбора строк AluPro без чтения Excel")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
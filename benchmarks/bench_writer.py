@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+from benchmarks.synthetic import build_items, build_template
+from sibglass_app.services.sibglass_writer import SibglassWriterService
+
+
+def run(items_count: int, modes: list[str], repeat: int) -> None:
+    items = build_items(items_count)
+    for mode in modes:
+        writer = SibglassWriterService(cached_styles=(mode == "cached"))
+        best = float("inf")
+        for _ in range(repeat):
+            workbook = build_template()
+            started = time.perf_counter()
+            writer.write(workbook, "Заказчик", "Адрес", items)
+            best = min(best, time.perf_counter() - started)
+        print(f"styles={mode:7} items={items_count:>7} best={best:.3f}s {items_count / best:,.0f} rows/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Скорость записи заявки СибГласс (без сохранения файла)")
+    parser.add_argument("--items", type=int, default=5_000)
+    parser.add_argument("--styles", choices=["cached", "direct", "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    modes = ["direct", "cached"] if args.styles == "both" else [args.styles]
+    run(args.items, modes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
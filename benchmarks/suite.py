@@ -0,0 +1,367 @@
+"""Набор сценариев на синтетических данных со сравнением с сохраненной базой.
+
+Запуск: ``python -m benchmarks.suite`` — код возврата 1, если какой-либо сценарий
+стал медленнее (или прожорливее) базы больше чем на порог.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+from benchmarks.synthetic import LAYOUT_FALLBACK, LAYOUTS, build_items, raw_formulas, write_alupro_export, write_template
+from sibglass_app.services.metrics_service import peak_rss_bytes
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_ROWS = (1_000, 10_000)
+MIN_SAMPLE_SECONDS = 0.2
+
+_MB = 1024 * 1024
+_CALIBRATION_PATTERN = re.compile(r"\d+")
+# Параметры сборки формул — как у типичного заказа с энергосбережением и аргоном
+_BUILD_OPTIONS = dict(
+    outer_glass="М1",
+    middle_glass="М1",
+    inner_glass="И4",
+    spacer="Al",
+    zak_outer=True,
+    zak_middle=False,
+    zak_inner=False,
+    argon=True,
+)
+
+
+@dataclass
+class Scenario:
+    name: str
+    # Объем работы одного прогона: строки выгрузки, формулы или позиции заявки
+    units: int
+    # Подготовка не входит в замер: новый экземпляр сервиса, открытый шаблон и т. п.
+    setup: Callable[[], Any]
+    run: Callable[[Any], object]
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    units: int
+    best_seconds: float
+    median_seconds: float
+    # Время эталонной нагрузки, замеренное рядом со сценарием: сравнение с базой идет
+    # в этих единицах, поэтому база переносима между машинами и меньше зависит от фоновой нагрузки
+    calibration_seconds: float
+    peak_alloc_mb: float | None = None
+
+    @property
+    def relative_time(self) -> float:
+        return self.best_seconds / self.calibration_seconds
+
+    @property
+    def throughput(self) -> float:
+        return self.units / self.best_seconds if self.best_seconds else 0.0
+
+
+@dataclass
+class Comparison:
+    name: str
+    time_ratio: float | None
+    memory_ratio: float | None
+    status: str
+
+
+def parse_scenarios(data_dir: Path, rows: list[int], sheets: int) -> list[Scenario]:
+    from sibglass_app.repositories.excel_repository import ExcelRepository
+    from sibglass_app.services.alupro_parser import AluProParserService
+
+    def parser() -> AluProParserService:
+        # Новый репозиторий на каждый прогон: иначе результат берется из кэша книг
+        return AluProParserService(ExcelRepository())
+
+    variants = [(layout, 1) for layout in LAYOUTS]
+    if sheets > 1:
+        variants.append((LAYOUT_FALLBACK, sheets))
+
+    scenarios = []
+    for count in rows:
+        for layout, sheet_count in variants:
+            path = _cached_file(
+                data_dir / f"alupro_{layout}_{count}_s{sheet_count}.xlsx",
+                lambda target, layout=layout, count=count, sheet_count=sheet_count: write_alupro_export(
+                    target, layout, count, sheets=sheet_count
+                ),
+            )
+            suffix = f":{sheet_count}sheets" if sheet_count > 1 else ""
+            scenarios.append(
+                Scenario(
+                    name=f"parse:{layout}{suffix}:{count}",
+                    units=count,
+                    setup=parser,
+                    run=lambda service, path=str(path): service.parse(path),
+                )
+            )
+    return scenarios
+
+
+def build_scenarios(rows: list[int]) -> list[Scenario]:
+    from sibglass_app.services.formula_builder import FormulaBuilderService
+
+    def run(builder: FormulaBuilderService, formulas: list[str]) -> None:
+        for formula in formulas:
+            builder.build(formula, **_BUILD_OPTIONS)
+
+    scenarios = []
+    for count in rows:
+        formulas = raw_formulas(count)
+        # Пустой кэш сборщика — как при первой загрузке выгрузки
+        scenarios.append(
+            Scenario(
+                name=f"build:{count}",
+                units=count,
+                setup=FormulaBuilderService,
+                run=lambda builder, formulas=formulas: run(builder, formulas),
+            )
+        )
+    return scenarios
+
+
+def write_scenarios(data_dir: Path, rows: list[int], footer_rows: int) -> list[Scenario]:
+    from openpyxl import load_workbook
+
+    from sibglass_app.services.save_service import AtomicSaveService
+    from sibglass_app.services.sibglass_writer import SibglassWriterService
+    from sibglass_app.services.xlsx_stream_writer import XlsxStreamWriter
+
+    template = _cached_file(
+        data_dir / f"template_footer{footer_rows}.xlsx",
+        lambda target: write_template(target, footer_rows=footer_rows, merges_per_row=4),
+    )
+    output = str(data_dir / "output.xlsx")
+    # Без fsync: замеряется работа конвертера, а не задержка диска
+    save_service = AtomicSaveService(fsync=False)
+    writer = SibglassWriterService()
+    stream_writer = XlsxStreamWriter(save_service)
+
+    def write_openpyxl(workbook, items) -> None:
+        writer.write(workbook, "Заказчик", "Адрес", items)
+        save_service.save_workbook(workbook, output)
+
+    def write_stream(items) -> None:
+        stream_writer.write_file(str(template), output, customer="Заказчик", address="Адрес", items=items)
+
+    scenarios = []
+    for count in rows:
+        items = build_items(count)
+        scenarios.append(
+            Scenario(
+                name=f"write:openpyxl:{count}",
+                units=count,
+                setup=lambda: load_workbook(template),
+                run=lambda workbook, items=items: write_openpyxl(workbook, items),
+            )
+        )
+        scenarios.append(
+            Scenario(
+                name=f"write:stream:{count}",
+                units=count,
+                setup=lambda: None,
+                run=lambda _state, items=items: write_stream(items),
+            )
+        )
+    return scenarios
+
+
+def _cached_file(path: Path, generate: Callable[[Path], object]) -> Path:
+    # Сгенерированные файлы переиспользуются между запусками с одним --data-dir
+    if not path.exists():
+        generate(path)
+    return path
+
+
+def _calibration_workload() -> None:
+    # Строки, словарь и регулярные выражения — то же, чем заняты разбор и запись
+    seen: dict[str, int] = {}
+    for i in range(60_000):
+        text = f"{i % 97}-{i % 31}-{i % 89} мм".casefold()
+        seen[text] = seen.get(text, 0) + len(_CALIBRATION_PATTERN.findall(text))
+
+
+def calibrate(repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _calibration_workload()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def measure(scenario: Scenario, repeat: int, memory: bool) -> ScenarioResult:
+    calibration = calibrate(repeat)
+    timings = []
+    for _ in range(repeat):
+        # Быстрые сценарии повторяются внутри замера, пока он не наберет MIN_SAMPLE_SECONDS:
+        # иначе шум таймера и планировщика сравним с самим временем
+        elapsed, runs = 0.0, 0
+        while elapsed < MIN_SAMPLE_SECONDS:
+            state = scenario.setup()
+            started = time.perf_counter()
+            scenario.run(state)
+            elapsed += time.perf_counter() - started
+            runs += 1
+        timings.append(elapsed / runs)
+
+    peak_alloc_mb = None
+    if memory:
+        # Отдельный прогон: tracemalloc заметно замедляет код и исказил бы время
+        state = scenario.setup()
+        tracemalloc.start()
+        try:
+            scenario.run(state)
+            peak_alloc_mb = round(tracemalloc.get_traced_memory()[1] / _MB, 2)
+        finally:
+            tracemalloc.stop()
+
+    return ScenarioResult(
+        name=scenario.name,
+        units=scenario.units,
+        best_seconds=min(timings),
+        median_seconds=statistics.median(timings),
+        calibration_seconds=min(calibration, calibrate(repeat)),
+        peak_alloc_mb=peak_alloc_mb,
+    )
+
+
+def load_baseline(path: Path) -> dict[str, dict[str, Any]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8")).get("scenarios", {})
+
+
+def save_baseline(path: Path, results: list[ScenarioResult]) -> None:
+    # Сценарии, которые в этот раз не запускались, остаются в базе
+    scenarios = load_baseline(path)
+    for result in results:
+        record = asdict(result)
+        del record["name"]
+        record["best_seconds"] = round(result.best_seconds, 5)
+        record["median_seconds"] = round(result.median_seconds, 5)
+        record["calibration_seconds"] = round(result.calibration_seconds, 5)
+        scenarios[result.name] = record
+    payload = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": dict(sorted(scenarios.items())),
+    }
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def compare(results: list[ScenarioResult], baseline: dict[str, dict[str, Any]], threshold: float) -> list[Comparison]:
+    comparisons = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None:
+            comparisons.append(Comparison(result.name, None, None, "нет в базе"))
+            continue
+        time_ratio = None
+        if base.get("best_seconds") and base.get("calibration_seconds"):
+            time_ratio = result.relative_time / (base["best_seconds"] / base["calibration_seconds"])
+        memory_ratio = None
+        if result.peak_alloc_mb is not None and base.get("peak_alloc_mb"):
+            memory_ratio = result.peak_alloc_mb / base["peak_alloc_mb"]
+
+        ratios = [ratio for ratio in (time_ratio, memory_ratio) if ratio is not None]
+        if any(ratio > 1 + threshold for ratio in ratios):
+            status = "РЕГРЕССИЯ"
+        elif time_ratio is not None and time_ratio < 1 / (1 + threshold):
+            status = "быстрее"
+        else:
+            status = "в пределах порога"
+        comparisons.append(Comparison(result.name, time_ratio, memory_ratio, status))
+    return comparisons
+
+
+def format_report(results: list[ScenarioResult], comparisons: list[Comparison]) -> str:
+    lines = [
+        f"{'сценарий':<30} {'объем':>7} {'лучшее, с':>10} {'медиана, с':>11} {'ед./с':>11} {'память, МБ':>11}"
+        f" {'время/база':>11} {'память/база':>12}  итог"
+    ]
+    for result, comparison in zip(results, comparisons):
+        memory = f"{result.peak_alloc_mb:.1f}" if result.peak_alloc_mb is not None else "—"
+        time_ratio = f"{comparison.time_ratio:.2f}" if comparison.time_ratio is not None else "—"
+        memory_ratio = f"{comparison.memory_ratio:.2f}" if comparison.memory_ratio is not None else "—"
+        lines.append(
+            f"{result.name:<30} {result.units:>7} {result.best_seconds:>10.3f} {result.median_seconds:>11.3f}"
+            f" {result.throughput:>11,.0f} {memory:>11} {time_ratio:>11} {memory_ratio:>12}  {comparison.status}"
+        )
+    peak = peak_rss_bytes()
+    if peak is not None:
+        lines.append(f"Пиковый объем памяти процесса: {peak / _MB:.0f} МБ")
+    return "\n".join(lines)
+
+
+def run(args: argparse.Namespace, data_dir: Path) -> int:
+    scenarios = [
+        *parse_scenarios(data_dir, args.rows, args.sheets),
+        *build_scenarios(args.rows),
+        *write_scenarios(data_dir, args.rows, args.footer_rows),
+    ]
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if any(token in scenario.name for token in args.only)]
+    if not scenarios:
+        print("Нет сценариев, подходящих под --only", file=sys.stderr)
+        return 2
+
+    results = []
+    for scenario in scenarios:
+        print(f"... {scenario.name}", file=sys.stderr, flush=True)
+        results.append(measure(scenario, args.repeat, memory=not args.no_memory))
+
+    comparisons = compare(results, load_baseline(args.baseline), args.threshold)
+    print(format_report(results, comparisons))
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"База сохранена: {args.baseline}")
+        return 0
+
+    regressions = [comparison.name for comparison in comparisons if comparison.status == "РЕГРЕССИЯ"]
+    if regressions:
+        print(f"Регрессии больше {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Разбор, сборка формул и запись заявки на синтетических данных")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(DEFAULT_ROWS), help="Объемы выгрузки/заявки")
+    parser.add_argument("--sheets", type=int, default=3, help="Листов в многолистовой выгрузке (1 — не генерировать)")
+    parser.add_argument("--footer-rows", type=int, default=500, help="Строк подвала в шаблоне заявки")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", default=[], help="Запускать сценарии, в имени которых есть подстрока")
+    parser.add_argument("--no-memory", action="store_true", help="Не замерять пиковое выделение памяти")
+    parser.add_argument("--data-dir", type=Path, help="Где хранить сгенерированные файлы (по умолчанию — временная папка)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Допустимое ухудшение, доля")
+    parser.add_argument("--save-baseline", action="store_true", help="Записать результаты как новую базу")
+    args = parser.parse_args(argv)
+
+    if args.data_dir is not None:
+        args.data_dir.mkdir(parents=True, exist_ok=True)
+        return run(args, args.data_dir)
+    with tempfile.TemporaryDirectory(prefix="sibglass-bench-") as temp_dir:
+        return run(args, Path(temp_dir))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+"""Генераторы синтетических выгрузок AluPro и шаблонов заявки СибГласс."""
+from __future__ import annotations
+
+import random
+from pathlib import Path
+
+from sibglass_app.models.order_item import OrderItem
+
+LAYOUT_HEADER = "header"
+LAYOUT_FALLBACK = "fallback"
+LAYOUTS = (LAYOUT_HEADER, LAYOUT_FALLBACK)
+
+# Формулы в том виде, в каком их выгружает AluPro: одно-, двух- и трехкамерные, с маркировкой и без
+FORMULAS = (
+    "4-16-4",
+    "4-10-4-10-4",
+    "6",
+    "4M1-12-4-12-4 mm",
+    "4-14-4",
+    "4И-16-4М1",
+    "6-12-4-12-6",
+    "4-20-4 мм",
+    "5-8-4-8-5",
+    "4M1-24-4",
+)
+
+_TABLE_HEADER = ["№", "Наименование", "Ширина", "Высота", "Кол-во", "Площадь"]
+_PROFILE_HEADER = ["Артикул", "Наименование", "Длина", "Кол-во", "Цвет"]
+
+
+def _size(i: int) -> tuple[int, int]:
+    return 400 + i * 37 % 1200, 500 + i * 53 % 1500
+
+
+def header_rows(count: int) -> list[list]:
+    """Таблица с заголовками: "Наименование", "Ширина", "Высота", "Кол-во" и итог "Сумма:"."""
+    rows: list[list] = [["Заказ №1"], ["Контрагент", "ООО Окна"], [], list(_TABLE_HEADER)]
+    for i in range(count):
+        width, height = _size(i)
+        rows.append([i + 1, FORMULAS[i % len(FORMULAS)], width, height, 1 + i % 4, round(width * height / 1e6, 3)])
+    rows.append(["", "Сумма:", "", "", count, ""])
+    return rows
+
+
+def fallback_rows(count: int) -> list[list]:
+    """Блок "Заполнения" без заголовков: размер одной строкой, количество — отдельной ячейкой."""
+    rows: list[list] = [["Заказ №1"], ["Контрагент", "ООО Окна"], [], ["Заполнения"]]
+    for i in range(count):
+        width, height = _size(i)
+        rows.append([i % 5, FORMULAS[i % len(FORMULAS)], f"{width} x {height}", 1 + i % 4])
+    rows.append(["Сумма:", count])
+    return rows
+
+
+def profile_rows(count: int) -> list[list]:
+    """Спецификация профиля — листы выгрузки, где нет стеклопакетов."""
+    rows: list[list] = [list(_PROFILE_HEADER)]
+    for i in range(count):
+        rows.append([f"AP{60 + i % 40}.{i % 7:02d}", f"Профиль рамы {i % 12}", 600 + i * 13 % 2400, 1 + i % 6, "белый"])
+    return rows
+
+
+def alupro_rows(layout: str, count: int) -> list[list]:
+    if layout == LAYOUT_HEADER:
+        return header_rows(count)
+    if layout == LAYOUT_FALLBACK:
+        return fallback_rows(count)
+    raise ValueError(f"Неизвестная раскладка выгрузки: {layout}")
+
+
+def as_text_rows(rows: list[list]) -> list[list[str]]:
+    """Строки в том виде, в каком их отдает ExcelRepository.iter_rows."""
+    return [[str(value).strip() for value in row] for row in rows]
+
+
+def write_alupro_export(path: str | Path, layout: str, count: int, sheets: int = 1, filler_rows: int = 500) -> Path:
+    """Выгрузка AluPro в .xlsx; при sheets > 1 лист с заполнениями — последний, перед ним листы профиля."""
+    from openpyxl import Workbook
+
+    path = Path(path)
+    workbook = Workbook(write_only=True)
+    for index in range(sheets - 1):
+        sheet = workbook.create_sheet(f"Профиль {index + 1}")
+        for row in profile_rows(filler_rows):
+            sheet.append(row)
+    sheet = workbook.create_sheet("Заказ")
+    for row in alupro_rows(layout, count):
+        sheet.append(row)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    workbook.save(path)
+    return path
+
+
+def build_template(existing_rows: int = 3, footer_rows: int = 200, merges_per_row: int = 2):
+    """Шаблон заявки: шапка с объединениями, строка "ВСЕГО" и длинный подвал из объединенных строк."""
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet["A1"] = "ЗАЯВКА НА РАСЧЕТ СТЕКЛОПАКЕТОВ"
+    sheet.merge_cells("A1:H1")
+    for row, label in enumerate(("Заказчик", "Адрес доставки", "Телефон", "Дата"), start=3):
+        sheet.cell(row, 1, label)
+        sheet.merge_cells(start_row=row, start_column=2, end_row=row, end_column=5)
+        sheet.merge_cells(start_row=row, start_column=6, end_row=row, end_column=8)
+    for col, title in enumerate(["№", "Марка", "Формула", "Ширина", "Высота", "Кол-во", "Площадь", "Общая"], start=1):
+        sheet.cell(13, col, title)
+
+    total_row = 14 + existing_rows
+    sheet.cell(total_row, 1, "ВСЕГО")
+    sheet.merge_cells(start_row=total_row, start_column=1, end_row=total_row, end_column=5)
+    # Объединения подвала делят колонки A–H на merges_per_row равных частей
+    width = max(1, 8 // max(1, merges_per_row))
+    for offset in range(footer_rows):
+        row = total_row + 2 + offset
+        sheet.cell(row, 1, f"Примечание {offset + 1}")
+        for part in range(merges_per_row):
+            start = 1 + part * width
+            end = min(8, start + width - 1)
+            if end > start:
+                sheet.merge_cells(start_row=row, start_column=start, end_row=row, end_column=end)
+    return workbook
+
+
+def write_template(path: str | Path, existing_rows: int = 3, footer_rows: int = 200, merges_per_row: int = 2) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    build_template(existing_rows, footer_rows, merges_per_row).save(path)
+    return path
+
+
+def build_items(count: int) -> list[OrderItem]:
+    return [
+        OrderItem(index=i + 1, formula="4М1-16Ar-4", width=_size(i)[0], height=_size(i)[1], count=1 + i % 4)
+        for i in range(count)
+    ]
+
+
+def raw_formulas(count: int, seed: int = 1) -> list[str]:
+    """Случайные числовые формулы (одно-, двух- и трехкамерные); каждая десятая — из FORMULAS, часть из них с маркировкой."""
+    rng = random.Random(seed)
+    glasses = (3, 4, 5, 6, 8, 10)
+    formulas: list[str] = []
+    for i in range(count):
+        if i % 10 == 9:
+            formulas.append(FORMULAS[i // 10 % len(FORMULAS)])
+            continue
+        parts = [str(rng.choice(glasses))]
+        for _ in range(rng.choice((0, 1, 2))):
+            parts += [str(rng.randint(6, 24)), str(rng.choice(glasses))]
+        formulas.append("-".join(parts))
+    return formulas
@@ -1,7 +1,14 @@
 from __future__ import annotations
 
+import importlib
+import logging
+import threading
+from contextlib import nullcontext
+
+from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QApplication
 
+from sibglass_app.config.paths import ensure_app_dirs
 from sibglass_app.config.settings import SettingsManager
 from sibglass_app.controllers.main_controller import MainController
 from sibglass_app.repositories.excel_repository import ExcelRepository
@@ -13,32 +20,77 @@ from sibglass_app.services.glass_catalog_service import GlassCatalogService
 from sibglass_app.services.sibglass_writer import SibglassWriterService
 from sibglass_app.services.validation_service import ValidationService
 from sibglass_app.utils.logger import configure_logging
+from sibglass_app.utils.startup_profile import StartupProfile
 from sibglass_app.views.main_window import MainWindow
 
+logger = logging.getLogger(__name__)
+
+# Нужны только для чтения/записи Excel: загружаются в фоне уже после показа окна
+WARM_UP_MODULES = ("openpyxl",)
+
 
 class SibglassApplication:
-    def __init__(self) -> None:
-        configure_logging()
+    def __init__(self, profile: StartupProfile | None = None) -> None:
+        self._profile = profile
+        self._warm_up_thread: threading.Thread | None = None
+
+        with self._measure("logging"):
+            configure_logging()
+            ensure_app_dirs()
 
-        self.qt_app = QApplication([])
+        with self._measure("QApplication"):
+            self.qt_app = QApplication([])
 
         excel_repository = ExcelRepository()
         glass_repository = GlassFileRepository()
 
-        window = MainWindow()
-        self.controller = MainController(
-            window=window,
-            settings_manager=SettingsManager(),
-            validation_service=ValidationService(excel_repository),
-            parser_service=AluProParserService(excel_repository),
-            writer_service=SibglassWriterService(),
-            formula_builder=FormulaBuilderService(),
-            glass_catalog_service=GlassCatalogService(glass_repository),
-            autosave_service=AutosaveService(),
-            excel_repository=excel_repository,
-        )
+        with self._measure("MainWindow"):
+            window = MainWindow()
+        with self._measure("MainController"):
+            self.controller = MainController(
+                window=window,
+                settings_manager=SettingsManager(),
+                validation_service=ValidationService(excel_repository),
+                parser_service=AluProParserService(excel_repository),
+                writer_service=SibglassWriterService(),
+                formula_builder=FormulaBuilderService(),
+                glass_catalog_service=GlassCatalogService(glass_repository),
+                autosave_service=AutosaveService(),
+                excel_repository=excel_repository,
+            )
         self.window = window
+        # Несохраненные изменения формы дописываются при выходе, не дожидаясь таймера
+        self.qt_app.aboutToQuit.connect(self.controller.flush_autosave)
 
     def run(self) -> int:
-        self.window.show()
+        with self._measure("show"):
+            self.window.show()
+        # Первый проход цикла событий — окно отрисовано, можно грузить тяжелые модули
+        QTimer.singleShot(0, self._on_first_paint)
         return self.qt_app.exec()
+
+    def _on_first_paint(self) -> None:
+        if self._profile is not None:
+            self._profile.mark("окно показано")
+        self._warm_up_thread = threading.Thread(target=self._warm_up, name="warm-up", daemon=True)
+        self._warm_up_thread.start()
+        if self._profile is not None:
+            self._warm_up_thread.join()
+            print(self._profile.report(), flush=True)
+            self.qt_app.quit()
+
+    def _warm_up(self) -> None:
+        try:
+            for name in WARM_UP_MODULES:
+                with self._measure(name, kind="warm-up"):
+                    importlib.import_module(name)
+            from sibglass_app.services.sibglass_writer import writer_styles
+
+            with self._measure("writer_styles", kind="warm-up"):
+                writer_styles()
+        except Exception:
+            # Прогрев — только оптимизация: при ошибке модуль загрузится при первом использовании
+            logger.exception("Не удалось заранее загрузить модули Excel")
+
+    def _measure(self, name: str, kind: str = "init"):
+        return self._profile.measure(kind, name) if self._profile is not None else nullcontext()
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+from sibglass_app.config.paths import METRICS_FILE
+from sibglass_app.services.batch_service import BatchConverterService, BatchResult, GlassOptions
+from sibglass_app.services.generation_service import WRITER_AUTO, WRITER_BACKENDS
+from sibglass_app.services.metrics_service import MetricsLog
+from sibglass_app.utils.logger import configure_logging
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="sibglass_app batch",
+        description="Пакетная конвертация файлов AluPro в заявки СибГласс без графического интерфейса.",
+    )
+    parser.add_argument("input_dir", help="Каталог с файлами AluPro (.xlsx/.xls)")
+    parser.add_argument("-t", "--template", required=True, help="Шаблон заявки СибГласс (.xlsx)")
+    parser.add_argument("-o", "--output-dir", help="Каталог для готовых заявок (по умолчанию <input_dir>/sibglass)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Число процессов (по умолчанию — число ядер)")
+    parser.add_argument("--pattern", default="*", help="Маска имен файлов AluPro, например '*.xlsx'")
+    parser.add_argument("--profile", help="JSON-профиль комплектации (ключи как в autosave.tmp)")
+    parser.add_argument(
+        "--writer",
+        choices=WRITER_BACKENDS,
+        default=WRITER_AUTO,
+        help="Способ записи заявки: openpyxl, потоковый или auto (потоковый для больших заявок)",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=str(METRICS_FILE),
+        help="JSONL-журнал с временем фаз и счетчиками каждой конвертации",
+    )
+
+    parser.add_argument("--outer", help="Стекло наружное")
+    parser.add_argument("--middle", help="Стекло среднее")
+    parser.add_argument("--inner", help="Стекло внутреннее")
+    parser.add_argument("--spacer", help="Рамка")
+    parser.add_argument("--customer", help="Заказчик")
+    parser.add_argument("--address", help="Адрес доставки")
+    for flag, help_text in (
+        ("zak-outer", "Закалка наружного стекла"),
+        ("zak-middle", "Закалка среднего стекла"),
+        ("zak-inner", "Закалка внутреннего стекла"),
+        ("argon", "Аргон в камерах"),
+    ):
+        parser.add_argument(f"--{flag}", action=argparse.BooleanOptionalAction, default=None, help=help_text)
+    return parser
+
+
+def _print_result(result: BatchResult) -> None:
+    name = Path(result.alupro_path).name
+    if result.ok:
+        note = f", без формулы: {result.unresolved}" if result.unresolved else ""
+        print(f"OK    {name} -> {result.output_path} (позиций: {result.orders}{note}, {result.seconds:.2f} с)")
+    else:
+        print(f"ОШИБКА {name}: {result.error}", file=sys.stderr)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    configure_logging()
+
+    options = GlassOptions.from_profile(args.profile) if args.profile else GlassOptions()
+    options = options.merged(
+        {
+            "outer": args.outer,
+            "middle": args.middle,
+            "inner": args.inner,
+            "spacer": args.spacer,
+            "customer": args.customer,
+            "address": args.address,
+            "zak_outer": args.zak_outer,
+            "zak_middle": args.zak_middle,
+            "zak_inner": args.zak_inner,
+            "argon": args.argon,
+        }
+    )
+
+    output_dir = args.output_dir or str(Path(args.input_dir) / "sibglass")
+    service = BatchConverterService(workers=args.workers, metrics_log=MetricsLog(args.metrics))
+    try:
+        jobs = service.plan_jobs(args.input_dir, args.template, output_dir, options, args.pattern, args.writer)
+    except ValueError as exc:
+        print(str(exc), file=sys.stderr)
+        return 1
+    if not jobs:
+        print(f"В каталоге {args.input_dir} нет файлов AluPro", file=sys.stderr)
+        return 1
+
+    results = service.run(jobs, on_result=_print_result)
+    failed = sum(1 for result in results if not result.ok)
+    print(f"Готово: {len(results) - failed} из {len(results)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -17,7 +17,10 @@ LOG_FILE = BASE_DIR / "errors.log"
 SETTINGS_FILE = CONFIG_DIR / "settings.json"
 GLASS_FILE = DATA_DIR / "glass.txt"
 AUTOSAVE_FILE = DATA_DIR / "autosave.tmp"
+METRICS_FILE = DATA_DIR / "metrics.jsonl"
 
 
-for directory in (CONFIG_DIR, DATA_DIR):
-    directory.mkdir(parents=True, exist_ok=True)
+def ensure_app_dirs() -> None:
+    # Вызывается приложением при запуске, а не при импорте: пакетный режим и утилиты ничего не создают
+    for directory in (CONFIG_DIR, DATA_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import logging
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from sibglass_app.services.generation_service import (
+    PHASE_GROUP,
+    PHASE_OPEN,
+    PHASE_PARSE,
+    PHASE_SAVE,
+    PHASE_WRITE,
+    GenerationCancelled,
+    GenerationRequest,
+    OrderGenerationService,
+)
+from sibglass_app.services.metrics_service import ConversionMetrics, MetricsLog
+
+logger = logging.getLogger(__name__)
+
+# Доля общей шкалы прогресса, отведенная каждой фазе: (начало, конец, подпись)
+_PHASE_SCALE = {
+    PHASE_PARSE: (0, 30, "Разбор AluPro"),
+    PHASE_GROUP: (30, 35, "Группировка"),
+    PHASE_OPEN: (35, 50, "Открытие шаблона"),
+    PHASE_WRITE: (50, 90, "Запись заявки"),
+    PHASE_SAVE: (90, 100, "Сохранение"),
+}
+
+
+class GenerationSignals(QObject):
+    progress = Signal(int, str)
+    finished = Signal(int)
+    failed = Signal(str)
+    cancelled = Signal()
+
+
+class GenerationWorker(QRunnable):
+    def __init__(
+        self,
+        service: OrderGenerationService,
+        request: GenerationRequest,
+        metrics_log: MetricsLog | None = None,
+    ) -> None:
+        super().__init__()
+        self.setAutoDelete(False)
+        self.signals = GenerationSignals()
+        self.metrics = ConversionMetrics()
+        self._service = service
+        self._request = request
+        self._metrics_log = metrics_log
+        self._cancel_event = threading.Event()
+        self._last_progress: tuple[int, str] | None = None
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    def run(self) -> None:
+        try:
+            orders = self._service.generate(
+                self._request,
+                progress=self._on_progress,
+                is_cancelled=self._cancel_event.is_set,
+                metrics=self.metrics,
+            )
+        except GenerationCancelled:
+            self._record("cancelled")
+            self.signals.cancelled.emit()
+        except Exception as exc:
+            logger.exception("Ошибка генерации")
+            self._record("failed", str(exc))
+            self.signals.failed.emit(str(exc))
+        else:
+            self._record("ok")
+            self.signals.finished.emit(len(orders))
+
+    def _record(self, status: str, error: str = "") -> None:
+        # Запись метрик — в потоке генерации, до сигнала: GUI-поток не ждет диск
+        self.metrics.status, self.metrics.error = status, error
+        if self._metrics_log is not None:
+            self._metrics_log.append(self.metrics)
+
+    def _on_progress(self, phase: str, done: int, total: int) -> None:
+        start, end, title = _PHASE_SCALE[phase]
+        if total > 0:
+            percent = start + (end - start) * min(done, total) // total
+            text = f"{title}: {done} из {total}"
+        else:
+            percent = start
+            text = f"{title}: {done} строк" if done else title
+
+        # Не забиваем очередь событий GUI одинаковыми обновлениями
+        if (percent, text) == self._last_progress:
+            return
+        self._last_progress = (percent, text)
+        self.signals.progress.emit(percent, text)
@@ -3,28 +3,36 @@ from __future__ import annotations
 import logging
 import subprocess
 import sys
-import traceback
 
-from PySide6.QtCore import QTimer
+from PySide6.QtCore import QFileSystemWatcher, QThreadPool, QTimer
 from PySide6.QtWidgets import QDialog
 
 from sibglass_app.config.paths import GLASS_FILE
-from sibglass_app.config.settings import SettingsManager
+from sibglass_app.config.settings import AppSettings, SettingsManager
+from sibglass_app.controllers.generation_worker import GenerationWorker
+from sibglass_app.controllers.startup_loader import StartupData, StartupLoader
 from sibglass_app.models.formula_item import FormulaRowState
 from sibglass_app.models.glass_catalog import GlassCatalog
-from sibglass_app.models.order_item import OrderItem
 from sibglass_app.services.alupro_parser import AluProParserService
 from sibglass_app.services.autosave_service import AutosaveService
 from sibglass_app.services.formula_builder import FormulaBuilderService
+from sibglass_app.services.generation_service import GenerationRequest, OrderGenerationService
 from sibglass_app.services.glass_catalog_service import GlassCatalogService
+from sibglass_app.services.metrics_service import MetricsLog
+from sibglass_app.services.save_service import AtomicSaveService
 from sibglass_app.services.sibglass_writer import SibglassWriterService
 from sibglass_app.services.validation_service import ValidationService
-from sibglass_app.utils.text_utils import is_numeric_formula
+from sibglass_app.services.xlsx_stream_writer import XlsxStreamWriter
 from sibglass_app.views.dialogs import ManualInputDialog
 from sibglass_app.views.main_window import MainWindow
 
 logger = logging.getLogger(__name__)
 
+# Пауза в вводе, после которой состояние формы пишется в autosave.tmp
+AUTOSAVE_DEBOUNCE_MS = 700
+# Редакторы сохраняют файл в несколько шагов (усечение, запись, переименование) — ждем, пока они закончат
+GLASS_RELOAD_DEBOUNCE_MS = 300
+
 
 class MainController:
     def __init__(
@@ -48,21 +56,41 @@ class MainController:
         self.glass_catalog_service = glass_catalog_service
         self.autosave_service = autosave_service
         self.excel_repository = excel_repository
+        save_service = AtomicSaveService()
+        self.generation_service = OrderGenerationService(
+            parser_service,
+            writer_service,
+            excel_repository,
+            stream_writer=XlsxStreamWriter(save_service),
+            save_service=save_service,
+        )
+        self._generation_worker: GenerationWorker | None = None
+        self._metrics_log = MetricsLog()
+        # Опции, по которым последний раз собирались формулы таблицы
+        self._applied_formula_options: dict | None = None
 
-        self.settings = self.settings_manager.load()
+        self.settings = AppSettings()
         self.catalog = GlassCatalog()
-        self._glass_mtime: float | None = None
+
+        self._autosave_timer = QTimer(self.window)
+        self._autosave_timer.setSingleShot(True)
+        self._autosave_timer.setInterval(AUTOSAVE_DEBOUNCE_MS)
+        self._autosave_timer.timeout.connect(self.flush_autosave)
 
         self._bind()
-        self._load_catalog()
-        self._restore_autosave_if_needed()
-        self._apply_settings()
-        self._start_glass_file_watcher()
+        # Файлы читаются в фоне: окно отрисовывается сразу, не дожидаясь сетевого диска
+        self._startup_loader: StartupLoader | None = None
+        self._start_loading()
+
+    @property
+    def is_loading(self) -> bool:
+        return self._startup_loader is not None
 
     def _bind(self) -> None:
         self.window.select_alupro_btn.clicked.connect(self.on_pick_alupro)
         self.window.select_sibglass_btn.clicked.connect(self.on_pick_sibglass)
         self.window.save_btn.clicked.connect(self.on_generate)
+        self.window.cancel_btn.clicked.connect(self.on_cancel_generation)
         self.window.open_glass_btn.clicked.connect(self.on_open_glass_file)
         self.window.refresh_formula_btn.clicked.connect(self.on_refresh_formulas)
 
@@ -80,46 +108,68 @@ class MainController:
         for combo in [self.window.outer_combo, self.window.middle_combo, self.window.inner_combo, self.window.spacer_combo]:
             combo.currentTextChanged.connect(self.on_any_change)
 
-        self.window.formula_table.itemChanged.connect(lambda *_: self.on_any_change())
+        self.window.formula_model.edited.connect(lambda _row: self.on_any_change())
 
     def _apply_settings(self) -> None:
         self.window.alupro_line.setText(self.settings.last_alupro_path)
         self.window.sibglass_line.setText(self.settings.last_sibglass_path)
 
-    def _load_catalog(self) -> None:
-        catalog, exists = self.glass_catalog_service.load_or_empty()
-        self.catalog = catalog
-        if not exists:
-            self.window.show_warning("Файл glass.txt не найден. Будет создан при первом сохранении.")
-            self.glass_catalog_service.save(self.catalog)
+    def _start_loading(self) -> None:
+        loader = StartupLoader(self.settings_manager, self.glass_catalog_service, self.autosave_service)
+        loader.signals.loaded.connect(self._on_startup_loaded)
+        loader.signals.failed.connect(self._on_startup_failed)
+        self._startup_loader = loader
+        self.window.set_loading(True)
+        QThreadPool.globalInstance().start(loader)
+
+    def _on_startup_loaded(self, data: StartupData) -> None:
+        self.settings = data.settings
+        self.catalog = data.catalog
         self._refresh_catalog_ui()
-        self._remember_glass_mtime()
+        self._finish_loading()
 
-    def _remember_glass_mtime(self) -> None:
-        self._glass_mtime = GLASS_FILE.stat().st_mtime if GLASS_FILE.exists() else None
-
-    def _refresh_catalog_ui(self) -> None:
-        current_outer = self.window.outer_combo.currentText()
-        current_middle = self.window.middle_combo.currentText()
-        current_inner = self.window.inner_combo.currentText()
-        current_spacer = self.window.spacer_combo.currentText()
+        if not data.catalog_existed:
+            self.window.show_warning("Файл glass.txt не найден. Будет создан при первом сохранении.")
+        if data.autosave_payload and self.window.ask_restore():
+            self._restore_autosave(data.autosave_payload)
+        self._apply_settings()
+        self._start_glass_file_watcher()
+        self._resume_autosave()
 
-        self.window.outer_combo.clear()
-        self.window.outer_combo.addItems(self.catalog.outer_glass)
+    def _on_startup_failed(self, message: str) -> None:
+        self.catalog = self.glass_catalog_service.catalog
+        self._refresh_catalog_ui()
+        self._finish_loading()
+        self.window.show_error("Не удалось загрузить настройки или glass.txt. Подробности в errors.log")
+        self._apply_settings()
+        self._start_glass_file_watcher()
+        self._resume_autosave()
 
-        self.window.middle_combo.clear()
-        self.window.middle_combo.addItems(self.catalog.middle_glass)
+    def _finish_loading(self) -> None:
+        self._startup_loader = None
+        self.window.set_loading(False)
 
-        self.window.inner_combo.clear()
-        self.window.inner_combo.addItems(self.catalog.inner_glass)
+    def _resume_autosave(self) -> None:
+        # Пока шла загрузка, запись откладывалась, чтобы не затереть autosave.tmp до вопроса о восстановлении
+        if self.autosave_service.is_dirty:
+            self._autosave_timer.start()
 
-        self.window.spacer_combo.clear()
-        self.window.spacer_combo.addItems(self.catalog.spacers)
+    def _combo_by_section(self) -> dict:
+        return {
+            "outer_glass": self.window.outer_combo,
+            "middle_glass": self.window.middle_combo,
+            "inner_glass": self.window.inner_combo,
+            "spacers": self.window.spacer_combo,
+        }
 
-        self._select_if_exists(self.window.outer_combo, current_outer)
-        self._select_if_exists(self.window.middle_combo, current_middle)
-        self._select_if_exists(self.window.inner_combo, current_inner)
-        self._select_if_exists(self.window.spacer_combo, current_spacer)
+    def _refresh_catalog_ui(self, sections: list[str] | None = None) -> None:
+        self.formula_builder.clear_cache()
+        combos = self._combo_by_section()
+        for section in sections if sections is not None else combos:
+            combo = combos[section]
+            current = combo.currentText()
+            combo.set_values(getattr(self.catalog, section))
+            self._select_if_exists(combo, current)
 
     @staticmethod
     def _select_if_exists(combo, value: str) -> None:
@@ -129,13 +179,7 @@ class MainController:
         if idx >= 0:
             combo.setCurrentIndex(idx)
 
-    def _restore_autosave_if_needed(self) -> None:
-        payload = self.autosave_service.load_state()
-        if not payload:
-            return
-        if not self.window.ask_restore():
-            return
-
+    def _restore_autosave(self, payload: dict) -> None:
         self.window.alupro_line.setText(payload.get("alupro", ""))
         self.window.sibglass_line.setText(payload.get("sibglass", ""))
         self.window.customer_line.setText(payload.get("customer", self.window.customer_line.text()))
@@ -151,23 +195,53 @@ class MainController:
         self._select_if_exists(self.window.spacer_combo, payload.get("spacer", ""))
 
     def _start_glass_file_watcher(self) -> None:
-        self._watch_timer = QTimer(self.window)
-        self._watch_timer.setInterval(1200)
-        self._watch_timer.timeout.connect(self._reload_catalog_if_changed)
-        self._watch_timer.start()
+        # Уведомления ОС вместо опроса: без изменений файла контроллер не просыпается
+        self._glass_reload_timer = QTimer(self.window)
+        self._glass_reload_timer.setSingleShot(True)
+        self._glass_reload_timer.setInterval(GLASS_RELOAD_DEBOUNCE_MS)
+        self._glass_reload_timer.timeout.connect(self._reload_catalog_if_changed)
+
+        self._glass_signature = self._glass_file_signature()
+        self._glass_watcher = QFileSystemWatcher(self.window)
+        self._glass_watcher.fileChanged.connect(lambda _path: self._glass_reload_timer.start())
+        self._glass_watcher.directoryChanged.connect(self._on_glass_directory_changed)
+        self._watch_glass_file()
+
+    def _on_glass_directory_changed(self, _path: str) -> None:
+        # В том же каталоге пишутся autosave.tmp и временные файлы атомарного сохранения:
+        # перечитывание справочника запускается, только если изменился сам glass.txt
+        if self._glass_file_signature() != self._glass_signature:
+            self._glass_reload_timer.start()
+
+    @staticmethod
+    def _glass_file_signature() -> tuple[int, int] | None:
+        try:
+            stat = GLASS_FILE.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _watch_glass_file(self) -> None:
+        # Каталог отслеживается ради создания файла и сохранения через переименование,
+        # после которого сам файл выпадает из наблюдения
+        watched = set(self._glass_watcher.files()) | set(self._glass_watcher.directories())
+        paths = [str(GLASS_FILE.parent)] + ([str(GLASS_FILE)] if GLASS_FILE.exists() else [])
+        missing = [path for path in paths if path not in watched]
+        if missing:
+            self._glass_watcher.addPaths(missing)
 
     def _reload_catalog_if_changed(self) -> None:
-        if not GLASS_FILE.exists():
-            return
-        mtime = GLASS_FILE.stat().st_mtime
-        if self._glass_mtime is not None and mtime <= self._glass_mtime:
-            return
+        self._glass_signature = self._glass_file_signature()
+        self._watch_glass_file()
         try:
-            self.catalog = self.glass_catalog_service.load_or_empty()[0]
-            self._refresh_catalog_ui()
-            self._glass_mtime = mtime
+            changed = self.glass_catalog_service.refresh()
         except Exception:
             logger.exception("Не удалось обновить справочник glass.txt")
+            return
+
+        self.catalog = self.glass_catalog_service.catalog
+        if changed:
+            self._refresh_catalog_ui(changed)
 
     def on_pick_alupro(self) -> None:
         path = self.window.pick_file("Выберите файл AluPro", self.settings.last_alupro_path)
@@ -209,88 +283,104 @@ class MainController:
         try:
             items = self.parser_service.parse(self.window.alupro_line.text())
             unique = sorted({item.formula.strip() for item in items if item.formula.strip()})
+            options = self._formula_options()
             rows = [FormulaRowState(source_formula=f) for f in unique]
             for row in rows:
-                if is_numeric_formula(row.source_formula):
-                    row.resolved_formula = self._autobuild(row.source_formula)
-            self.window.formula_table.set_rows(rows)
+                if self.formula_builder.supports(row.source_formula):
+                    row.resolved_formula = self.formula_builder.build(row.source_formula, **options)
+            self.window.formula_model.set_rows(rows)
+            self._applied_formula_options = options
             if not rows:
                 self.window.show_warning("В блоке 'Заполнения' не найдены строки формул.")
         except Exception:
             logger.exception("Ошибка парсинга AluPro")
             self.window.show_error("Не удалось разобрать файл AluPro. Подробности в errors.log")
 
-    def _autobuild(self, formula: str) -> str:
-        return self.formula_builder.build(
-            source_formula=formula,
-            outer_glass=self.window.outer_combo.currentText(),
-            middle_glass=self.window.middle_combo.currentText(),
-            inner_glass=self.window.inner_combo.currentText(),
-            spacer=self.window.spacer_combo.currentText(),
-            zak_outer=self.window.zak_outer.isChecked(),
-            zak_middle=self.window.zak_middle.isChecked(),
-            zak_inner=self.window.zak_inner.isChecked(),
-            argon=self.window.argon.isChecked(),
-        )
+    def _formula_options(self) -> dict:
+        return {
+            "outer_glass": self.window.outer_combo.currentText(),
+            "middle_glass": self.window.middle_combo.currentText(),
+            "inner_glass": self.window.inner_combo.currentText(),
+            "spacer": self.window.spacer_combo.currentText(),
+            "zak_outer": self.window.zak_outer.isChecked(),
+            "zak_middle": self.window.zak_middle.isChecked(),
+            "zak_inner": self.window.zak_inner.isChecked(),
+            "argon": self.window.argon.isChecked(),
+        }
 
     def on_refresh_formulas(self) -> None:
-        rows = self.window.formula_table.collect_rows()
-        updated: list[FormulaRowState] = []
-        for row in rows:
-            resolved = row.resolved_formula
-            modified = row.modified
-            if is_numeric_formula(row.source_formula):
-                new_value = self._autobuild(row.source_formula)
-                if new_value != row.resolved_formula:
-                    modified = True
-                resolved = new_value
-            updated.append(FormulaRowState(source_formula=row.source_formula, resolved_formula=resolved, modified=modified))
-        self.window.formula_table.set_rows(updated)
+        # Пересчитываются только строки, чей результат зависит от изменившихся опций
+        # (например, среднее стекло влияет лишь на двухкамерные); ручные правки не трогаются
+        options = self._formula_options()
+        if self._applied_formula_options is None:
+            chambers = {1, 3, 5}
+        else:
+            chambers = self.formula_builder.affected_chambers(self._applied_formula_options, options)
+        self._applied_formula_options = options
+        if not chambers:
+            return
+
+        model = self.window.formula_model
+        updates: dict[int, str] = {}
+        for row, source in model.auto_rows():
+            if self.formula_builder.chamber_count(source) not in chambers:
+                continue
+            value = self.formula_builder.build(source, **options)
+            if value != model.resolved_formula(row):
+                updates[row] = value
+        model.update_resolved(updates)
 
     def on_generate(self) -> None:
-        try:
-            self.window.set_busy(True)
-            self.window.progress_bar.setValue(10)
-
-            alupro_items = self.parser_service.parse(self.window.alupro_line.text())
-            formula_map = {
-                row.source_formula: row.resolved_formula
-                for row in self.window.formula_table.collect_rows()
-                if row.resolved_formula.strip()
-            }
-            grouped_items: dict[str, list] = {}
-            for item in alupro_items:
-                resolved = formula_map.get(item.formula, "")
-                if not resolved:
-                    continue
-                if resolved not in grouped_items:
-                    grouped_items[resolved] = []
-                grouped_items[resolved].append(item)
-
-            orders: list[OrderItem] = []
-            idx = 1
-            for resolved, group in grouped_items.items():
-                for item in group:
-                    orders.append(OrderItem(index=idx, formula=resolved, width=item.width, height=item.height, count=item.count))
-                    idx += 1
-
-            wb = self.excel_repository.open_workbook(self.window.sibglass_line.text())
-            self.window.progress_bar.setValue(50)
-            self.writer_service.write(
-                wb,
-                customer=self.window.customer_line.text().strip(),
-                address=self.window.address_line.text().strip(),
-                items=orders,
-            )
-            wb.save(self.window.sibglass_line.text())
-            self.window.progress_bar.setValue(100)
-            self.autosave_service.clear()
-        except Exception as exc:
-            logger.error("Ошибка генерации: %s", exc)
-            logger.error(traceback.format_exc())
-            self.window.show_error("Ошибка при сохранении заявки. Подробности в errors.log")
-        finally:
-            self.window.set_busy(False)
+        if self._generation_worker is not None:
+            return
+
+        formula_map = self.window.formula_model.resolved_map()
+        request = GenerationRequest(
+            alupro_path=self.window.alupro_line.text(),
+            sibglass_path=self.window.sibglass_line.text(),
+            customer=self.window.customer_line.text().strip(),
+            address=self.window.address_line.text().strip(),
+            formula_map=formula_map,
+        )
+
+        worker = GenerationWorker(self.generation_service, request, self._metrics_log)
+        worker.signals.progress.connect(self.window.set_progress)
+        worker.signals.finished.connect(self._on_generation_finished)
+        worker.signals.failed.connect(self._on_generation_failed)
+        worker.signals.cancelled.connect(self._on_generation_cancelled)
+        self._generation_worker = worker
+
+        self.window.set_busy(True)
+        self.window.set_progress(0, "Подготовка")
+        QThreadPool.globalInstance().start(worker)
+
+    def on_cancel_generation(self) -> None:
+        if self._generation_worker is not None:
+            self._generation_worker.cancel()
+            self.window.set_progress(self.window.progress_bar.value(), "Отмена...")
+
+    def _on_generation_finished(self, order_count: int) -> None:
+        logger.debug("Кэш Excel: %s; пул шаблонов: %s", self.excel_repository.cache_stats, self.excel_repository.template_stats)
+        metrics = self._generation_worker.metrics
+        self._finish_generation()
+        self.window.set_progress(100, f"Готово, позиций: {order_count}")
+        self.window.show_status(f"Заявка сохранена за {metrics.summary()}")
+        self._autosave_timer.stop()
+        self.autosave_service.clear()
+
+    def _on_generation_failed(self, message: str) -> None:
+        logger.error("Ошибка генерации: %s", message)
+        self._finish_generation()
+        self.window.set_progress(0)
+        self.window.show_error("Ошибка при сохранении заявки. Подробности в errors.log")
+
+    def _on_generation_cancelled(self) -> None:
+        self._finish_generation()
+        self.window.set_progress(0, "Отменено")
+
+    def _finish_generation(self) -> None:
+        self._generation_worker = None
+        self.window.set_busy(False)
 
     def on_manual_add(self, section_attr: str, title: str) -> None:
         dialog = ManualInputDialog(title, parent=self.window)
@@ -301,36 +391,29 @@ class MainController:
         if not value:
             return
 
-        combo_by_section = {
-            "outer_glass": self.window.outer_combo,
-            "middle_glass": self.window.middle_combo,
-            "inner_glass": self.window.inner_combo,
-            "spacers": self.window.spacer_combo,
-        }
-        target_combo = combo_by_section[section_attr]
+        target_combo = self._combo_by_section()[section_attr]
 
         try:
-            if target_combo.findText(value) < 0:
-                target_combo.addItem(value)
+            # Внешние правки подхватываются до дописывания, значение дописывается в конец файла.
+            # В список выбора значение попадает только после успешной записи
+            changed = self.glass_catalog_service.refresh()
+            self.glass_catalog_service.add_value(section_attr, value)
+            self.catalog = self.glass_catalog_service.catalog
+            target_combo.add_value(value)
             target_combo.setCurrentText(value)
-
-            current_catalog, _ = self.glass_catalog_service.load_or_empty()
-            self.catalog = current_catalog
-            self.catalog = self.glass_catalog_service.add_value(self.catalog, section_attr, value)
-            self.glass_catalog_service.save(self.catalog)
-
-            self.catalog, _ = self.glass_catalog_service.load_or_empty()
-            self._refresh_catalog_ui()
-            self._select_if_exists(target_combo, value)
-            self._remember_glass_mtime()
+            if changed:
+                self._refresh_catalog_ui(changed)
+                self._select_if_exists(target_combo, value)
         except Exception:
             logger.exception("Не удалось сохранить ручной ввод в glass.txt")
             self.window.show_error("Не удалось сохранить значение в glass.txt")
 
     def on_open_glass_file(self) -> None:
+        # Перед открытием в редакторе файл уплотняется: дописанные значения собираются в свои разделы
         if not GLASS_FILE.exists():
             self.glass_catalog_service.save(self.catalog)
-            self._remember_glass_mtime()
+        elif self.glass_catalog_service.needs_compaction:
+            self.glass_catalog_service.compact()
         try:
             if sys.platform.startswith("win"):
                 subprocess.Popen(["notepad.exe", str(GLASS_FILE)])
@@ -341,7 +424,22 @@ class MainController:
             self.window.show_error("Не удалось открыть glass.txt")
 
     def on_any_change(self) -> None:
-        payload = {
+        # Каждое нажатие клавиши лишь перезапускает таймер; запись — одна, после паузы
+        self.autosave_service.mark_dirty()
+        self._autosave_timer.start()
+
+    def flush_autosave(self) -> None:
+        self._autosave_timer.stop()
+        if self.is_loading or not self.autosave_service.is_dirty:
+            return
+        try:
+            self.autosave_service.flush(self._collect_state())
+        except Exception:
+            logger.exception("Не удалось записать автосохранение")
+        logger.debug("Автосохранение: %s", self.autosave_service.stats)
+
+    def _collect_state(self) -> dict:
+        return {
             "alupro": self.window.alupro_line.text().strip(),
             "sibglass": self.window.sibglass_line.text().strip(),
             "customer": self.window.customer_line.text().strip(),
@@ -355,4 +453,3 @@ class MainController:
             "inner": self.window.inner_combo.currentText(),
             "spacer": self.window.spacer_combo.currentText(),
         }
-        self.autosave_service.save_state(payload)
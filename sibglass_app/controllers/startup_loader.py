@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from sibglass_app.config.settings import AppSettings, SettingsManager
+from sibglass_app.models.glass_catalog import GlassCatalog
+from sibglass_app.services.autosave_service import AutosaveService
+from sibglass_app.services.glass_catalog_service import GlassCatalogService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StartupData:
+    settings: AppSettings
+    catalog: GlassCatalog
+    catalog_existed: bool
+    autosave_payload: dict[str, Any] | None
+
+
+class StartupSignals(QObject):
+    loaded = Signal(object)
+    failed = Signal(str)
+
+
+class StartupLoader(QRunnable):
+    """Чтение настроек, glass.txt и autosave.tmp вне GUI-потока.
+
+    На медленном сетевом диске эти файлы читаются заметное время — окно
+    к этому моменту уже показано, данные подставляются по сигналу loaded.
+    """
+
+    def __init__(
+        self,
+        settings_manager: SettingsManager,
+        glass_catalog_service: GlassCatalogService,
+        autosave_service: AutosaveService,
+    ) -> None:
+        super().__init__()
+        self.setAutoDelete(False)
+        self.signals = StartupSignals()
+        self._settings_manager = settings_manager
+        self._glass_catalog_service = glass_catalog_service
+        self._autosave_service = autosave_service
+
+    def run(self) -> None:
+        try:
+            settings = self._settings_manager.load()
+            catalog, existed = self._glass_catalog_service.load_or_empty()
+            if not existed:
+                self._glass_catalog_service.save(catalog)
+            payload = self._autosave_service.load_state()
+        except Exception as exc:
+            logger.exception("Ошибка загрузки данных при запуске")
+            self.signals.failed.emit(str(exc))
+        else:
+            self.signals.loaded.emit(StartupData(settings, catalog, existed, payload))
@@ -1,12 +1,34 @@
 from __future__ import annotations
 
+import multiprocessing
 import sys
 
-from sibglass_app.app import SibglassApplication
+STARTUP_PROFILE_FLAG = "--startup-profile"
 
 
 def main() -> int:
-    app = SibglassApplication()
+    # В собранном PyInstaller .exe процессы пула пакетного режима запускают тот же exe:
+    # freeze_support перехватывает такой запуск, иначе каждый исполнитель снова выполнил бы main()
+    multiprocessing.freeze_support()
+
+    # Пакетный режим не тянет за собой PySide6
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from sibglass_app.cli import main as batch_main
+
+        return batch_main(sys.argv[2:])
+
+    profile = None
+    if STARTUP_PROFILE_FLAG in sys.argv[1:]:
+        # Окно показывается, печатается разбивка времени запуска, и приложение закрывается
+        from sibglass_app.utils.startup_profile import STARTUP_MODULES, StartupProfile
+
+        profile = StartupProfile()
+        for name in STARTUP_MODULES:
+            profile.import_module(name)
+
+    from sibglass_app.app import SibglassApplication
+
+    app = SibglassApplication(profile=profile)
     return app.run()
 
 
@@ -1,14 +1,52 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+
+class CatalogSection:
+    """Раздел справочника: множество значений с сохранением порядка добавления.
+
+    Проверка на дубликат — O(1) вместо поиска по списку.
+    """
+
+    def __init__(self, values: Iterable[str] = ()) -> None:
+        self._values: dict[str, None] = dict.fromkeys(values)
+
+    def add(self, value: str) -> bool:
+        if value in self._values:
+            return False
+        self._values[value] = None
+        return True
+
+    def discard(self, value: str) -> None:
+        self._values.pop(value, None)
+
+    def __contains__(self, value: object) -> bool:
+        return value in self._values
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CatalogSection):
+            return NotImplemented
+        # Порядок важен: он определяет порядок пунктов в списках выбора
+        return list(self._values) == list(other._values)
+
+    def __repr__(self) -> str:
+        return f"CatalogSection({list(self._values)!r})"
 
 
 @dataclass
 class GlassCatalog:
-    outer_glass: list[str] = field(default_factory=list)
-    middle_glass: list[str] = field(default_factory=list)
-    inner_glass: list[str] = field(default_factory=list)
-    spacers: list[str] = field(default_factory=list)
+    outer_glass: CatalogSection = field(default_factory=CatalogSection)
+    middle_glass: CatalogSection = field(default_factory=CatalogSection)
+    inner_glass: CatalogSection = field(default_factory=CatalogSection)
+    spacers: CatalogSection = field(default_factory=CatalogSection)
 
 
 SECTION_MAP = {
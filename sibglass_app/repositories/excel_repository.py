@@ -1,47 +1,197 @@
 from __future__ import annotations
 
+import codecs
+import re
+import zipfile
 from pathlib import Path
+from typing import Callable, Iterator, TypeVar
+from xml.parsers import expat
 
+from sibglass_app.repositories.template_pool import TemplatePool, TemplatePoolStats
+from sibglass_app.repositories.workbook_cache import CacheStats, WorkbookCache
+from sibglass_app.utils.xlsx_refs import xml_escape
+
+T = TypeVar("T")
+
+_CHUNK_SIZE = 256 * 1024
+# Rich-text прогоны (<r>) и числовые ссылки (&#...;) могут спрятать текст от поиска по сырому XML
+_NEEDS_XML_PARSE = re.compile(r"<(?:\w+:)?r[\s>]|&#")
+
+
+def _xls_cell_text(value) -> str:
+    # xlrd хранит числа как float; текст нужен только на выходе строки, и целые
+    # пишутся без ".0" — так же, как их отдает .xlsx (иначе "6" и "2" превращаются в "6.0" и "2.0")
+    if value.__class__ is str:
+        return value.strip()
+    if value.__class__ is float and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+class _MarkerFound(Exception):
+    pass
+
+
+def _raw_scan(archive: zipfile.ZipFile, name: str, needle: str) -> tuple[bool, bool]:
+    """Поиск по сырому тексту XML: (кандидат найден, нужен честный разбор XML)."""
+    escaped = xml_escape(needle, quote=True)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    overlap = max(len(escaped), 8)
+    tail = ""
+    needs_parse = False
+    with archive.open(name) as stream:
+        for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b""):
+            window = tail + decoder.decode(chunk).lower()
+            if escaped in window:
+                return True, True
+            if not needs_parse and _NEEDS_XML_PARSE.search(window):
+                needs_parse = True
+            tail = window[-overlap:]
+    return False, needs_parse
+
+
+def _parse_contains(archive: zipfile.ZipFile, name: str, needle: str) -> bool:
+    """Инкрементальный разбор XML: тексты <si>/<is> и строковые результаты формул."""
+    parser = expat.ParserCreate(namespace_separator="}")
+    parser.buffer_text = True
+    parts: list[str] = []
+    state = {"collecting": False, "capture": False}
+
+    def start(tag: str, attrs: dict[str, str]) -> None:
+        local = tag.rsplit("}", 1)[-1]
+        if local in ("si", "is") or (local == "c" and attrs.get("t") == "str"):
+            state["collecting"] = True
+            parts.clear()
+        elif local in ("t", "v") and state["collecting"]:
+            state["capture"] = True
+        elif local == "rPh":
+            # Фонетические подсказки не входят в значение ячейки
+            state["collecting"] = False
+
+    def end(tag: str) -> None:
+        local = tag.rsplit("}", 1)[-1]
+        if local in ("t", "v"):
+            state["capture"] = False
+        elif local in ("si", "is", "c"):
+            if state["collecting"] and needle in "".join(parts).lower():
+                raise _MarkerFound
+            state["collecting"] = False
+        elif local == "rPh":
+            state["collecting"] = True
+
+    def data(text: str) -> None:
+        if state["capture"]:
+            parts.append(text)
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = data
+    try:
+        with archive.open(name) as stream:
+            for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b""):
+                parser.Parse(chunk, False)
+        parser.Parse(b"", True)
+    except _MarkerFound:
+        return True
+    return False
 
 
 class ExcelRepository:
+    def __init__(self, cache: WorkbookCache | None = None, template_pool: TemplatePool | None = None) -> None:
+        self._cache = cache if cache is not None else WorkbookCache()
+        self._template_pool = template_pool if template_pool is not None else TemplatePool()
+
+    @property
+    def cache_stats(self) -> CacheStats:
+        return self._cache.stats
+
+    @property
+    def template_stats(self) -> TemplatePoolStats:
+        return self._template_pool.stats
+
+    def cached(self, path: str, kind: str, loader: Callable[[], T]) -> T:
+        return self._cache.get_or_load(path, kind, loader)
+
     def read_lines(self, path: str) -> list[str]:
         return [" ".join(row).strip() for row in self.read_rows(path) if any(cell.strip() for cell in row)]
 
     def read_rows(self, path: str) -> list[list[str]]:
+        return self.cached(path, "rows", lambda: list(self.iter_rows(path)))
+
+    def iter_rows(self, path: str) -> Iterator[list[str]]:
+        """Построчно отдает ячейки всех листов; чтение прекращается, как только потребитель остановился."""
         suffix = Path(path).suffix.lower()
         if suffix == ".xlsx":
-            return self._read_xlsx_rows(path)
+            return self._iter_xlsx_rows(path)
         if suffix == ".xls":
-            return self._read_xls_rows(path)
+            return self._iter_xls_rows(path)
         raise ValueError("Поддерживаются только файлы .xlsx и .xls")
 
+    def quick_contains(self, path: str, text: str) -> bool | None:
+        """Быстрый поиск текста по строкам .xlsx без построения книги.
+
+        True — текст найден; False — гарантированно отсутствует;
+        None — быстрый поиск не дал ответа, нужен полный разбор.
+        """
+        if Path(path).suffix.lower() != ".xlsx":
+            return None
+        try:
+            found = self._scan_xlsx_strings(path, text.lower())
+        except (OSError, zipfile.BadZipFile, expat.ExpatError):
+            return None
+        if found:
+            return True
+        # Значения строки склеиваются через пробел, поэтому маркер с пробелами
+        # может оказаться разнесен по соседним ячейкам, а цифры — совпасть с числом;
+        # в этих случаях решает только полный разбор
+        if any(ch.isspace() or ch.isdigit() for ch in text):
+            return None
+        return False
+
     def open_workbook(self, path: str):
         suffix = Path(path).suffix.lower()
         if suffix != ".xlsx":
             raise ValueError(
                 "Файл заявки должен быть в формате .xlsx. Для записи в .xls сохраните шаблон как .xlsx и выберите его."
             )
-        from openpyxl import load_workbook
+        return self._template_pool.checkout(path)
 
-        return load_workbook(path)
+    def remember_template(self, path: str, workbook) -> None:
+        self._template_pool.remember(path, workbook)
 
     @staticmethod
-    def _read_xlsx_rows(path: str) -> list[list[str]]:
+    def _scan_xlsx_strings(path: str, needle: str) -> bool:
+        with zipfile.ZipFile(path) as archive:
+            names = archive.namelist()
+            shared = [name for name in names if name.lower().startswith("xl/") and name.lower().endswith("sharedstrings.xml")]
+            sheets = [name for name in names if name.lower().startswith("xl/worksheets/") and name.lower().endswith(".xml")]
+            if not sheets:
+                raise zipfile.BadZipFile("В архиве нет листов Excel")
+
+            # Сначала общий словарь строк, затем inline-строки листов
+            for name in shared + sheets:
+                candidate, needs_parse = _raw_scan(archive, name, needle)
+                if (candidate or needs_parse) and _parse_contains(archive, name, needle):
+                    return True
+        return False
+
+    @staticmethod
+    def _iter_xlsx_rows(path: str) -> Iterator[list[str]]:
         from openpyxl import load_workbook
 
-        workbook = load_workbook(path, data_only=True)
-        rows: list[list[str]] = []
-        for sheet in workbook.worksheets:
-            for row in sheet.iter_rows(min_row=1, max_row=sheet.max_row, min_col=1, max_col=sheet.max_column):
-                rows.append([
-                    str(cell.value).strip() if cell.value is not None else ""
-                    for cell in row
-                ])
-        return rows
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                # В режиме read_only openpyxl верит <dimension> листа; в выгрузках он бывает устаревшим,
+                # и строки со столбцами за его пределами терялись бы. Без него читаются все ячейки листа
+                sheet.reset_dimensions()
+                for row in sheet.iter_rows(values_only=True):
+                    yield [str(value).strip() if value is not None else "" for value in row]
+        finally:
+            workbook.close()
 
     @staticmethod
-    def _read_xls_rows(path: str) -> list[list[str]]:
+    def _iter_xls_rows(path: str) -> Iterator[list[str]]:
         try:
             import xlrd  # type: ignore
         except ImportError as exc:
@@ -49,12 +199,17 @@ class ExcelRepository:
                 "Для чтения файлов .xls установите зависимость xlrd>=2.0.1: pip install xlrd"
             ) from exc
 
-        book = xlrd.open_workbook(path)
-        rows: list[list[str]] = []
-        for sheet in book.sheets():
-            for row_idx in range(sheet.nrows):
-                rows.append([
-                    str(sheet.cell_value(row_idx, col_idx)).strip()
-                    for col_idx in range(sheet.ncols)
-                ])
-        return rows
+        # Листы загружаются по одному и выгружаются после чтения: если потребитель
+        # остановился (разбор дошел до "Сумма:"), следующие листы не разбираются вовсе.
+        # ragged_rows — строка отдается без пустого хвоста до ширины листа
+        book = xlrd.open_workbook(path, on_demand=True, ragged_rows=True)
+        try:
+            for sheet_idx in range(book.nsheets):
+                sheet = book.sheet_by_index(sheet_idx)
+                try:
+                    for row_idx in range(sheet.nrows):
+                        yield [_xls_cell_text(value) for value in sheet.row_values(row_idx)]
+                finally:
+                    book.unload_sheet(sheet_idx)
+        finally:
+            book.release_resources()
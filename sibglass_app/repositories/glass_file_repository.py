@@ -1,21 +1,52 @@
 from __future__ import annotations
 
+import hashlib
+from dataclasses import dataclass
+
 from sibglass_app.config.paths import GLASS_FILE
 from sibglass_app.models.glass_catalog import GlassCatalog, SECTION_MAP
 
 
 _NORMALIZED_SECTION_MAP = {key.strip().lower(): value for key, value in SECTION_MAP.items()}
+_SECTION_TITLES = {value: key for key, value in SECTION_MAP.items()}
+
+
+@dataclass
+class GlassFileState:
+    """Состояние glass.txt на момент последнего чтения или записи этим процессом."""
+
+    mtime_ns: int
+    size: int
+    hasher: object
+    tail_section: str | None = None
+    ends_with_newline: bool = True
+    # Разделы встречаются в файле несколько раз (после дописываний) — файл стоит уплотнить
+    fragmented: bool = False
+
+    @property
+    def signature(self) -> tuple[int, int]:
+        return self.mtime_ns, self.size
+
+    @property
+    def digest(self) -> bytes:
+        return self.hasher.digest()
 
 
 class GlassFileRepository:
     def load(self) -> GlassCatalog:
+        return self.load_with_state()[0]
+
+    def load_with_state(self) -> tuple[GlassCatalog, GlassFileState]:
         if not GLASS_FILE.exists():
             raise FileNotFoundError(GLASS_FILE)
 
+        data = GLASS_FILE.read_bytes()
         catalog = GlassCatalog()
         current_section: str | None = None
+        seen_sections: set[str] = set()
+        fragmented = False
 
-        for raw in GLASS_FILE.read_text(encoding="utf-8").splitlines():
+        for raw in data.decode("utf-8").splitlines():
             line = raw.strip()
             if not line:
                 continue
@@ -23,15 +54,50 @@ class GlassFileRepository:
             header_key = line.replace(":", "").strip().lower()
             if header_key in _NORMALIZED_SECTION_MAP:
                 current_section = _NORMALIZED_SECTION_MAP[header_key]
+                fragmented = fragmented or current_section in seen_sections
+                seen_sections.add(current_section)
                 continue
 
             if current_section:
-                items = getattr(catalog, current_section)
-                if line not in items:
-                    items.append(line)
-        return catalog
+                getattr(catalog, current_section).add(line)
+        return catalog, self._state(data, current_section, fragmented)
 
-    def save(self, catalog: GlassCatalog) -> None:
+    @staticmethod
+    def signature() -> tuple[int, int] | None:
+        if not GLASS_FILE.exists():
+            return None
+        stat = GLASS_FILE.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def append(self, state: GlassFileState, section_attr: str, value: str) -> GlassFileState:
+        # Значение дописывается в конец файла; если последний раздел другой, перед ним повторяется
+        # заголовок — load() собирает повторяющиеся разделы в один
+        chunks: list[str] = []
+        if not state.ends_with_newline:
+            chunks.append("\n")
+        switch_section = state.tail_section != section_attr
+        if switch_section:
+            if state.size:
+                chunks.append("\n")
+            chunks.append(f"{_SECTION_TITLES[section_attr]}:\n")
+        chunks.append(f"{value}\n")
+        data = "".join(chunks).encode("utf-8")
+
+        with open(GLASS_FILE, "ab") as handle:
+            handle.write(data)
+
+        hasher = state.hasher.copy()
+        hasher.update(data)
+        stat = GLASS_FILE.stat()
+        return GlassFileState(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            hasher=hasher,
+            tail_section=section_attr,
+            fragmented=state.fragmented or (switch_section and state.tail_section is not None),
+        )
+
+    def save(self, catalog: GlassCatalog) -> GlassFileState:
         sections = [
             ("Стекло наружное", catalog.outer_glass),
             ("Стекло среднее", catalog.middle_glass),
@@ -43,4 +109,18 @@ class GlassFileRepository:
             chunks.append(f"{title}:")
             chunks.extend(values)
             chunks.append("")
-        GLASS_FILE.write_text("\n".join(chunks).strip() + "\n", encoding="utf-8")
+        data = ("\n".join(chunks).strip() + "\n").encode("utf-8")
+        GLASS_FILE.write_bytes(data)
+        return self._state(data, "spacers", False)
+
+    @staticmethod
+    def _state(data: bytes, tail_section: str | None, fragmented: bool) -> GlassFileState:
+        stat = GLASS_FILE.stat()
+        return GlassFileState(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            hasher=hashlib.blake2b(data, digest_size=16),
+            tail_section=tail_section,
+            ends_with_newline=not data or data.endswith(b"\n"),
+            fragmented=fragmented,
+        )
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import copyreg
+import io
+import logging
+import pickle
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TemplatePoolStats:
+    hits: int = 0
+    misses: int = 0
+    templates: int = 0
+
+
+class TemplatePool:
+    """Пул предзагруженных шаблонов заявки.
+
+    Каждый шаблон разбирается openpyxl один раз и хранится как pickle-снимок
+    модели книги; каждый запрос получает независимую копию из снимка, что в
+    разы дешевле повторного load_workbook. Снимок сбрасывается при изменении
+    файла (mtime/размер). Если заявка сохраняется поверх самого шаблона,
+    снимок обновляется из записанной книги (remember) и остается действительным.
+    """
+
+    DEFAULT_MAX_TEMPLATES = 4
+
+    def __init__(self, max_templates: int = DEFAULT_MAX_TEMPLATES) -> None:
+        self._max_templates = max_templates
+        self._snapshots: OrderedDict[str, tuple[tuple[int, int], bytes]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def checkout(self, path: str):
+        resolved = str(Path(path).resolve())
+        stat = Path(resolved).stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._snapshots.get(resolved)
+            if entry is not None and entry[0] == version:
+                self._snapshots.move_to_end(resolved)
+                self._hits += 1
+                snapshot = entry[1]
+            else:
+                self._misses += 1
+                snapshot = None
+
+        if snapshot is not None:
+            return pickle.loads(snapshot)
+
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(resolved)
+        self._store(resolved, version, workbook)
+        return workbook
+
+    def remember(self, path: str, workbook) -> None:
+        """Запоминает книгу, только что сохраненную в path, как новое содержимое шаблона."""
+        resolved = str(Path(path).resolve())
+        stat = Path(resolved).stat()
+        self._store(resolved, (stat.st_mtime_ns, stat.st_size), workbook)
+
+    def _store(self, resolved: str, version: tuple[int, int], workbook) -> None:
+        try:
+            snapshot = _dumps(workbook)
+        except Exception:
+            # Экзотические объекты шаблона не сериализуются — работаем без пула
+            logger.warning("Шаблон %s не удалось поместить в пул, он будет загружаться каждый раз", resolved)
+            with self._lock:
+                self._snapshots.pop(resolved, None)
+            return
+
+        with self._lock:
+            self._snapshots[resolved] = (version, snapshot)
+            self._snapshots.move_to_end(resolved)
+            while len(self._snapshots) > self._max_templates:
+                self._snapshots.popitem(last=False)
+
+    def invalidate(self, path: str | None = None) -> None:
+        with self._lock:
+            if path is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(str(Path(path).resolve()), None)
+
+    @property
+    def stats(self) -> TemplatePoolStats:
+        with self._lock:
+            return TemplatePoolStats(hits=self._hits, misses=self._misses, templates=len(self._snapshots))
+
+
+def _dumps(workbook) -> bytes:
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = _dispatch_table()
+    pickler.dump(workbook)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=1)
+def _dispatch_table() -> dict:
+    from openpyxl.worksheet.dimensions import DimensionHolder
+
+    table = copyreg.dispatch_table.copy()
+    table[DimensionHolder] = _reduce_dimensions
+    return table
+
+
+def _reduce_dimensions(holder):
+    # defaultdict.__reduce__ теряет __dict__ (worksheet, reference), а DimensionHolder(factory)
+    # восстанавливается без default_factory: новые строки и столбцы давали бы KeyError
+    return _new_dimensions, (type(holder), holder.default_factory), dict(vars(holder)), None, iter(holder.items())
+
+
+def _new_dimensions(cls, default_factory):
+    holder = defaultdict.__new__(cls)
+    defaultdict.__init__(holder, default_factory)
+    return holder
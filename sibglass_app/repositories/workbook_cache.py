@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+_HASH_CHUNK = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    path: str
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes_used: int = 0
+
+
+def fingerprint_file(path: str) -> FileFingerprint:
+    resolved = Path(path).resolve()
+    stat = resolved.stat()
+    digest = hashlib.blake2b(digest_size=16)
+    with resolved.open("rb") as stream:
+        for chunk in iter(lambda: stream.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return FileFingerprint(
+        path=str(resolved),
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        digest=digest.hexdigest(),
+    )
+
+
+def estimate_size(value: Any) -> int:
+    """Грубая оценка занимаемой памяти: строки, списки строк и dataclass-объекты."""
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in vars(value).values())
+    return sys.getsizeof(value)
+
+
+class WorkbookCache:
+    """LRU-кэш результатов чтения Excel-файлов.
+
+    Ключ — отпечаток файла (путь, mtime, размер, хэш содержимого) и вид данных
+    ("rows", "formulas", ...). Хэш пересчитывается, только когда у файла изменились
+    mtime или размер, поэтому попадание в кэш не читает файл. При изменении файла
+    старые записи становятся недостижимыми и вытесняются по мере заполнения лимита памяти.
+    """
+
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[FileFingerprint, str], tuple[Any, int]] = OrderedDict()
+        # Последний отпечаток каждого файла: по совпадению (mtime, размер) хэш берется отсюда
+        self._fingerprints: dict[str, FileFingerprint] = {}
+        self._bytes_used = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.RLock()
+
+    def get_or_load(self, path: str, kind: str, loader: Callable[[], T]) -> T:
+        key = (self._fingerprint(path), kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        value = loader()
+        self._store(key, value)
+        return value
+
+    def invalidate(self, path: str | None = None) -> None:
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._fingerprints.clear()
+                self._bytes_used = 0
+                return
+            resolved = str(Path(path).resolve())
+            self._fingerprints.pop(resolved, None)
+            for key in [key for key in self._entries if key[0].path == resolved]:
+                _, size = self._entries.pop(key)
+                self._bytes_used -= size
+
+    def _fingerprint(self, path: str) -> FileFingerprint:
+        resolved = Path(path).resolve()
+        stat = resolved.stat()
+        with self._lock:
+            known = self._fingerprints.get(str(resolved))
+        if known is not None and (known.mtime_ns, known.size) == (stat.st_mtime_ns, stat.st_size):
+            return known
+        fingerprint = fingerprint_file(str(resolved))
+        with self._lock:
+            self._fingerprints[fingerprint.path] = fingerprint
+        return fingerprint
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                bytes_used=self._bytes_used,
+            )
+
+    def _store(self, key: tuple[FileFingerprint, str], value: Any) -> None:
+        size = estimate_size(value)
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            # Более старые версии того же файла больше не понадобятся
+            for stale in [k for k in self._entries if k[0].path == key[0].path and k[0] != key[0]]:
+                _, stale_size = self._entries.pop(stale)
+                self._bytes_used -= stale_size
+                self._evictions += 1
+
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes_used -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes_used += size
+
+            while self._bytes_used > self._max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes_used -= evicted_size
+                self._evictions += 1
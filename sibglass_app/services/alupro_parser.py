@@ -1,65 +1,161 @@
 from __future__ import annotations
 
 import re
+import time
+from contextlib import closing
+from dataclasses import replace
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
 
 from sibglass_app.models.formula_item import FormulaItem
 from sibglass_app.repositories.excel_repository import ExcelRepository
 
+if TYPE_CHECKING:
+    from sibglass_app.services.metrics_service import PhaseMetrics
+
+
+_DIGITS = re.compile(r"\d+")
+_WORD_NUMBER = re.compile(r"\b\d+\b")
+_SIZE_PAIR = re.compile(r"(\d{2,5})\s*[xXхХ+]\s*(\d{2,5})")
+
+_TOTAL_MARKER = "сумма:"
+_FILLINGS_MARKER = "заполнения"
+_FORMULA_TOKENS = ("наименование",)
+_WIDTH_TOKENS = ("ширина",)
+_HEIGHT_TOKENS = ("высота",)
+_COUNT_TOKENS = ("кол-во", "кол во", "количество")
+
 
 class AluProParserService:
+    PROGRESS_STEP = 500
+
     def __init__(self, excel_repository: ExcelRepository) -> None:
         self._excel_repository = excel_repository
 
-    def parse(self, path: str) -> list[FormulaItem]:
-        rows = self._excel_repository.read_rows(path)
-
-        table_items = self._parse_by_table_headers(rows)
-        if table_items:
-            return table_items
-
-        block = self._extract_fillings_block(rows)
-        parsed: list[FormulaItem] = []
-        for row in block:
-            item = self._parse_row_fallback(row)
-            if item is not None:
-                parsed.append(item)
-        return parsed
-
-    def _parse_by_table_headers(self, rows: list[list[str]]) -> list[FormulaItem]:
-        header_idx = -1
-        formula_col = width_col = height_col = count_col = -1
-
-        for idx, row in enumerate(rows):
-            normalized = [c.strip().lower() for c in row]
-            c_formula = self._find_col(normalized, ["наименование"])
-            c_width = self._find_col(normalized, ["ширина"])
-            c_height = self._find_col(normalized, ["высота"])
-            c_count = self._find_col(normalized, ["кол-во", "кол во", "количество"])
-            if min(c_formula, c_width, c_height, c_count) >= 0:
-                header_idx = idx
-                formula_col, width_col, height_col, count_col = c_formula, c_width, c_height, c_count
-                break
+    def parse(
+        self,
+        path: str,
+        progress: Callable[[int], None] | None = None,
+        metrics: PhaseMetrics | None = None,
+    ) -> list[FormulaItem]:
+        """metrics получает число прочитанных строк и время чтения; при попадании в кэш они не заполняются."""
+        items = self._excel_repository.cached(path, "formulas", lambda: self._parse_uncached(path, progress, metrics))
+        # Копии, чтобы вызывающий код не мог испортить закэшированный результат
+        return [replace(item) for item in items]
+
+    def _iter_rows(self, path: str, progress: Callable[[int], None] | None) -> Iterator[list[str]]:
+        with closing(self._excel_repository.iter_rows(path)) as rows:
+            for count, row in enumerate(rows, start=1):
+                if progress is not None and count % self.PROGRESS_STEP == 0:
+                    progress(count)
+                yield row
 
-        if header_idx < 0:
-            return []
+    @staticmethod
+    def _timed_rows(rows: Iterator[list[str]], metrics: PhaseMetrics) -> Iterator[list[str]]:
+        # Время чтения отделяется от разбора: замеряется только ожидание очередной строки
+        clock = time.perf_counter
+        metrics.read_seconds = metrics.read_seconds or 0.0
+        while True:
+            started = clock()
+            row = next(rows, None)
+            metrics.read_seconds += clock() - started
+            if row is None:
+                return
+            metrics.rows += 1
+            yield row
+
+    def _parse_uncached(
+        self,
+        path: str,
+        progress: Callable[[int], None] | None = None,
+        metrics: PhaseMetrics | None = None,
+    ) -> list[FormulaItem]:
+        with closing(self._iter_rows(path, progress)) as rows:
+            if metrics is None:
+                return self.parse_rows(rows)
+            return self.parse_rows(self._timed_rows(rows, metrics))
+
+    def parse_rows(self, rows: Iterable[list[str]]) -> list[FormulaItem]:
+        """Один проход по строкам: таблица с заголовками и блок "Заполнения" распознаются одновременно.
+
+        Таблица с заголовками приоритетнее; блок "Заполнения" используется,
+        только если таблица не дала ни одной позиции.
+        """
+        header: tuple[int, int, int, int] | None = None
+        table_items: list[FormulaItem] = []
+        table_done = False
+
+        fillings_started = False
+        fillings_done = False
+        fillings_items: list[FormulaItem] = []
 
-        items: list[FormulaItem] = []
-        for row in rows[header_idx + 1 :]:
-            joined = " ".join(cell.strip().lower() for cell in row if cell)
-            if "сумма:" in joined:
+        for row in rows:
+            joined = " ".join(cell for cell in row if cell).lower()
+
+            if header is None:
+                header = self._match_header(row, joined)
+            elif not table_done:
+                if _TOTAL_MARKER in joined:
+                    table_done = True
+                    if table_items:
+                        return table_items
+                else:
+                    item = self._parse_table_row(row, header)
+                    if item is not None:
+                        table_items.append(item)
+
+            # Блок "Заполнения" нужен, только пока таблица не дала позиций
+            if not fillings_done and not table_items:
+                if _FILLINGS_MARKER in joined:
+                    fillings_started = True
+                elif fillings_started:
+                    if _TOTAL_MARKER in joined:
+                        fillings_done = True
+                    else:
+                        item = self._parse_row_fallback(row)
+                        if item is not None:
+                            fillings_items.append(item)
+
+            if fillings_done and table_done:
                 break
 
-            raw_formula = self._safe_get(row, formula_col)
-            formula = self._extract_formula([raw_formula] + row)
-            if not formula:
-                continue
+        return table_items or fillings_items
+
+    @classmethod
+    def _match_header(cls, row: list[str], joined: str) -> tuple[int, int, int, int] | None:
+        # Дешевая проверка по всей строке отсекает почти все строки без разбора по ячейкам
+        if not (
+            _FORMULA_TOKENS[0] in joined
+            and _WIDTH_TOKENS[0] in joined
+            and _HEIGHT_TOKENS[0] in joined
+            and any(token in joined for token in _COUNT_TOKENS)
+        ):
+            return None
 
-            width = self._parse_int(self._safe_get(row, width_col))
-            height = self._parse_int(self._safe_get(row, height_col))
-            count = self._parse_int(self._safe_get(row, count_col), default=1)
-            items.append(FormulaItem(formula=formula, width=width, height=height, count=max(count, 1)))
+        normalized = [c.strip().lower() for c in row]
+        columns = (
+            cls._find_col(normalized, _FORMULA_TOKENS),
+            cls._find_col(normalized, _WIDTH_TOKENS),
+            cls._find_col(normalized, _HEIGHT_TOKENS),
+            cls._find_col(normalized, _COUNT_TOKENS),
+        )
+        if min(columns) < 0:
+            return None
+        return columns
+
+    @classmethod
+    def _parse_table_row(cls, row: list[str], header: tuple[int, int, int, int]) -> FormulaItem | None:
+        formula_col, width_col, height_col, count_col = header
+        # Колонка "Наименование" приоритетнее остальных ячеек: иначе номер позиции 5..24
+        # в колонке "№" выигрывает у однокамерной формулы вроде "6"
+        formula = _formula_candidate(cls._safe_get(row, formula_col)) or cls._extract_formula(row)
+        if not formula:
+            return None
 
-        return items
+        width = cls._parse_int(cls._safe_get(row, width_col))
+        height = cls._parse_int(cls._safe_get(row, height_col))
+        count = cls._parse_int(cls._safe_get(row, count_col), default=1)
+        return FormulaItem(formula=formula, width=width, height=height, count=max(count, 1))
 
     @staticmethod
     def _safe_get(row: list[str], index: int) -> str:
@@ -68,7 +164,7 @@ class AluProParserService:
         return row[index].strip()
 
     @staticmethod
-    def _find_col(cells: list[str], tokens: list[str]) -> int:
+    def _find_col(cells: list[str], tokens: tuple[str, ...]) -> int:
         for idx, cell in enumerate(cells):
             if any(token in cell for token in tokens):
                 return idx
@@ -76,26 +172,11 @@ class AluProParserService:
 
     @staticmethod
     def _parse_int(text: str, default: int = 0) -> int:
-        match = re.search(r"\d+", text.replace(",", "."))
+        match = _DIGITS.search(text)
         if not match:
             return default
         return int(match.group(0))
 
-    @staticmethod
-    def _extract_fillings_block(rows: list[list[str]]) -> list[list[str]]:
-        started = False
-        block: list[list[str]] = []
-        for row in rows:
-            joined = " ".join(cell for cell in row if cell).lower()
-            if "заполнения" in joined:
-                started = True
-                continue
-            if started and "сумма:" in joined:
-                break
-            if started:
-                block.append(row)
-        return block
-
     def _parse_row_fallback(self, row: list[str]) -> FormulaItem | None:
         cells = [cell.strip() for cell in row if cell and cell.strip()]
         if not cells:
@@ -112,44 +193,38 @@ class AluProParserService:
 
     @staticmethod
     def _extract_formula(cells: list[str]) -> str:
-        cleaned = []
-        for cell in cells:
-            value = cell.split(",", 1)[0].strip()
-            if value:
-                cleaned.append(value)
-
-        candidates = [c for c in cleaned if AluProParserService._is_formula_candidate(c)]
+        candidates = [value for value in map(_formula_candidate, cells) if value]
         if not candidates:
             return ""
 
-        # Приоритет строкам с дефисами (типичные формулы стеклопакета), затем более длинным
-        candidates.sort(key=lambda x: (("-" in x), len(x)), reverse=True)
-        return candidates[0]
+        # Приоритет строкам с дефисами (типичные формулы стеклопакета), затем более длинным;
+        # при равенстве побеждает первый кандидат
+        return max(candidates, key=lambda x: (("-" in x), len(x)))
 
     @staticmethod
     def _is_formula_candidate(value: str) -> bool:
         lowered = value.lower()
         if not value:
             return False
-        if "заполнения" in lowered or "сумма:" in lowered:
+        if _FILLINGS_MARKER in lowered or _TOTAL_MARKER in lowered:
             return False
         if "glass" == lowered or "площад" in lowered or "ширина" in lowered or "высота" in lowered or "кол-во" in lowered:
             return False
 
         # Отсекаем строки индексов 0..4, но оставляем реальные одинарные толщины (6, 8, 10, ...)
-        if re.fullmatch(r"\d+", value):
+        if value.isdecimal():
             num = int(value)
             return 5 <= num <= 24
 
-        return bool(re.search(r"\d", value) and ("-" in value or "+" in value or "mm" in lowered))
+        return ("-" in value or "+" in value or "mm" in lowered) and _DIGITS.search(value) is not None
 
     @staticmethod
     def _extract_size(source: str) -> tuple[int, int]:
-        pair_match = re.search(r"(\d{2,5})\s*[xXхХ+]\s*(\d{2,5})", source)
+        pair_match = _SIZE_PAIR.search(source)
         if pair_match:
             return int(pair_match.group(1)), int(pair_match.group(2))
 
-        numbers = [int(n) for n in re.findall(r"\d+", source)]
+        numbers = [int(n) for n in _DIGITS.findall(source)]
         if len(numbers) >= 2:
             return numbers[0], numbers[1]
         return 0, 0
@@ -157,8 +232,17 @@ class AluProParserService:
     @staticmethod
     def _extract_count(source: str) -> int:
         # Обычно количество маленькое число в конце строки; забираем последнее однозначное/двузначное
-        numbers = [int(n) for n in re.findall(r"\b\d+\b", source)]
+        numbers = [int(n) for n in _WORD_NUMBER.findall(source)]
         for value in reversed(numbers):
             if 1 <= value <= 999:
                 return value
         return 1
+
+
+@lru_cache(maxsize=16384)
+def _formula_candidate(cell: str) -> str:
+    # Значения ячеек в выгрузках сильно повторяются (размеры, формулы), поэтому классификация кэшируется
+    value = cell.partition(",")[0].strip()
+    if value and AluProParserService._is_formula_candidate(value):
+        return value
+    return ""
@@ -1,23 +1,83 @@
 from __future__ import annotations
 
+import hashlib
 import json
+from dataclasses import dataclass
 from typing import Any
 
 from sibglass_app.config.paths import AUTOSAVE_FILE
+from sibglass_app.services.save_service import AtomicSaveService
+
+
+@dataclass
+class AutosaveStats:
+    requests: int = 0
+    writes: int = 0
+    unchanged: int = 0
+    coalesced: int = 0
 
 
 class AutosaveService:
+    """Отложенное автосохранение состояния формы.
+
+    Изменения только помечают состояние "грязным" (mark_dirty); запись на диск
+    делает flush, который контроллер вызывает по истечении паузы в вводе. Серия
+    изменений дает одну запись, а если содержимое не изменилось — ни одной.
+    """
+
+    def __init__(self, save_service: AtomicSaveService | None = None) -> None:
+        # Автосохранение — страховка от сбоя, fsync на каждую запись для него избыточен
+        self._save_service = save_service or AtomicSaveService(fsync=False)
+        self._pending = 0
+        self._last_digest: bytes | None = None
+        self._stats = AutosaveStats()
+
+    @property
+    def is_dirty(self) -> bool:
+        return self._pending > 0
+
+    @property
+    def stats(self) -> AutosaveStats:
+        return AutosaveStats(**vars(self._stats))
+
+    def mark_dirty(self) -> None:
+        self._pending += 1
+        self._stats.requests += 1
+
+    def flush(self, payload: dict[str, Any]) -> bool:
+        if not self._pending:
+            return False
+        self._stats.coalesced += self._pending - 1
+        self._pending = 0
+
+        data = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        if digest == self._last_digest:
+            self._stats.unchanged += 1
+            return False
+
+        self._save_service.write_bytes(AUTOSAVE_FILE, data)
+        self._last_digest = digest
+        self._stats.writes += 1
+        return True
+
     def save_state(self, payload: dict[str, Any]) -> None:
-        AUTOSAVE_FILE.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        self.mark_dirty()
+        self.flush(payload)
 
     def load_state(self) -> dict[str, Any] | None:
         if not AUTOSAVE_FILE.exists():
             return None
         try:
-            return json.loads(AUTOSAVE_FILE.read_text(encoding="utf-8"))
+            data = AUTOSAVE_FILE.read_bytes()
+            payload = json.loads(data.decode("utf-8"))
         except Exception:
             return None
+        self._last_digest = hashlib.blake2b(data, digest_size=16).digest()
+        return payload
 
     def clear(self) -> None:
+        self._pending = 0
+        self._last_digest = None
         if AUTOSAVE_FILE.exists():
             AUTOSAVE_FILE.unlink()
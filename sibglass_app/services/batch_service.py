@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, fields
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from sibglass_app.services.metrics_service import ConversionMetrics, MetricsLog
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SUFFIXES = {".xlsx", ".xls"}
+
+
+@dataclass
+class GlassOptions:
+    outer: str = ""
+    middle: str = ""
+    inner: str = ""
+    spacer: str = ""
+    zak_outer: bool = False
+    zak_middle: bool = False
+    zak_inner: bool = False
+    argon: bool = False
+    customer: str = ""
+    address: str = ""
+
+    @classmethod
+    def from_profile(cls, path: str) -> GlassOptions:
+        # Ключи совпадают с autosave.tmp, поэтому профилем может служить и автосохранение
+        payload = json.loads(Path(path).read_text(encoding="utf-8"))
+        known = {item.name for item in fields(cls)}
+        return cls(**{key: value for key, value in payload.items() if key in known})
+
+    def merged(self, overrides: dict[str, Any]) -> GlassOptions:
+        values = asdict(self)
+        values.update({key: value for key, value in overrides.items() if value is not None})
+        return GlassOptions(**values)
+
+
+@dataclass
+class BatchJob:
+    alupro_path: str
+    template_path: str
+    output_path: str
+    options: GlassOptions
+    writer_backend: str = "auto"
+
+
+@dataclass
+class BatchResult:
+    alupro_path: str
+    output_path: str
+    ok: bool
+    orders: int = 0
+    unresolved: int = 0
+    seconds: float = 0.0
+    error: str = ""
+    # Запись для metrics.jsonl (ConversionMetrics.to_record), собирается в процессе-исполнителе
+    metrics: dict[str, Any] | None = None
+
+
+class BatchConverterService:
+    def __init__(self, workers: int | None = None, metrics_log: MetricsLog | None = None) -> None:
+        self._workers = workers
+        self._metrics_log = metrics_log
+
+    @staticmethod
+    def find_alupro_files(directory: str, pattern: str = "*") -> list[Path]:
+        return sorted(
+            path
+            for path in Path(directory).glob(pattern)
+            if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES and not path.name.startswith("~$")
+        )
+
+    def plan_jobs(
+        self,
+        input_dir: str,
+        template_path: str,
+        output_dir: str,
+        options: GlassOptions,
+        pattern: str = "*",
+        writer_backend: str = "auto",
+    ) -> list[BatchJob]:
+        template = Path(template_path).resolve()
+        sources = [path for path in self.find_alupro_files(input_dir, pattern) if path.resolve() != template]
+        # a.xls и a.xlsx дали бы один и тот же результат: таким файлам в имя добавляется исходное расширение
+        stems = Counter(path.stem.casefold() for path in sources)
+        protected = {_path_key(path) for path in sources} | {_path_key(template)}
+        planned: set[str] = set()
+
+        jobs: list[BatchJob] = []
+        for path in sources:
+            name = path.stem if stems[path.stem.casefold()] == 1 else f"{path.stem}_{path.suffix[1:].lower()}"
+            output = Path(output_dir) / f"{name}.xlsx"
+            key = _path_key(output)
+            # Результат подменяет файл атомарно — исходная выгрузка или шаблон были бы потеряны
+            if key in protected:
+                raise ValueError(
+                    f"Результат {output} перезаписал бы исходный файл. Укажите другой каталог результатов (-o)."
+                )
+            if key in planned:
+                raise ValueError(f"Несколько файлов AluPro дают один и тот же результат: {output}")
+            planned.add(key)
+            jobs.append(BatchJob(str(path), str(template), str(output), options, writer_backend))
+        return jobs
+
+    def run(
+        self,
+        jobs: list[BatchJob],
+        on_result: Callable[[BatchResult], None] | None = None,
+    ) -> list[BatchResult]:
+        workers = max(1, min(self._workers or os.cpu_count() or 1, len(jobs) or 1))
+        results: list[BatchResult] = []
+
+        def consume(stream: Iterator[BatchResult]) -> None:
+            for result in stream:
+                results.append(result)
+                # Журнал пишет только родительский процесс — строки от исполнителей не перемешиваются
+                if self._metrics_log is not None and result.metrics is not None:
+                    self._metrics_log.append(result.metrics)
+                if on_result is not None:
+                    on_result(result)
+
+        if workers == 1:
+            # Без пула: проще отлаживать и нет накладных расходов на запуск процессов
+            consume(convert_file(job) for job in jobs)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(convert_file, job) for job in jobs]
+                consume(future.result() for future in as_completed(futures))
+        return results
+
+
+def _path_key(path: Path) -> str:
+    # На Windows регистр имен не различается
+    return os.path.normcase(str(path.resolve()))
+
+
+@lru_cache(maxsize=1)
+def _worker_services():
+    # Сервисы создаются один раз на процесс-исполнитель и переживают задания:
+    # так шаблон из пула разбирается openpyxl только при первом файле
+    from sibglass_app.repositories.excel_repository import ExcelRepository
+    from sibglass_app.services.alupro_parser import AluProParserService
+    from sibglass_app.services.formula_builder import FormulaBuilderService
+    from sibglass_app.services.generation_service import OrderGenerationService
+    from sibglass_app.services.save_service import AtomicSaveService
+    from sibglass_app.services.sibglass_writer import SibglassWriterService
+    from sibglass_app.services.xlsx_stream_writer import XlsxStreamWriter
+
+    excel_repository = ExcelRepository()
+    parser = AluProParserService(excel_repository)
+    save_service = AtomicSaveService()
+    generation = OrderGenerationService(
+        parser,
+        SibglassWriterService(),
+        excel_repository,
+        stream_writer=XlsxStreamWriter(save_service),
+        save_service=save_service,
+    )
+    return parser, FormulaBuilderService(), generation
+
+
+def convert_file(job: BatchJob) -> BatchResult:
+    from sibglass_app.services.generation_service import GenerationRequest
+
+    started = time.perf_counter()
+    metrics = ConversionMetrics()
+    try:
+        parser, builder, generation = _worker_services()
+
+        options = job.options
+        with metrics.phase("parse") as phase:
+            items = parser.parse(job.alupro_path, metrics=phase)
+        with metrics.phase("formulas") as phase:
+            formulas = {item.formula.strip() for item in items if item.formula.strip()}
+            formula_map = _build_formula_map(builder, options, formulas)
+            phase.rows = len(formulas)
+        unresolved = len(formulas) - len(formula_map)
+
+        Path(job.output_path).parent.mkdir(parents=True, exist_ok=True)
+        orders = generation.generate(
+            GenerationRequest(
+                alupro_path=job.alupro_path,
+                sibglass_path=job.template_path,
+                customer=options.customer,
+                address=options.address,
+                formula_map=formula_map,
+                output_path=job.output_path,
+                writer_backend=job.writer_backend,
+                items=items,
+            ),
+            metrics=metrics,
+        )
+        return BatchResult(
+            alupro_path=job.alupro_path,
+            output_path=job.output_path,
+            ok=True,
+            orders=len(orders),
+            unresolved=unresolved,
+            seconds=time.perf_counter() - started,
+            metrics=metrics.to_record(),
+        )
+    except Exception as exc:
+        logger.exception("Ошибка пакетной конвертации %s", job.alupro_path)
+        metrics.alupro_path, metrics.status, metrics.error = job.alupro_path, "failed", str(exc)
+        return BatchResult(
+            alupro_path=job.alupro_path,
+            output_path=job.output_path,
+            ok=False,
+            seconds=time.perf_counter() - started,
+            error=str(exc),
+            metrics=metrics.to_record(),
+        )
+
+
+def _build_formula_map(builder, options: GlassOptions, formulas: set[str]) -> dict[str, str]:
+    formula_map: dict[str, str] = {}
+    for formula in formulas:
+        resolved = ""
+        if builder.supports(formula):
+            resolved = builder.build(
+                source_formula=formula,
+                outer_glass=options.outer,
+                middle_glass=options.middle,
+                inner_glass=options.inner,
+                spacer=options.spacer,
+                zak_outer=options.zak_outer,
+                zak_middle=options.zak_middle,
+                zak_inner=options.zak_inner,
+                argon=options.argon,
+            )
+        if resolved:
+            formula_map[formula] = resolved
+    return formula_map
@@ -1,9 +1,31 @@
 from __future__ import annotations
 
-from sibglass_app.utils.text_utils import extract_thicknesses, is_numeric_formula
+from collections import OrderedDict
+
+from sibglass_app.utils.text_utils import extract_thicknesses, is_numeric_formula, normalize_formula
+
+# Выбор стекол/рамки и флаги: (наружное, среднее, внутреннее, рамка, зак x3, аргон)
+_Options = tuple[str, str, str, str, bool, bool, bool, bool]
 
 
 class FormulaBuilderService:
+    """Сборка итоговой формулы стеклопакета по толщинам и выбранной комплектации.
+
+    Для текущей комплектации заранее собирается план на каждое число камер
+    (1/3/5): хвосты частей после толщин. Результаты кэшируются по
+    (нормализованная формула, комплектация); при смене комплектации кэш
+    сбрасывается, так что в нем живут только значения для текущих опций.
+    """
+
+    MAX_CACHE_ENTRIES = 8192
+
+    def __init__(self) -> None:
+        self._normalized: dict[str, str] = {}
+        self._thicknesses: OrderedDict[str, tuple[int, ...] | None] = OrderedDict()
+        self._results: OrderedDict[tuple[str, _Options], str] = OrderedDict()
+        self._options: _Options | None = None
+        self._plans: dict[int, tuple[str, ...]] = {}
+
     def build(
         self,
         source_formula: str,
@@ -16,38 +38,100 @@ class FormulaBuilderService:
         zak_inner: bool,
         argon: bool,
     ) -> str:
-        if not is_numeric_formula(source_formula):
-            return ""
+        options = self._options_key(outer_glass, middle_glass, inner_glass, spacer, zak_outer, zak_middle, zak_inner, argon)
+        if options != self._options:
+            self._use_options(options)
+
+        key = (self._normalize(source_formula), options)
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+            return result
+
+        thicknesses = self._parse(key[0])
+        plan = self._plans.get(len(thicknesses)) if thicknesses else None
+        result = "-".join(f"{thickness}{tail}" for thickness, tail in zip(thicknesses, plan)) if plan else ""
+        self._remember(self._results, key, result)
+        return result
+
+    def supports(self, source_formula: str) -> bool:
+        return self._parse(self._normalize(source_formula)) is not None
+
+    def chamber_count(self, source_formula: str) -> int:
+        thicknesses = self._parse(self._normalize(source_formula))
+        return len(thicknesses) if thicknesses else 0
+
+    def affected_chambers(self, previous: dict, current: dict) -> set[int]:
+        """Числа камер, для которых смена опций (аргументы build без source_formula) меняет результат."""
+        old_plans = self._build_plans(self._options_key(**previous))
+        new_plans = self._build_plans(self._options_key(**current))
+        return {count for count, plan in new_plans.items() if old_plans[count] != plan}
 
-        thicknesses = extract_thicknesses(source_formula)
-        glass_values = [outer_glass, middle_glass, inner_glass]
-        zak_flags = [zak_outer, zak_middle, zak_inner]
+    def clear_cache(self) -> None:
+        self._results.clear()
+        self._options = None
+        self._plans = {}
 
-        if len(thicknesses) == 1:
-            return self._glass_part(thicknesses[0], glass_values[0], zak_flags[0])
+    def _use_options(self, options: _Options) -> None:
+        self._results.clear()
+        self._options = options
+        self._plans = self._build_plans(options)
+
+    @classmethod
+    def _build_plans(cls, options: _Options) -> dict[int, tuple[str, ...]]:
+        outer_glass, middle_glass, inner_glass, spacer, zak_outer, zak_middle, zak_inner, argon = options
+        outer = cls._glass_tail(outer_glass, zak_outer)
+        middle = cls._glass_tail(middle_glass, zak_middle)
+        inner = cls._glass_tail(inner_glass, zak_inner)
+        spacer_tail = cls._spacer_tail(spacer, argon)
+        return {
+            1: (outer,),
+            3: (outer, spacer_tail, inner),
+            5: (outer, spacer_tail, middle, spacer_tail, inner),
+        }
+
+    @staticmethod
+    def _options_key(
+        outer_glass: str,
+        middle_glass: str,
+        inner_glass: str,
+        spacer: str,
+        zak_outer: bool,
+        zak_middle: bool,
+        zak_inner: bool,
+        argon: bool,
+    ) -> _Options:
+        return outer_glass, middle_glass, inner_glass, spacer, zak_outer, zak_middle, zak_inner, argon
 
-        if len(thicknesses) == 3:
-            left = self._glass_part(thicknesses[0], glass_values[0], zak_flags[0])
-            spacer_part = self._spacer_part(thicknesses[1], spacer, argon)
-            right = self._glass_part(thicknesses[2], glass_values[2], zak_flags[2])
-            return f"{left}-{spacer_part}-{right}"
+    def _normalize(self, source_formula: str) -> str:
+        normalized = self._normalized.get(source_formula)
+        if normalized is None:
+            if len(self._normalized) >= self.MAX_CACHE_ENTRIES:
+                self._normalized.clear()
+            normalized = self._normalized[source_formula] = normalize_formula(source_formula)
+        return normalized
 
-        if len(thicknesses) == 5:
-            left = self._glass_part(thicknesses[0], glass_values[0], zak_flags[0])
-            spacer_left = self._spacer_part(thicknesses[1], spacer, argon)
-            middle = self._glass_part(thicknesses[2], glass_values[1], zak_flags[1])
-            spacer_right = self._spacer_part(thicknesses[3], spacer, argon)
-            right = self._glass_part(thicknesses[4], glass_values[2], zak_flags[2])
-            return f"{left}-{spacer_left}-{middle}-{spacer_right}-{right}"
+    def _parse(self, normalized: str) -> tuple[int, ...] | None:
+        # Формул в заказе немного, а строк с ними — тысячи: разбор кэшируется независимо от опций
+        if normalized in self._thicknesses:
+            self._thicknesses.move_to_end(normalized)
+            return self._thicknesses[normalized]
+        thicknesses = tuple(extract_thicknesses(normalized)) if is_numeric_formula(normalized) else None
+        self._remember(self._thicknesses, normalized, thicknesses)
+        return thicknesses
 
-        return ""
+    def _remember(self, cache: OrderedDict, key, value) -> None:
+        cache[key] = value
+        if len(cache) > self.MAX_CACHE_ENTRIES:
+            cache.popitem(last=False)
 
+    # Толщина — всегда цифры, поэтому strip() всей части сводится к rstrip() хвоста
     @staticmethod
-    def _glass_part(thickness: int, name: str, zak: bool) -> str:
+    def _glass_tail(name: str, zak: bool) -> str:
         suffix = "SGTemp " if zak else ""
-        return f"{thickness}{suffix}{name}".strip()
+        return f"{suffix}{name}".rstrip()
 
     @staticmethod
-    def _spacer_part(thickness: int, name: str, argon: bool) -> str:
+    def _spacer_tail(name: str, argon: bool) -> str:
         suffix = "Ar" if argon else ""
-        return f"{thickness}{name}{suffix}".strip()
+        return f"{name}{suffix}".rstrip()
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import logging
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from sibglass_app.models.formula_item import FormulaItem
+from sibglass_app.models.order_item import OrderItem
+from sibglass_app.repositories.excel_repository import ExcelRepository
+from sibglass_app.services.alupro_parser import AluProParserService
+from sibglass_app.services.metrics_service import ConversionMetrics, PhaseMetrics
+from sibglass_app.services.save_service import AtomicSaveService
+from sibglass_app.services.sibglass_writer import SibglassWriterService
+from sibglass_app.services.xlsx_stream_writer import StreamWriterUnsupported, XlsxStreamWriter
+
+logger = logging.getLogger(__name__)
+
+# (фаза, выполнено, всего); всего == 0 — объем фазы заранее неизвестен
+ProgressCallback = Callable[[str, int, int], None]
+
+PHASE_PARSE = "parse"
+PHASE_GROUP = "group"
+PHASE_OPEN = "open"
+PHASE_WRITE = "write"
+PHASE_SAVE = "save"
+PHASES = (PHASE_PARSE, PHASE_GROUP, PHASE_OPEN, PHASE_WRITE, PHASE_SAVE)
+
+# "auto" — потоковая запись для больших заявок, openpyxl для остальных
+WRITER_AUTO = "auto"
+WRITER_OPENPYXL = "openpyxl"
+WRITER_STREAM = "stream"
+WRITER_BACKENDS = (WRITER_AUTO, WRITER_OPENPYXL, WRITER_STREAM)
+
+class GenerationCancelled(Exception):
+    pass
+
+
+@dataclass
+class GenerationRequest:
+    alupro_path: str
+    sibglass_path: str
+    customer: str
+    address: str
+    formula_map: dict[str, str] = field(default_factory=dict)
+    # Куда сохранить результат; по умолчанию — поверх файла заявки
+    output_path: str = ""
+    writer_backend: str = WRITER_AUTO
+    # Уже разобранные строки AluPro (пакетный режим): файл повторно не читается и не хешируется
+    items: list[FormulaItem] | None = None
+
+    @property
+    def target_path(self) -> str:
+        return self.output_path or self.sibglass_path
+
+
+class OrderGenerationService:
+    # С этого количества строк openpyxl заметно медленнее потоковой записи
+    STREAM_MIN_ORDERS = 1000
+
+    def __init__(
+        self,
+        parser_service: AluProParserService,
+        writer_service: SibglassWriterService,
+        excel_repository: ExcelRepository,
+        stream_writer: XlsxStreamWriter | None = None,
+        save_service: AtomicSaveService | None = None,
+    ) -> None:
+        self._parser_service = parser_service
+        self._writer_service = writer_service
+        self._excel_repository = excel_repository
+        self._stream_writer = stream_writer
+        self._save_service = save_service or AtomicSaveService()
+
+    @staticmethod
+    def build_orders(items: list[FormulaItem], formula_map: dict[str, str]) -> list[OrderItem]:
+        grouped_items: dict[str, list[FormulaItem]] = {}
+        for item in items:
+            resolved = formula_map.get(item.formula, "")
+            if not resolved:
+                continue
+            grouped_items.setdefault(resolved, []).append(item)
+
+        orders: list[OrderItem] = []
+        idx = 1
+        for resolved, group in grouped_items.items():
+            for item in group:
+                orders.append(OrderItem(index=idx, formula=resolved, width=item.width, height=item.height, count=item.count))
+                idx += 1
+        return orders
+
+    def generate(
+        self,
+        request: GenerationRequest,
+        progress: ProgressCallback | None = None,
+        is_cancelled: Callable[[], bool] | None = None,
+        metrics: ConversionMetrics | None = None,
+    ) -> list[OrderItem]:
+        def report(phase: str, done: int, total: int) -> None:
+            if progress is not None:
+                progress(phase, done, total)
+
+        def checkpoint() -> None:
+            if is_cancelled is not None and is_cancelled():
+                raise GenerationCancelled()
+
+        def measure(name: str):
+            return metrics.phase(name) if metrics is not None else nullcontext(PhaseMetrics(name))
+
+        def on_rows_parsed(rows: int) -> None:
+            checkpoint()
+            report(PHASE_PARSE, rows, 0)
+
+        def on_rows_written(done: int, total: int) -> None:
+            checkpoint()
+            report(PHASE_WRITE, done, total)
+
+        if metrics is not None:
+            metrics.alupro_path = request.alupro_path
+            metrics.template_path = request.sibglass_path
+            metrics.output_path = request.target_path
+
+        checkpoint()
+        if request.items is not None:
+            alupro_items = request.items
+        else:
+            report(PHASE_PARSE, 0, 0)
+            with measure(PHASE_PARSE) as phase:
+                alupro_items = self._parser_service.parse(request.alupro_path, progress=on_rows_parsed, metrics=phase)
+
+        checkpoint()
+        report(PHASE_GROUP, 0, len(alupro_items))
+        with measure(PHASE_GROUP) as phase:
+            orders = self.build_orders(alupro_items, request.formula_map)
+            phase.rows = len(alupro_items)
+        report(PHASE_GROUP, len(alupro_items), len(alupro_items))
+        if metrics is not None:
+            metrics.items, metrics.orders = len(alupro_items), len(orders)
+
+        checkpoint()
+        if self._use_stream_writer(request, orders):
+            try:
+                report(PHASE_WRITE, 0, len(orders))
+                # Шаблон читается и результат пишется за один проход; файл подменяется атомарно,
+                # поэтому отмена на любом шаге не оставляет недописанный результат.
+                # Сохранение отдельно не замеряется — оно входит в запись
+                with measure(PHASE_WRITE) as phase:
+                    stats = self._stream_writer.write_file(
+                        request.sibglass_path,
+                        request.target_path,
+                        customer=request.customer,
+                        address=request.address,
+                        items=orders,
+                        progress=on_rows_written,
+                    )
+                    phase.record_write(stats)
+                report(PHASE_SAVE, 1, 1)
+                if metrics is not None:
+                    metrics.backend = WRITER_STREAM
+                return orders
+            except StreamWriterUnsupported as exc:
+                logger.info("Потоковая запись недоступна (%s), используется openpyxl", exc)
+                if metrics is not None:
+                    # Неудачная попытка остается в записи: видно, сколько на нее ушло
+                    metrics.phases[-1].name = f"{PHASE_WRITE}:{WRITER_STREAM}"
+
+        if metrics is not None:
+            metrics.backend = WRITER_OPENPYXL
+        report(PHASE_OPEN, 0, 1)
+        with measure(PHASE_OPEN):
+            workbook = self._excel_repository.open_workbook(request.sibglass_path)
+        report(PHASE_OPEN, 1, 1)
+
+        checkpoint()
+        report(PHASE_WRITE, 0, len(orders))
+        with measure(PHASE_WRITE) as phase:
+            stats = self._writer_service.write(
+                workbook,
+                customer=request.customer,
+                address=request.address,
+                items=orders,
+                progress=on_rows_written,
+            )
+            phase.record_write(stats)
+
+        # После этой точки отмена не принимается; файл заявки подменяется только готовым результатом
+        checkpoint()
+        report(PHASE_SAVE, 0, 1)
+        with measure(PHASE_SAVE):
+            self._save_service.save_workbook(
+                workbook, request.target_path, progress=lambda done, total: report(PHASE_SAVE, done, total)
+            )
+            if Path(request.target_path).resolve() == Path(request.sibglass_path).resolve():
+                # Заявка сохранена поверх шаблона (режим GUI): следующая заявка возьмет копию из пула
+                self._excel_repository.remember_template(request.target_path, workbook)
+        return orders
+
+    def _use_stream_writer(self, request: GenerationRequest, orders: list[OrderItem]) -> bool:
+        if self._stream_writer is None or request.writer_backend == WRITER_OPENPYXL:
+            return False
+        if Path(request.sibglass_path).suffix.lower() != ".xlsx":
+            return False
+        return request.writer_backend == WRITER_STREAM or len(orders) >= self.STREAM_MIN_ORDERS
@@ -1,27 +1,84 @@
 from __future__ import annotations
 
+from dataclasses import fields
+
 from sibglass_app.models.glass_catalog import GlassCatalog
-from sibglass_app.repositories.glass_file_repository import GlassFileRepository
+from sibglass_app.repositories.glass_file_repository import GlassFileRepository, GlassFileState
 
 
 class GlassCatalogService:
+    """Справочник стекол: копия в памяти считается основной, glass.txt только дописывается.
+
+    Внешние правки файла распознаются по mtime/размеру и хешу содержимого,
+    полная перезапись файла выполняется только при уплотнении (compact).
+    """
+
     def __init__(self, repository: GlassFileRepository) -> None:
         self._repository = repository
+        self._catalog = GlassCatalog()
+        self._state: GlassFileState | None = None
+
+    @property
+    def catalog(self) -> GlassCatalog:
+        return self._catalog
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self._state is not None and self._state.fragmented
 
     def load_or_empty(self) -> tuple[GlassCatalog, bool]:
         try:
-            return self._repository.load(), True
+            self._catalog, self._state = self._repository.load_with_state()
+            return self._catalog, True
         except FileNotFoundError:
-            return GlassCatalog(), False
+            self._catalog, self._state = GlassCatalog(), None
+            return self._catalog, False
 
-    def add_value(self, catalog: GlassCatalog, section_attr: str, value: str) -> GlassCatalog:
+    def refresh(self) -> list[str]:
+        """Перечитывает glass.txt, если его изменили снаружи; возвращает изменившиеся разделы."""
+        signature = self._repository.signature()
+        if signature is None or (self._state is not None and signature == self._state.signature):
+            return []
+        try:
+            catalog, state = self._repository.load_with_state()
+        except FileNotFoundError:
+            return []
+
+        if self._state is not None and state.digest == self._state.digest:
+            # Файл пересохранили без изменений
+            self._state = state
+            return []
+        changed = self.changed_sections(self._catalog, catalog)
+        self._catalog, self._state = catalog, state
+        return changed
+
+    def add_value(self, section_attr: str, value: str) -> bool:
         cleaned = value.strip()
         if not cleaned:
-            return catalog
-        target = getattr(catalog, section_attr)
-        if cleaned not in target:
-            target.append(cleaned)
-        return catalog
+            return False
+        self.refresh()
+        section = getattr(self._catalog, section_attr)
+        if not section.add(cleaned):
+            return False
+
+        try:
+            if self._state is None:
+                self._state = self._repository.save(self._catalog)
+            else:
+                self._state = self._repository.append(self._state, section_attr, cleaned)
+        except Exception:
+            # Значение, не попавшее в glass.txt, не должно оставаться и в памяти
+            section.discard(cleaned)
+            raise
+        return True
+
+    def compact(self) -> None:
+        self._state = self._repository.save(self._catalog)
+
+    @staticmethod
+    def changed_sections(old: GlassCatalog, new: GlassCatalog) -> list[str]:
+        return [item.name for item in fields(GlassCatalog) if getattr(old, item.name) != getattr(new, item.name)]
 
     def save(self, catalog: GlassCatalog) -> None:
-        self._repository.save(catalog)
+        self._catalog = catalog
+        self.compact()
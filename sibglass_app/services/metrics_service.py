@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterator
+
+from sibglass_app.config.paths import METRICS_FILE
+
+if TYPE_CHECKING:
+    from sibglass_app.services.sibglass_writer import WriteStats
+
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+
+
+def _windows_memory_counters():
+    import ctypes
+    from ctypes import wintypes
+
+    class _Counters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = _Counters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+
+def peak_rss_bytes() -> int | None:
+    """Пиковый объем памяти процесса (RSS) с момента запуска; None, если ОС его не сообщает."""
+    try:
+        if sys.platform == "win32":
+            counters = _windows_memory_counters()
+            return int(counters.PeakWorkingSetSize) if counters is not None else None
+
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux сообщает килобайты, macOS — байты
+        return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+    except Exception:
+        return None
+
+
+def current_rss_bytes() -> int | None:
+    """Текущий объем памяти процесса (RSS); None, если ОС его не сообщает (например, macOS)."""
+    try:
+        if sys.platform == "win32":
+            counters = _windows_memory_counters()
+            return int(counters.WorkingSetSize) if counters is not None else None
+        with open("/proc/self/statm", encoding="ascii") as handle:
+            resident_pages = int(handle.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+
+def _to_mb(value: int | None) -> float | None:
+    return round(value / _MB, 1) if value is not None else None
+
+
+@dataclass
+class PhaseMetrics:
+    name: str
+    seconds: float = 0.0
+    rows: int = 0
+    # Ячейки, которые вернула запись: получившие значение, стиль и перенесенные сдвигом подвала
+    cells: int = 0
+    styled_cells: int = 0
+    moved_cells: int = 0
+    # Время, проведенное в чтении строк файла (часть seconds)
+    read_seconds: float | None = None
+    # Объем памяти процесса после фазы и его изменение за фазу. Пик с начала работы процесса
+    # (ru_maxrss) здесь бесполезен: в долгой сессии он равен пику самой большой прошлой конвертации
+    rss_mb: float | None = None
+    rss_delta_mb: float | None = None
+
+    def record_write(self, stats: WriteStats) -> None:
+        self.cells, self.styled_cells, self.moved_cells = stats.values, stats.styled, stats.moved
+
+
+@dataclass
+class ConversionMetrics:
+    """Фазы и счетчики одной конвертации; сериализуется в одну строку metrics.jsonl."""
+
+    alupro_path: str = ""
+    template_path: str = ""
+    output_path: str = ""
+    backend: str = ""
+    items: int = 0
+    orders: int = 0
+    status: str = "ok"
+    error: str = ""
+    phases: list[PhaseMetrics] = field(default_factory=list)
+    started_at: float = field(default_factory=time.time)
+    seconds: float = 0.0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseMetrics]:
+        metrics = PhaseMetrics(name)
+        self.phases.append(metrics)
+        rss_before = current_rss_bytes()
+        started = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics.seconds = time.perf_counter() - started
+            self.seconds += metrics.seconds
+            rss_after = current_rss_bytes()
+            metrics.rss_mb = _to_mb(rss_after)
+            if rss_before is not None and rss_after is not None:
+                metrics.rss_delta_mb = _to_mb(rss_after - rss_before)
+
+    def to_record(self) -> dict[str, Any]:
+        record = asdict(self)
+        record["started_at"] = datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds")
+        record["seconds"] = round(self.seconds, 4)
+        for phase in record["phases"]:
+            phase["seconds"] = round(phase["seconds"], 4)
+            if phase["read_seconds"] is not None:
+                phase["read_seconds"] = round(phase["read_seconds"], 4)
+        return record
+
+    def summary(self) -> str:
+        parts = [f"{phase.name} {phase.seconds:.2f} с" for phase in self.phases]
+        sizes = [phase.rss_mb for phase in self.phases if phase.rss_mb is not None]
+        deltas = [phase.rss_delta_mb for phase in self.phases if phase.rss_delta_mb is not None]
+        memory = f", память до {max(sizes):.0f} МБ" if sizes else ""
+        if deltas:
+            memory += f" ({sum(deltas):+.0f} МБ за конвертацию)"
+        return f"{self.seconds:.2f} с ({', '.join(parts)}){memory}"
+
+
+class MetricsLog:
+    """Журнал конвертаций в формате JSONL: одна запись — одна строка."""
+
+    def __init__(self, path: str | os.PathLike = METRICS_FILE) -> None:
+        self._path = Path(path)
+
+    def append(self, metrics: ConversionMetrics | dict[str, Any]) -> None:
+        record = metrics.to_record() if isinstance(metrics, ConversionMetrics) else metrics
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            # Одна запись одной строкой в режиме дописывания: параллельные процессы не перемешивают строки
+            with open(self._path, "a", encoding="utf-8") as handle:
+                handle.write(line)
+        except OSError:
+            logger.exception("Не удалось записать метрики в %s", self._path)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+
+class AtomicSaveService:
+    """Запись файла через временный файл в том же каталоге.
+
+    Содержимое сначала полностью пишется во временный файл, при необходимости
+    сбрасывается на диск (fsync) и только затем подменяет целевой файл через
+    os.replace. При сбое или отмене посередине прежний файл остается целым.
+    """
+
+    def __init__(self, fsync: bool = True) -> None:
+        self._fsync = fsync
+
+    @contextmanager
+    def replacing(self, path: str | os.PathLike) -> Iterator[Path]:
+        target = Path(path)
+        # Тот же каталог — os.replace остается атомарным переименованием, в том числе на сетевом диске
+        temp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            yield temp_path
+            if target.exists():
+                shutil.copymode(target, temp_path)
+            if self._fsync:
+                self._sync_file(temp_path)
+            os.replace(temp_path, target)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        if self._fsync:
+            self._sync_directory(target.parent)
+
+    def write_bytes(self, path: str | os.PathLike, data: bytes) -> None:
+        with self.replacing(path) as temp_path:
+            temp_path.write_bytes(data)
+
+    def save_workbook(self, workbook, path: str, progress: Callable[[int, int], None] | None = None) -> None:
+        with self.replacing(path) as temp_path:
+            workbook.save(temp_path)
+            if progress is not None:
+                progress(1, 2)
+        if progress is not None:
+            progress(2, 2)
+
+    @staticmethod
+    def _sync_file(path: Path) -> None:
+        with open(path, "r+b") as handle:
+            os.fsync(handle.fileno())
+
+    @staticmethod
+    def _sync_directory(path: Path) -> None:
+        # Запись о переименовании тоже должна попасть на диск; на Windows каталог открыть нельзя
+        if os.name != "posix":
+            return
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -1,208 +1,266 @@
 from __future__ import annotations
 
-from openpyxl.cell.cell import MergedCell
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from openpyxl.worksheet.worksheet import Worksheet
+from copy import copy
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable
 
 from sibglass_app.models.order_item import OrderItem
-from sibglass_app.utils.excel_utils import find_cell_by_value
+from sibglass_app.utils.excel_utils import MergedCellIndex, TemplateLayout
+
+if TYPE_CHECKING:
+    from openpyxl.styles import Alignment, Border, Font, PatternFill
+    from openpyxl.worksheet.worksheet import Worksheet
+
+
+@dataclass(frozen=True)
+class WriterStyles:
+    border_thin: Border
+    font_default: Font
+    font_accent: Font
+    fill_a: PatternFill
+    align_center: Alignment
+    align_right: Alignment
+
+
+@dataclass
+class WriteStats:
+    """Ячейки, которые фактически изменила запись заявки (openpyxl или потоковая)."""
+
+    # Получили значение: реквизиты, строки заявки, итоги
+    values: int = 0
+    # Получили стиль, в том числе без значения
+    styled: int = 0
+    # Перенесены сдвигом блока от строки "ВСЕГО" до конца листа
+    moved: int = 0
+
+
+@lru_cache(maxsize=None)
+def writer_styles() -> WriterStyles:
+    # openpyxl загружается при первой записи (или фоновым прогревом), а не при импорте модуля
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+    thin = Side(style="thin", color="000000")
+    return WriterStyles(
+        border_thin=Border(left=thin, right=thin, top=thin, bottom=thin),
+        font_default=Font(name="Arial", size=10, color="000000"),
+        font_accent=Font(name="Arial", size=14, color="FF0000"),
+        fill_a=PatternFill(fill_type="solid", start_color="CCFFFF", end_color="CCFFFF"),
+        align_center=Alignment(horizontal="center", vertical="center"),
+        align_right=Alignment(horizontal="right", vertical="center"),
+    )
 
 
 class SibglassWriterService:
-    _BORDER_THIN = Border(
-        left=Side(style="thin", color="000000"),
-        right=Side(style="thin", color="000000"),
-        top=Side(style="thin", color="000000"),
-        bottom=Side(style="thin", color="000000"),
-    )
-    _FONT_DEFAULT = Font(name="Arial", size=10, color="000000")
-    _FONT_ACCENT = Font(name="Arial", size=14, color="FF0000")
-    _FILL_A = PatternFill(fill_type="solid", start_color="CCFFFF", end_color="CCFFFF")
-    _ALIGN_CENTER = Alignment(horizontal="center", vertical="center")
-    _ALIGN_RIGHT = Alignment(horizontal="right", vertical="center")
-
-    def write(self, workbook, customer: str, address: str, items: list[OrderItem]) -> None:
+    PROGRESS_STEP = 100
+
+    def __init__(self, cached_styles: bool = True) -> None:
+        # False — прежний режим с поатрибутным назначением стилей (для сравнения в бенчмарке)
+        self._cached_styles = cached_styles
+
+    def write(
+        self,
+        workbook,
+        customer: str,
+        address: str,
+        items: list[OrderItem],
+        progress: Callable[[int, int], None] | None = None,
+    ) -> WriteStats:
         sheet = workbook.active
-        self._fill_requisites(sheet, customer, address)
-        self._write_items(sheet, items)
+        layout = TemplateLayout.scan(sheet)
+        stats = WriteStats()
+        stats.values += self._fill_requisites(sheet, layout, customer, address)
+        # Кэш стилей действует в пределах одной книги: индексы стилей у каждой книги свои
+        style_cache: dict | None = {} if self._cached_styles else None
+        self._write_items(sheet, layout, items, stats, progress, style_cache)
+        return stats
 
     @classmethod
-    def _fill_requisites(cls, sheet: Worksheet, customer: str, address: str) -> None:
-        customer_cell = find_cell_by_value(sheet, "Заказчик")
-        address_cell = find_cell_by_value(sheet, "Адрес доставки")
-
-        if customer_cell:
-            cls._write_text_right_of_label(sheet, customer_cell.row, customer_cell.column, customer)
-
-        if address_cell:
-            cls._write_text_right_of_label(sheet, address_cell.row, address_cell.column, address)
+    def _fill_requisites(cls, sheet: Worksheet, layout: TemplateLayout, customer: str, address: str) -> int:
+        written = 0
+        if layout.customer_cell:
+            row, col = layout.customer_cell
+            written += cls._write_text_right_of_label(sheet, layout.merged, row, col, customer)
+
+        if layout.address_cell:
+            row, col = layout.address_cell
+            written += cls._write_text_right_of_label(sheet, layout.merged, row, col, address)
             # Сохраняем только значение, без изменения форматирования соседних строк
+        return written
 
     @classmethod
-    def _write_text_right_of_label(cls, sheet: Worksheet, row: int, label_col: int, text: str) -> None:
+    def _write_text_right_of_label(
+        cls, sheet: Worksheet, merged: MergedCellIndex, row: int, label_col: int, text: str
+    ) -> bool:
         col = label_col + 1
         max_search = max(sheet.max_column + 20, col + 20)
 
         while col <= max_search:
-            merged_range = cls._find_merged_range(sheet, row, col)
+            merged_range = merged.find(row, col)
             if merged_range is None:
-                cls._set_value_same_row_safe(sheet, row, col, text)
-                return
+                return cls._set_value_same_row_safe(sheet, merged, row, col, text)
 
             # Пишем только в merge-ячейку, якорь которой на этой же строке,
             # чтобы не ломать форматирование соседних строк
             anchor_row, anchor_col = merged_range.min_row, merged_range.min_col
             if anchor_row == row and anchor_col > label_col:
-                cls._set_value_same_row_safe(sheet, anchor_row, anchor_col, text)
-                return
+                return cls._set_value_same_row_safe(sheet, merged, anchor_row, anchor_col, text)
 
             col = merged_range.max_col + 1
 
-        cls._set_value_same_row_safe(sheet, row, label_col + 1, text)
+        return cls._set_value_same_row_safe(sheet, merged, row, label_col + 1, text)
 
     @staticmethod
-    def _find_merged_range(sheet: Worksheet, row: int, col: int):
-        for merged_range in sheet.merged_cells.ranges:
-            if merged_range.min_row <= row <= merged_range.max_row and merged_range.min_col <= col <= merged_range.max_col:
-                return merged_range
-        return None
+    def _set_value_same_row_safe(sheet: Worksheet, merged: MergedCellIndex, row: int, col: int, value) -> bool:
+        from openpyxl.cell.cell import MergedCell
 
-    @classmethod
-    def _set_value_same_row_safe(cls, sheet: Worksheet, row: int, col: int, value) -> None:
         cell_obj = sheet.cell(row=row, column=col)
         if isinstance(cell_obj, MergedCell):
-            merged_range = cls._find_merged_range(sheet, row, col)
+            merged_range = merged.find(row, col)
             if merged_range is None:
-                return
+                return False
             anchor_row, anchor_col = merged_range.min_row, merged_range.min_col
             if anchor_row != row:
-                return
+                return False
             sheet.cell(row=anchor_row, column=anchor_col, value=value)
-            return
+            return True
 
         sheet.cell(row=row, column=col, value=value)
+        return True
+
+    @staticmethod
+    def _set_value_safe(sheet: Worksheet, merged: MergedCellIndex, row: int, col: int, value) -> bool:
+        from openpyxl.cell.cell import MergedCell
 
-    @classmethod
-    def _set_value_safe(cls, sheet: Worksheet, row: int, col: int, value) -> None:
         cell_obj = sheet.cell(row=row, column=col)
         if isinstance(cell_obj, MergedCell):
-            merged_range = cls._find_merged_range(sheet, row, col)
+            merged_range = merged.find(row, col)
             if merged_range is None:
-                return
+                return False
             anchor_row, anchor_col = merged_range.min_row, merged_range.min_col
             if value in (None, "") and (anchor_row, anchor_col) != (row, col):
-                return
+                return False
             sheet.cell(row=anchor_row, column=anchor_col, value=value)
-            return
+            return True
 
         sheet.cell(row=row, column=col, value=value)
+        return True
 
     @classmethod
-    def _write_items(cls, sheet: Worksheet, items: list[OrderItem]) -> None:
-        start_row, total_row = cls._find_table_bounds(sheet)
+    def _write_items(
+        cls,
+        sheet: Worksheet,
+        layout: TemplateLayout,
+        items: list[OrderItem],
+        stats: WriteStats,
+        progress: Callable[[int, int], None] | None = None,
+        style_cache: dict | None = None,
+    ) -> None:
+        merged = layout.merged
+        start_row, total_row = layout.start_row, layout.total_row
         if total_row is None:
             raise ValueError("Не найдена строка 'ВСЕГО' в таблице шаблона. Запись отменена, чтобы не повредить нижние данные.")
 
         existing_count = max(total_row - start_row, 0)
         target_count = len(items)
 
-        if target_count > existing_count:
-            sheet.insert_rows(total_row, target_count - existing_count)
-            total_row += target_count - existing_count
-        elif target_count < existing_count:
-            sheet.delete_rows(start_row + target_count, existing_count - target_count)
-            total_row -= existing_count - target_count
+        # Итоговая раскладка известна заранее: блок от "ВСЕГО" до конца листа сдвигается один раз
+        # вместе с объединениями и формулами, лишние строки таблицы при этом удаляются
+        delta = target_count - existing_count
+        stats.moved += merged.shift_rows(total_row, delta)
+        total_row += delta
 
         for idx, item in enumerate(items, start=1):
             row = start_row + idx - 1
-            cls._set_value_safe(sheet, row, 1, idx)
-            cls._set_value_safe(sheet, row, 2, "")
-            cls._set_value_safe(sheet, row, 3, item.formula)
-            cls._set_value_safe(sheet, row, 4, int(item.width))
-            cls._set_value_safe(sheet, row, 5, int(item.height))
-            cls._set_value_safe(sheet, row, 6, int(item.count))
-            cls._set_value_safe(sheet, row, 7, f"=D{row}*E{row}/1000000")
-            cls._set_value_safe(sheet, row, 8, f"=G{row}*F{row}")
-            cls._style_data_row(sheet, row)
+            values = (
+                idx,
+                "",
+                item.formula,
+                int(item.width),
+                int(item.height),
+                int(item.count),
+                f"=D{row}*E{row}/1000000",
+                f"=G{row}*F{row}",
+            )
+            for col, value in enumerate(values, start=1):
+                stats.values += cls._set_value_safe(sheet, merged, row, col, value)
+            stats.styled += cls._style_data_row(sheet, row, style_cache)
+            if progress is not None and (idx % cls.PROGRESS_STEP == 0 or idx == target_count):
+                progress(idx, target_count)
 
         # Итого формулами
         if target_count > 0:
-            cls._set_value_safe(sheet, total_row, 6, f"=SUM(F{start_row}:F{start_row + target_count - 1})")
-            cls._set_value_safe(sheet, total_row, 7, f"=SUM(G{start_row}:G{start_row + target_count - 1})")
-            cls._set_value_safe(sheet, total_row, 8, f"=SUM(H{start_row}:H{start_row + target_count - 1})")
+            end_row = start_row + target_count - 1
+            totals = (f"=SUM(F{start_row}:F{end_row})", f"=SUM(G{start_row}:G{end_row})", f"=SUM(H{start_row}:H{end_row})")
         else:
-            cls._set_value_safe(sheet, total_row, 6, 0)
-            cls._set_value_safe(sheet, total_row, 7, 0)
-            cls._set_value_safe(sheet, total_row, 8, 0)
+            totals = (0, 0, 0)
+        for col, value in zip((6, 7, 8), totals):
+            stats.values += cls._set_value_safe(sheet, merged, total_row, col, value)
 
-        cls._style_total_cells(sheet, total_row)
+        stats.styled += cls._style_total_cells(sheet, merged, total_row)
 
     @classmethod
-    def _style_data_row(cls, sheet: Worksheet, row: int) -> None:
+    def _style_data_row(cls, sheet: Worksheet, row: int, style_cache: dict | None = None) -> int:
+        from openpyxl.cell.cell import MergedCell
+
+        styled = 0
         for col in range(1, 9):
             cell = sheet.cell(row=row, column=col)
             if isinstance(cell, MergedCell):
                 continue
+            styled += 1
 
-            if col == 1:
-                cell.fill = cls._FILL_A
-                cell.border = cls._BORDER_THIN
-                cell.font = cls._FONT_DEFAULT
-            elif 2 <= col <= 6:
-                cell.border = cls._BORDER_THIN
-                cell.font = cls._FONT_DEFAULT
-                if 3 <= col <= 6:
-                    cell.alignment = cls._ALIGN_CENTER
-                if col in (4, 5, 6):
-                    cell.number_format = "0"
-            else:  # G, H
-                cell.border = cls._BORDER_THIN
-                cell.font = cls._FONT_ACCENT
-                cell.alignment = cls._ALIGN_RIGHT
-                cell.number_format = "0.00"
+            if style_cache is None:
+                cls._style_data_cell(cell, col)
+                continue
+
+            # Итоговый стиль зависит только от колонки и исходного стиля ячейки:
+            # считаем его один раз, дальше присваиваем готовый набор индексов стилей целиком
+            key = (col, tuple(cell._style or ()))
+            cached = style_cache.get(key)
+            if cached is None:
+                cls._style_data_cell(cell, col)
+                style_cache[key] = copy(cell._style)
+            else:
+                cell._style = copy(cached)
+        return styled
 
     @classmethod
-    def _style_total_cells(cls, sheet: Worksheet, row: int) -> None:
+    def _style_data_cell(cls, cell, col: int) -> None:
+        styles = writer_styles()
+        if col == 1:
+            cell.fill = styles.fill_a
+            cell.border = styles.border_thin
+            cell.font = styles.font_default
+        elif 2 <= col <= 6:
+            cell.border = styles.border_thin
+            cell.font = styles.font_default
+            if 3 <= col <= 6:
+                cell.alignment = styles.align_center
+            if col in (4, 5, 6):
+                cell.number_format = "0"
+        else:  # G, H
+            cell.border = styles.border_thin
+            cell.font = styles.font_accent
+            cell.alignment = styles.align_right
+            cell.number_format = "0.00"
+
+    @classmethod
+    def _style_total_cells(cls, sheet: Worksheet, merged: MergedCellIndex, row: int) -> int:
+        from openpyxl.cell.cell import MergedCell
+
+        styles = writer_styles()
         for col in (6, 7, 8):
             cell = sheet.cell(row=row, column=col)
             if isinstance(cell, MergedCell):
-                merged = cls._find_merged_range(sheet, row, col)
-                if merged:
-                    cell = sheet.cell(row=merged.min_row, column=merged.min_col)
-            cell.font = cls._FONT_ACCENT
+                merged_range = merged.find(row, col)
+                if merged_range:
+                    cell = sheet.cell(row=merged_range.min_row, column=merged_range.min_col)
+            cell.font = styles.font_accent
             if col == 6:
-                cell.alignment = cls._ALIGN_CENTER
+                cell.alignment = styles.align_center
                 cell.number_format = "0"
             else:
-                cell.alignment = cls._ALIGN_RIGHT
+                cell.alignment = styles.align_right
                 cell.number_format = "0.00"
-
-    @staticmethod
-    def _find_header_row(sheet: Worksheet) -> int | None:
-        for row_idx in range(1, sheet.max_row + 1):
-            for col in range(1, min(sheet.max_column, 8) + 1):
-                value = sheet.cell(row_idx, col).value
-                if str(value).strip() == "№":
-                    return row_idx
-        return None
-
-    @staticmethod
-    def _is_total_row(sheet: Worksheet, row_idx: int) -> bool:
-        for col in range(1, 9):
-            value = str(sheet.cell(row_idx, col).value or "").strip().lower()
-            if "всего" in value:
-                return True
-        return False
-
-    @classmethod
-    def _find_table_bounds(cls, sheet: Worksheet) -> tuple[int, int | None]:
-        header_row = cls._find_header_row(sheet)
-        start_row = header_row + 1 if header_row is not None else 14
-
-        total_row = None
-        for row_idx in range(start_row, sheet.max_row + 1):
-            if cls._is_total_row(sheet, row_idx):
-                total_row = row_idx
-                break
-
-        return start_row, total_row
+        return 3
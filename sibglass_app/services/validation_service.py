@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from contextlib import closing
 from pathlib import Path
 
 from sibglass_app.repositories.excel_repository import ExcelRepository
@@ -14,7 +15,13 @@ class ValidationService:
             raise ValueError("Поддерживаются только файлы .xlsx и .xls")
 
     def validate_contains(self, path: str, marker: str) -> None:
-        lines = self._excel_repo.read_lines(path)
-        marker_lower = marker.lower()
-        if not any(marker_lower in line.lower() for line in lines):
-            raise ValueError(f"Файл {Path(path).name} не содержит обязательный маркер: {marker}")
+        quick = self._excel_repo.quick_contains(path, marker)
+        if quick is True:
+            return
+        if quick is None:
+            marker_lower = marker.lower()
+            with closing(self._excel_repo.iter_rows(path)) as rows:
+                for row in rows:
+                    if marker_lower in " ".join(row).lower():
+                        return
+        raise ValueError(f"Файл {Path(path).name} не содержит обязательный маркер: {marker}")
@@ -0,0 +1,849 @@
+from __future__ import annotations
+
+import codecs
+import posixpath
+import re
+import zipfile
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+from xml.parsers import expat
+
+from sibglass_app.models.order_item import OrderItem
+from sibglass_app.services.save_service import AtomicSaveService
+from sibglass_app.services.sibglass_writer import WriteStats
+from sibglass_app.utils.xlsx_refs import (
+    cell_ref,
+    column_letter,
+    shift_formula_rows,
+    shift_range_ref,
+    shift_sqref,
+    split_cell_ref,
+    xml_escape,
+)
+
+_CHUNK_SIZE = 256 * 1024
+_TABLE_LAST_COL = 8
+_DEFAULT_START_ROW = 14
+
+_ROW_PATTERN = re.compile(r"<row\b[^>]*?/>|<row\b[^>]*>.*?</row>", re.S)
+_CELL_PATTERN = re.compile(r"<c\b[^>]*?/>|<c\b[^>]*>.*?</c>", re.S)
+_ATTR_PATTERN = re.compile(r'([\w:]+)="([^"]*)"')
+_SHEET_DATA_OPEN = re.compile(r"<sheetData\b[^>]*?(/?)>")
+_ROW_START = re.compile(r"<row\b[^>]*?/?>")
+_WHITESPACE = re.compile(r"\s*")
+_FORMULA_PATTERN = re.compile(r"(<f\b[^>]*>)(.*?)(</f>)", re.S)
+_SHARED_REF_PATTERN = re.compile(r'(<f\b[^>]*\bref=")([^"]+)(")')
+_XF_PATTERN = re.compile(r"<xf\b[^>]*?/>|<xf\b[^>]*>.*?</xf>", re.S)
+
+_REL_OFFICE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_WORKSHEET_REL = _REL_OFFICE + "/worksheet"
+_CALC_CHAIN_REL = _REL_OFFICE + "/calcChain"
+
+
+class StreamWriterUnsupported(Exception):
+    """Шаблон содержит конструкции, которые потоковая запись не умеет сдвигать безопасно."""
+
+
+@dataclass
+class _TemplateScan:
+    customer_cell: tuple[int, int] | None = None
+    address_cell: tuple[int, int] | None = None
+    header_row: int | None = None
+    total_rows: set[int] = field(default_factory=set)
+    merges: list[tuple[int, int, int, int]] = field(default_factory=list)
+    styles: dict[int, dict[int, int]] = field(default_factory=dict)
+    max_column: int = 0
+    has_drawing: bool = False
+    unsupported: str = ""
+
+    @property
+    def start_row(self) -> int:
+        return self.header_row + 1 if self.header_row is not None else _DEFAULT_START_ROW
+
+    @property
+    def total_row(self) -> int | None:
+        return min((row for row in self.total_rows if row >= self.start_row), default=None)
+
+    def find_merge(self, row: int, col: int) -> tuple[int, int, int, int] | None:
+        for merge in self.merges:
+            if merge[0] <= row <= merge[2] and merge[1] <= col <= merge[3]:
+                return merge
+        return None
+
+
+@dataclass
+class _Patch:
+    value: object = None
+    kind: str = ""  # "n" — число, "s" — строка, "f" — формула, "" — только стиль
+    transforms: list[str] = field(default_factory=list)
+    set_value: bool = False
+
+
+class _StylePatcher:
+    """Дописывает в styles.xml шрифты, заливку, рамку и производные xf без переписывания остального."""
+
+    def __init__(self, styles_xml: str) -> None:
+        if "<styleSheet" not in styles_xml:
+            raise StreamWriterUnsupported("styles.xml использует префиксы пространства имен")
+        self._xml = styles_xml
+        self._new: dict[str, list[str]] = {"fonts": [], "fills": [], "borders": [], "cellXfs": []}
+        self._counts = {name: self._count(name) for name in self._new}
+        self._xfs = _XF_PATTERN.findall(self._section("cellXfs"))
+        self._derived: dict[tuple[str, int | None], int] = {}
+        self._shared_ids: dict[str, int] = {}
+
+    def _section(self, name: str) -> str:
+        match = re.search(rf"<{name}\b[^>]*>(.*?)</{name}>", self._xml, re.S)
+        if match is None:
+            raise StreamWriterUnsupported(f"В styles.xml нет раздела {name}")
+        return match.group(1)
+
+    def _count(self, name: str) -> int:
+        body = self._section(name)
+        tag = {"fonts": "font", "fills": "fill", "borders": "border", "cellXfs": "xf"}[name]
+        return len(re.findall(rf"<{tag}\b", body))
+
+    def _add(self, section: str, xml: str) -> int:
+        key = f"{section}:{xml}"
+        if key not in self._shared_ids:
+            self._shared_ids[key] = self._counts[section] + len(self._new[section])
+            self._new[section].append(xml)
+        return self._shared_ids[key]
+
+    def derive(self, transform: str, source: int | None, components: dict[str, str]) -> int:
+        key = (transform, source)
+        if key in self._derived:
+            return self._derived[key]
+
+        if source is None or source >= len(self._xfs):
+            # Новая ячейка openpyxl: нулевые индексы и выравнивание по умолчанию
+            base = '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        else:
+            base = self._xfs[source]
+        start_tag = re.match(r"<xf\b[^>]*?/?>", base).group(0)
+        attrs = dict(_ATTR_PATTERN.findall(start_tag))
+        inner = "" if base.endswith("/>") else base[len(start_tag) : -len("</xf>")]
+
+        if "font" in components:
+            attrs["fontId"] = str(self._add("fonts", components["font"]))
+            attrs["applyFont"] = "1"
+        if "fill" in components:
+            attrs["fillId"] = str(self._add("fills", components["fill"]))
+            attrs["applyFill"] = "1"
+        if "border" in components:
+            attrs["borderId"] = str(self._add("borders", components["border"]))
+            attrs["applyBorder"] = "1"
+        if "numFmtId" in components:
+            attrs["numFmtId"] = components["numFmtId"]
+            attrs["applyNumberFormat"] = "1"
+        if "alignment" in components:
+            inner = re.sub(r"<alignment\b[^>]*?/>|<alignment\b[^>]*>.*?</alignment>", "", inner, flags=re.S)
+            inner = components["alignment"] + inner
+            attrs["applyAlignment"] = "1"
+
+        attr_text = " ".join(f'{name}="{value}"' for name, value in attrs.items())
+        xml = f"<xf {attr_text}>{inner}</xf>" if inner else f"<xf {attr_text}/>"
+        # Колонки с одинаковыми правилами (D, E, F) получают один и тот же xf
+        index = self._add("cellXfs", xml)
+        if index == len(self._xfs):
+            self._xfs.append(xml)
+        self._derived[key] = index
+        return index
+
+    def render(self) -> str:
+        xml = self._xml
+        for section, additions in self._new.items():
+            if not additions:
+                continue
+            total = self._counts[section] + len(additions)
+            xml = re.sub(
+                rf"(<{section}\b[^>]*>)(.*?)(</{section}>)",
+                lambda m: re.sub(r'count="\d+"', f'count="{total}"', m.group(1)) + m.group(2) + "".join(additions) + m.group(3),
+                xml,
+                count=1,
+                flags=re.S,
+            )
+        return xml
+
+
+class XlsxStreamWriter:
+    """Потоковая запись заявки прямо в zip-архив шаблона.
+
+    Все части книги копируются байт в байт, кроме листа заявки (переписывается
+    построчно), styles.xml (дописываются стили строк), workbook.xml (пересчет
+    при открытии) и удаляемого calcChain.xml. Значения и стили совпадают с записью
+    через openpyxl; для шаблонов, где безопасный сдвиг невозможен, выбрасывается
+    StreamWriterUnsupported, и вызывающий код возвращается к openpyxl.
+    """
+
+    PROGRESS_STEP = 100
+
+    def __init__(self, save_service: AtomicSaveService | None = None) -> None:
+        self._save_service = save_service or AtomicSaveService()
+        self._style_transforms: dict[str, dict[str, str]] | None = None
+
+    @property
+    def _transforms(self) -> dict[str, dict[str, str]]:
+        # openpyxl нужен только для XML стилей — загружаем его при первой записи, а не при создании сервиса
+        if self._style_transforms is None:
+            self._style_transforms = self._build_transforms()
+        return self._style_transforms
+
+    @staticmethod
+    def _build_transforms() -> dict[str, dict[str, str]]:
+        from openpyxl.xml.functions import tostring
+
+        from sibglass_app.services.sibglass_writer import writer_styles
+
+        def xml(obj) -> str:
+            return tostring(obj.to_tree()).decode("utf-8")
+
+        styles = writer_styles()
+        font = xml(styles.font_default)
+        accent = xml(styles.font_accent)
+        fill = xml(styles.fill_a)
+        border = xml(styles.border_thin)
+        center = xml(styles.align_center)
+        right = xml(styles.align_right)
+        # Те же правила, что SibglassWriterService._style_data_cell/_style_total_cells
+        transforms: dict[str, dict[str, str]] = {
+            "data1": {"fill": fill, "border": border, "font": font},
+            "data2": {"border": border, "font": font},
+            "data3": {"border": border, "font": font, "alignment": center},
+            "data4": {"border": border, "font": font, "alignment": center, "numFmtId": "1"},
+            "data7": {"border": border, "font": accent, "alignment": right, "numFmtId": "2"},
+            "total6": {"font": accent, "alignment": center, "numFmtId": "1"},
+            "total7": {"font": accent, "alignment": right, "numFmtId": "2"},
+        }
+        transforms["data5"] = transforms["data6"] = transforms["data4"]
+        transforms["data8"] = transforms["data7"]
+        transforms["total8"] = transforms["total7"]
+        return transforms
+
+    def write_file(
+        self,
+        template_path: str,
+        output_path: str,
+        customer: str,
+        address: str,
+        items: list[OrderItem],
+        progress: Callable[[int, int], None] | None = None,
+    ) -> WriteStats:
+        # Шаблон закрывается до подмены файла: результат может записываться поверх самого шаблона
+        with self._save_service.replacing(output_path) as temp_path:
+            with zipfile.ZipFile(template_path) as source:
+                sheet_name = self._active_sheet_part(source)
+                shared_strings = self._read_shared_strings(source)
+                scan = self._scan_sheet(source, sheet_name, shared_strings)
+                plan = _SheetPlan.build(scan, customer, address, items)
+                self._check_drawings(source, sheet_name, scan, plan)
+                styles = _StylePatcher(source.read("xl/styles.xml").decode("utf-8"))
+                plan.resolve_styles(styles, self._transforms)
+
+                with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_DEFLATED) as target_zip:
+                    self._copy_entries(source, target_zip, sheet_name, styles, plan, progress)
+        return plan.stats
+
+    # --- Структура книги ---------------------------------------------------
+
+    @staticmethod
+    def _active_sheet_part(archive: zipfile.ZipFile) -> str:
+        workbook = archive.read("xl/workbook.xml").decode("utf-8")
+        rels = archive.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+
+        active_match = re.search(r'<workbookView\b[^>]*\bactiveTab="(\d+)"', workbook)
+        active = int(active_match.group(1)) if active_match else 0
+        sheets = re.findall(r"<sheet\b[^>]*?/>", workbook)
+        if active >= len(sheets):
+            raise StreamWriterUnsupported("Не удалось определить активный лист")
+        rel_id = dict(_ATTR_PATTERN.findall(sheets[active])).get("r:id")
+
+        for rel in re.findall(r"<Relationship\b[^>]*?/>", rels):
+            attrs = dict(_ATTR_PATTERN.findall(rel))
+            if attrs.get("Id") != rel_id:
+                continue
+            if attrs.get("Type") != _WORKSHEET_REL:
+                raise StreamWriterUnsupported("Активный лист не является листом с ячейками")
+            return _resolve_part("xl/workbook.xml", attrs["Target"])
+        raise StreamWriterUnsupported("Не найдена связь активного листа")
+
+    @staticmethod
+    def _read_shared_strings(archive: zipfile.ZipFile) -> list[str]:
+        name = next((n for n in archive.namelist() if n.lower() == "xl/sharedstrings.xml"), None)
+        if name is None:
+            return []
+
+        strings: list[str] = []
+        parts: list[str] = []
+        state = {"capture": False, "phonetic": False}
+
+        def start(tag: str, attrs: dict[str, str]) -> None:
+            local = tag.rsplit(":", 1)[-1]
+            if local == "si":
+                parts.clear()
+            elif local == "rPh":
+                state["phonetic"] = True
+            elif local == "t" and not state["phonetic"]:
+                state["capture"] = True
+
+        def end(tag: str) -> None:
+            local = tag.rsplit(":", 1)[-1]
+            if local == "t":
+                state["capture"] = False
+            elif local == "rPh":
+                state["phonetic"] = False
+            elif local == "si":
+                strings.append("".join(parts))
+
+        def data(text: str) -> None:
+            if state["capture"]:
+                parts.append(text)
+
+        _parse_part(archive, name, start, end, data)
+        return strings
+
+    @staticmethod
+    def _scan_sheet(archive: zipfile.ZipFile, name: str, shared_strings: list[str]) -> _TemplateScan:
+        scan = _TemplateScan()
+        state: dict = {"row": 0, "col": 0, "type": "", "text": None, "capture": False}
+        parts: list[str] = []
+
+        def start(tag: str, attrs: dict[str, str]) -> None:
+            prefix, _, local = tag.rpartition(":")
+            if local in ("row", "c", "sheetData") and prefix:
+                scan.unsupported = "Лист использует префиксы пространства имен"
+            if local == "row":
+                state["row"] = int(attrs["r"]) if "r" in attrs else state["row"] + 1
+                state["col"] = 0
+            elif local == "c":
+                row, col = split_cell_ref(attrs["r"]) if "r" in attrs else (state["row"], state["col"] + 1)
+                state["col"] = col
+                state["type"] = attrs.get("t", "n")
+                scan.max_column = max(scan.max_column, col)
+                if col <= _TABLE_LAST_COL:
+                    scan.styles.setdefault(row, {})[col] = int(attrs.get("s", "0"))
+                parts.clear()
+            elif local in ("v", "t"):
+                state["capture"] = True
+            elif local == "mergeCell":
+                first, _, last = attrs["ref"].partition(":")
+                min_row, min_col = split_cell_ref(first)
+                max_row, max_col = split_cell_ref(last or first)
+                scan.merges.append((min_row, min_col, max_row, max_col))
+                scan.max_column = max(scan.max_column, max_col)
+            elif local == "drawing":
+                scan.has_drawing = True
+            elif local in ("legacyDrawing", "tablePart"):
+                scan.unsupported = "Лист содержит примечания или умные таблицы"
+            elif local == "sparklineGroups":
+                # Диапазоны спарклайнов записываются с именем своего листа, их сдвиг не поддерживается
+                scan.unsupported = "Лист содержит спарклайны"
+
+        def end(tag: str) -> None:
+            local = tag.rsplit(":", 1)[-1]
+            if local in ("v", "t"):
+                state["capture"] = False
+            elif local == "c":
+                text = "".join(parts)
+                if state["type"] == "s":
+                    text = shared_strings[int(text)] if text.strip().isdigit() and int(text) < len(shared_strings) else ""
+                elif state["type"] not in ("inlineStr", "str"):
+                    return
+                _register_text(scan, state["row"], state["col"], text)
+
+        def data(text: str) -> None:
+            if state["capture"]:
+                parts.append(text)
+
+        _parse_part(archive, name, start, end, data)
+        if scan.unsupported:
+            raise StreamWriterUnsupported(scan.unsupported)
+        return scan
+
+    @staticmethod
+    def _check_drawings(archive: zipfile.ZipFile, sheet_name: str, scan: _TemplateScan, plan: _SheetPlan) -> None:
+        if not scan.has_drawing or plan.delta == 0:
+            return
+        rels_name = posixpath.join(posixpath.dirname(sheet_name), "_rels", posixpath.basename(sheet_name) + ".rels")
+        if rels_name not in archive.namelist():
+            return
+        rels = archive.read(rels_name).decode("utf-8")
+        for rel in re.findall(r"<Relationship\b[^>]*?/>", rels):
+            attrs = dict(_ATTR_PATTERN.findall(rel))
+            if not attrs.get("Type", "").endswith("/drawing"):
+                continue
+            drawing = archive.read(_resolve_part(sheet_name, attrs["Target"])).decode("utf-8")
+            rows = [int(value) for value in re.findall(r"<(?:\w+:)?row>(\d+)</(?:\w+:)?row>", drawing)]
+            # Якоря рисунков 0-based; все, что ниже строки "ВСЕГО", пришлось бы сдвигать
+            if rows and max(rows) + 1 >= plan.total_row:
+                raise StreamWriterUnsupported("Рисунки ниже таблицы требуют сдвига якорей")
+
+    # --- Запись архива -----------------------------------------------------
+
+    def _copy_entries(
+        self,
+        source: zipfile.ZipFile,
+        target: zipfile.ZipFile,
+        sheet_name: str,
+        styles: _StylePatcher,
+        plan: _SheetPlan,
+        progress: Callable[[int, int], None] | None,
+    ) -> None:
+        calc_chain = None
+        for info in source.infolist():
+            if info.filename.lower() == "xl/calcchain.xml":
+                calc_chain = info.filename
+
+        for info in source.infolist():
+            name = info.filename
+            if name == calc_chain:
+                # Цепочка вычислений ссылается на старые адреса формул; Excel восстановит ее сам
+                continue
+            if name == sheet_name:
+                with source.open(info) as src, target.open(_new_info(info), "w", force_zip64=True) as dst:
+                    _rewrite_sheet(src, dst, plan, progress, self.PROGRESS_STEP)
+            elif name == "xl/styles.xml":
+                target.writestr(_new_info(info), styles.render().encode("utf-8"))
+            elif name == "xl/workbook.xml":
+                target.writestr(_new_info(info), _force_full_calc(source.read(info).decode("utf-8")).encode("utf-8"))
+            elif calc_chain and name == "[Content_Types].xml":
+                xml = source.read(info).decode("utf-8")
+                xml = re.sub(r'<Override\b[^>]*PartName="/' + re.escape(calc_chain) + r'"[^>]*/>', "", xml)
+                target.writestr(_new_info(info), xml.encode("utf-8"))
+            elif calc_chain and name == "xl/_rels/workbook.xml.rels":
+                xml = source.read(info).decode("utf-8")
+                xml = re.sub(r'<Relationship\b[^>]*Type="' + re.escape(_CALC_CHAIN_REL) + r'"[^>]*/>', "", xml)
+                target.writestr(_new_info(info), xml.encode("utf-8"))
+            else:
+                # Остальные части копируются без распаковки и перепаковки содержимого
+                with source.open(info) as src, target.open(_new_info(info), "w", force_zip64=True) as dst:
+                    for chunk in iter(lambda: src.read(_CHUNK_SIZE), b""):
+                        dst.write(chunk)
+
+
+@dataclass
+class _SheetPlan:
+    start_row: int
+    total_row: int
+    items: list[OrderItem]
+    patches: dict[int, dict[int, _Patch]]
+    resolved_styles: dict[tuple[int, int], int] = field(default_factory=dict)
+    template_styles: dict[int, dict[int, int]] = field(default_factory=dict)
+    styler: _StylePatcher | None = None
+    transforms: dict[str, dict[str, str]] = field(default_factory=dict)
+    # Заполняется при переписывании листа: учитываются только реально выведенные ячейки
+    stats: WriteStats = field(default_factory=WriteStats)
+
+    @property
+    def existing_count(self) -> int:
+        return max(self.total_row - self.start_row, 0)
+
+    @property
+    def delta(self) -> int:
+        return len(self.items) - self.existing_count
+
+    @classmethod
+    def build(cls, scan: _TemplateScan, customer: str, address: str, items: list[OrderItem]) -> _SheetPlan:
+        total_row = scan.total_row
+        if total_row is None:
+            raise ValueError("Не найдена строка 'ВСЕГО' в таблице шаблона. Запись отменена, чтобы не повредить нижние данные.")
+        start_row = scan.start_row
+
+        for min_row, _, max_row, _ in scan.merges:
+            if min_row < total_row and max_row >= start_row:
+                raise StreamWriterUnsupported("Объединенные ячейки в области строк заявки")
+
+        plan = cls(start_row=start_row, total_row=total_row, items=items, patches={}, template_styles=scan.styles)
+        if scan.customer_cell:
+            plan._plan_label(scan, *scan.customer_cell, customer)
+        if scan.address_cell:
+            plan._plan_label(scan, *scan.address_cell, address)
+        plan._plan_total(scan)
+        return plan
+
+    def _patch(self, row: int, col: int) -> _Patch:
+        return self.patches.setdefault(row, {}).setdefault(col, _Patch())
+
+    def _set(self, row: int, col: int, value, kind: str) -> None:
+        patch = self._patch(row, col)
+        patch.value, patch.kind, patch.set_value = value, kind, True
+
+    def _plan_label(self, scan: _TemplateScan, row: int, label_col: int, text: str) -> None:
+        # Повторяет SibglassWriterService._write_text_right_of_label
+        col = label_col + 1
+        max_search = max(scan.max_column + 20, col + 20)
+        while col <= max_search:
+            merge = scan.find_merge(row, col)
+            if merge is None:
+                self._set_same_row(scan, row, col, text)
+                return
+            if merge[0] == row and merge[1] > label_col:
+                self._set_same_row(scan, merge[0], merge[1], text)
+                return
+            col = merge[3] + 1
+        self._set_same_row(scan, row, label_col + 1, text)
+
+    def _set_same_row(self, scan: _TemplateScan, row: int, col: int, text: str) -> None:
+        merge = scan.find_merge(row, col)
+        if merge is not None and (merge[0], merge[1]) != (row, col):
+            if merge[0] != row:
+                return
+            row, col = merge[0], merge[1]
+        if row >= self.total_row:
+            raise StreamWriterUnsupported("Реквизиты расположены ниже таблицы")
+        self._set(row, col, text, "s")
+
+    def _plan_total(self, scan: _TemplateScan) -> None:
+        count = len(self.items)
+        end_row = self.start_row + count - 1
+        for col in (6, 7, 8):
+            letter = column_letter(col)
+            value, kind = (f"SUM({letter}{self.start_row}:{letter}{end_row})", "f") if count else (0, "n")
+            row, target_col = self.total_row, col
+            merge = scan.find_merge(row, col)
+            if merge is not None and (merge[0], merge[1]) != (row, col):
+                row, target_col = merge[0], merge[1]
+            if row != self.total_row:
+                raise StreamWriterUnsupported("Итоговые ячейки объединены с соседними строками")
+            self._set(row, target_col, value, kind)
+            self._patch(row, target_col).transforms.append(f"total{col}")
+
+    def resolve_styles(self, styler: _StylePatcher, transforms: dict[str, dict[str, str]]) -> None:
+        self.styler = styler
+        self.transforms = transforms
+        for row, cols in self.patches.items():
+            for col, patch in cols.items():
+                if not patch.transforms:
+                    continue
+                style: int | None = self.template_styles.get(row, {}).get(col)
+                for transform in patch.transforms:
+                    style = styler.derive(transform, style, transforms[transform])
+                self.resolved_styles[(row, col)] = style
+
+    def data_style(self, row: int, col: int) -> int:
+        # Новые строки вставляются перед "ВСЕГО" пустыми, стили шаблона есть только у существующих
+        source = self.template_styles.get(row, {}).get(col) if row < self.total_row else None
+        transform = f"data{col}"
+        return self.styler.derive(transform, source, self.transforms[transform])
+
+
+def _register_text(scan: _TemplateScan, row: int, col: int, raw: str) -> None:
+    text = raw.strip()
+    lowered = text.lower()
+    if lowered == "заказчик" and (scan.customer_cell is None or (row, col) < scan.customer_cell):
+        scan.customer_cell = (row, col)
+    elif lowered == "адрес доставки" and (scan.address_cell is None or (row, col) < scan.address_cell):
+        scan.address_cell = (row, col)
+    if col <= _TABLE_LAST_COL:
+        if text == "№" and (scan.header_row is None or row < scan.header_row):
+            scan.header_row = row
+        if "всего" in lowered:
+            scan.total_rows.add(row)
+
+
+def _parse_part(archive: zipfile.ZipFile, name: str, start, end, data) -> None:
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = data
+    with archive.open(name) as stream:
+        for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b""):
+            parser.Parse(chunk, False)
+    parser.Parse(b"", True)
+
+
+def _resolve_part(owner: str, target: str) -> str:
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(owner), target))
+
+
+def _new_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    copy = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    copy.compress_type = zipfile.ZIP_DEFLATED
+    copy.external_attr = info.external_attr
+    return copy
+
+
+def _force_full_calc(workbook_xml: str) -> str:
+    # Формулы пишутся без кэшированных значений — как и openpyxl, просим Excel пересчитать книгу
+    # calcPr бывает и пустым элементом, и парой <calcPr ...></calcPr> — правится только открывающий тег
+    calc = re.search(r"<calcPr\b([^>]*?)(/?)>", workbook_xml)
+    if calc:
+        attrs, closing = calc.group(1), calc.group(2)
+        if "fullCalcOnLoad=" in attrs:
+            attrs = re.sub(r'fullCalcOnLoad="[^"]*"', 'fullCalcOnLoad="1"', attrs)
+        else:
+            attrs = attrs.rstrip() + ' fullCalcOnLoad="1"'
+        return workbook_xml[: calc.start()] + f"<calcPr{attrs}{closing}>" + workbook_xml[calc.end() :]
+
+    anchor = None
+    for closing_tag in ("</definedNames>", "</externalReferences>", "</functionGroups>", "</sheets>"):
+        position = workbook_xml.find(closing_tag)
+        if position >= 0:
+            anchor = position + len(closing_tag)
+            break
+    if anchor is None:
+        return workbook_xml
+    return workbook_xml[:anchor] + '<calcPr fullCalcOnLoad="1"/>' + workbook_xml[anchor:]
+
+
+def _iter_text(stream) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b""):
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def _rewrite_sheet(src, dst, plan: _SheetPlan, progress: Callable[[int, int], None] | None, step: int) -> None:
+    total_row = plan.total_row
+    delta = plan.delta
+    target_count = len(plan.items)
+    state = {"next_data_row": plan.start_row, "prev_row": 0, "written": 0}
+    pending: list[str] = []
+
+    def emit(text: str) -> None:
+        pending.append(text)
+        if len(pending) >= 512:
+            flush()
+
+    def flush() -> None:
+        dst.write("".join(pending).encode("utf-8"))
+        pending.clear()
+
+    def report() -> None:
+        written = state["written"]
+        if progress is not None and (written % step == 0 or written == target_count):
+            progress(written, target_count)
+
+    def emit_data_rows_before(limit: int) -> None:
+        last = min(limit, plan.start_row + target_count)
+        while state["next_data_row"] < last:
+            row = state["next_data_row"]
+            emit(f'<row r="{row}">{_data_cells(plan, row)}</row>')
+            state["next_data_row"] += 1
+            state["written"] += 1
+            report()
+
+    chunks = _iter_text(src)
+    buffer = ""
+    while (match := _SHEET_DATA_OPEN.search(buffer)) is None:
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise StreamWriterUnsupported("В листе нет sheetData")
+        buffer += chunk
+
+    emit(_shift_prefix(buffer[: match.start()], plan))
+    emit("<sheetData>")
+    buffer = buffer[match.end() :]
+    pos = 0
+    # Для <sheetData/> строк в шаблоне нет — сразу дописываем строки заявки
+    closed = bool(match.group(1))
+
+    while not closed:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if buffer.startswith("</sheetData>", pos):
+            buffer = buffer[pos + len("</sheetData>") :]
+            break
+        match = _ROW_PATTERN.match(buffer, pos)
+        if match is None:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise StreamWriterUnsupported("Не удалось разобрать строки листа")
+            # Хвост буфера — начало незаконченной строки, дочитываем ее
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        pos = match.end()
+
+        row_xml = match.group(0)
+        start_tag = _ROW_START.match(row_xml).group(0)
+        attrs = dict(_ATTR_PATTERN.findall(start_tag))
+        row = int(attrs["r"]) if "r" in attrs else state["prev_row"] + 1
+        state["prev_row"] = row
+
+        if row >= total_row:
+            # Строки r должны идти по возрастанию: все строки заявки выводятся до сдвинутого подвала
+            emit_data_rows_before(plan.start_row + target_count)
+        elif row >= plan.start_row:
+            emit_data_rows_before(row)
+        if plan.start_row <= row < total_row:
+            if row < plan.start_row + target_count:
+                emit(_rewrite_row(row_xml, start_tag, row, row, plan, data_row=True))
+                state["next_data_row"] = row + 1
+                state["written"] += 1
+                report()
+            # Строки сверх нужного количества удаляются
+            continue
+        new_row = row + delta if row >= total_row else row
+        emit(_rewrite_row(row_xml, start_tag, row, new_row, plan, data_row=False))
+
+    emit_data_rows_before(total_row + target_count)
+    emit("</sheetData>")
+
+    # Хвост листа (mergeCells, условное форматирование и т.д.) невелик и сдвигается целиком
+    emit(_shift_suffix(buffer + "".join(chunks), plan))
+    flush()
+
+
+def _rewrite_row(row_xml: str, start_tag: str, row: int, new_row: int, plan: _SheetPlan, data_row: bool) -> str:
+    patches = plan.patches.get(row, {})
+    if not data_row and not patches and plan.delta == 0:
+        return row_xml
+
+    body = "" if start_tag.endswith("/>") else row_xml[len(start_tag) : -len("</row>")]
+    cells: dict[int, str] = {}
+    tail = _CELL_PATTERN.sub("", body)
+    prev_col = 0
+    template_cells = _CELL_PATTERN.findall(body)
+    if new_row != row:
+        plan.stats.moved += len(template_cells)
+    for cell_xml in template_cells:
+        cell_start = re.match(r"<c\b[^>]*?/?>", cell_xml).group(0)
+        cell_attrs = dict(_ATTR_PATTERN.findall(cell_start))
+        col = split_cell_ref(cell_attrs["r"])[1] if "r" in cell_attrs else prev_col + 1
+        prev_col = col
+        cells[col] = _shift_cell(cell_xml, new_row, col, plan) if "r" in cell_attrs or new_row != row else cell_xml
+
+    if data_row:
+        cells.update(_data_cell_map(plan, row))
+
+    for col, patch in patches.items():
+        existing_style = None
+        if col in cells:
+            style_match = re.search(r'\bs="(\d+)"', re.match(r"<c\b[^>]*?/?>", cells[col]).group(0))
+            existing_style = int(style_match.group(1)) if style_match else None
+        style = plan.resolved_styles.get((row, col), existing_style)
+        plan.stats.styled += (row, col) in plan.resolved_styles
+        if patch.set_value:
+            cells[col] = _cell_xml(new_row, col, patch.value, patch.kind, style)
+            plan.stats.values += 1
+        elif col in cells and style is not None:
+            cells[col] = re.sub(r'\bs="\d+"', f's="{style}"', cells[col], count=1)
+
+    new_start = re.sub(r'\s+spans="[^"]*"', "", start_tag)
+    if "r=" in new_start:
+        new_start = re.sub(r'\br="\d+"', f'r="{new_row}"', new_start, count=1)
+    else:
+        new_start = new_start.replace("<row", f'<row r="{new_row}"', 1)
+    new_start = new_start[:-2] + ">" if new_start.endswith("/>") else new_start
+    ordered = "".join(cells[col] for col in sorted(cells))
+    return f"{new_start}{ordered}{tail.strip()}</row>"
+
+
+def _shift_cell(cell_xml: str, new_row: int, col: int, plan: _SheetPlan) -> str:
+    cell_xml = re.sub(r'(<c\b[^>]*?\br=")[^"]+(")', rf"\g<1>{cell_ref(new_row, col)}\g<2>", cell_xml, count=1)
+    if plan.delta and "<f" in cell_xml:
+        cell_xml = _FORMULA_PATTERN.sub(
+            lambda m: m.group(1) + shift_formula_rows(m.group(2), plan.total_row, plan.delta) + m.group(3),
+            cell_xml,
+        )
+        cell_xml = _SHARED_REF_PATTERN.sub(
+            lambda m: m.group(1) + shift_range_ref(m.group(2), plan.total_row, plan.delta) + m.group(3),
+            cell_xml,
+        )
+    return cell_xml
+
+
+def _data_cell_map(plan: _SheetPlan, row: int) -> dict[int, str]:
+    item = plan.items[row - plan.start_row]
+    values = [
+        (row - plan.start_row + 1, "n"),
+        ("", "s"),
+        (item.formula, "s"),
+        (int(item.width), "n"),
+        (int(item.height), "n"),
+        (int(item.count), "n"),
+        (f"D{row}*E{row}/1000000", "f"),
+        (f"G{row}*F{row}", "f"),
+    ]
+    plan.stats.values += len(values)
+    plan.stats.styled += len(values)
+    return {
+        col: _cell_xml(row, col, value, kind, plan.data_style(row, col))
+        for col, (value, kind) in enumerate(values, start=1)
+    }
+
+
+def _data_cells(plan: _SheetPlan, row: int) -> str:
+    cells = _data_cell_map(plan, row)
+    return "".join(cells[col] for col in sorted(cells))
+
+
+def _cell_xml(row: int, col: int, value, kind: str, style: int | None) -> str:
+    ref = cell_ref(row, col)
+    style_attr = f' s="{style}"' if style else ""
+    if kind == "f":
+        return f'<c r="{ref}"{style_attr}><f>{xml_escape(str(value))}</f></c>'
+    if kind == "n":
+        return f'<c r="{ref}"{style_attr}><v>{value}</v></c>'
+    text = str(value)
+    if text == "":
+        return f'<c r="{ref}"{style_attr}/>'
+    space = ' xml:space="preserve"' if text != text.strip() or "\n" in text else ""
+    return f'<c r="{ref}"{style_attr} t="inlineStr"><is><t{space}>{xml_escape(text)}</t></is></c>'
+
+
+def _shift_prefix(prefix: str, plan: _SheetPlan) -> str:
+    def dimension(match: re.Match) -> str:
+        first, _, last = match.group(2).partition(":")
+        last = last or first
+        last_row, last_col = split_cell_ref(last)
+        last_row = last_row + plan.delta if last_row >= plan.total_row else last_row
+        last_row = max(last_row, plan.total_row + plan.delta, plan.start_row + len(plan.items) - 1)
+        last_col = max(last_col, _TABLE_LAST_COL)
+        return f"{match.group(1)}{first}:{cell_ref(last_row, last_col)}{match.group(3)}"
+
+    return re.sub(r'(<dimension\b[^>]*\bref=")([^"]+)(")', dimension, prefix, count=1)
+
+
+def _shift_suffix(suffix: str, plan: _SheetPlan) -> str:
+    if plan.delta == 0:
+        return suffix
+    from_row, delta = plan.total_row, plan.delta
+    suffix = re.sub(
+        r'(<(?:mergeCell|hyperlink|autoFilter)\b[^>]*\bref=")([^"]+)(")',
+        lambda m: m.group(1) + shift_range_ref(m.group(2), from_row, delta) + m.group(3),
+        suffix,
+    )
+    suffix = re.sub(
+        r'(\bsqref=")([^"]+)(")',
+        lambda m: m.group(1) + shift_sqref(m.group(2), from_row, delta) + m.group(3),
+        suffix,
+    )
+    suffix = re.sub(
+        r"(<(formula|formula1|formula2)>)(.*?)(</\2>)",
+        lambda m: m.group(1) + shift_formula_rows(m.group(3), from_row, delta) + m.group(4),
+        suffix,
+        flags=re.S,
+    )
+    # Условное форматирование и проверки данных из extLst (x14) хранят адреса в элементах xm:
+    suffix = re.sub(
+        r"(<xm:sqref>)(.*?)(</xm:sqref>)",
+        lambda m: m.group(1) + shift_sqref(m.group(2), from_row, delta) + m.group(3),
+        suffix,
+        flags=re.S,
+    )
+    suffix = re.sub(
+        r"(<xm:f>)(.*?)(</xm:f>)",
+        lambda m: m.group(1) + shift_formula_rows(m.group(2), from_row, delta) + m.group(3),
+        suffix,
+        flags=re.S,
+    )
+    # В colBreaks id — номер столбца, сдвигаются только разрывы строк
+    suffix = re.sub(
+        r"<rowBreaks\b.*?</rowBreaks>",
+        lambda block: re.sub(
+            r'(<brk\b[^>]*\bid=")(\d+)(")',
+            lambda m: m.group(1) + str(_shift_break(int(m.group(2)), from_row, delta)) + m.group(3),
+            block.group(0),
+        ),
+        suffix,
+        flags=re.S,
+    )
+    return suffix
+
+
+def _shift_break(row: int, from_row: int, delta: int) -> int:
+    return row + delta if row >= from_row else row
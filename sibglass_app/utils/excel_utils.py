@@ -1,6 +1,13 @@
 from __future__ import annotations
 
-from openpyxl.worksheet.worksheet import Worksheet
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from sibglass_app.utils.xlsx_refs import shift_formula_rows, shift_sqref
+
+if TYPE_CHECKING:
+    from openpyxl.worksheet.cell_range import CellRange
+    from openpyxl.worksheet.worksheet import Worksheet
 
 
 def find_cell_by_value(sheet: Worksheet, needle: str):
@@ -11,3 +18,186 @@ def find_cell_by_value(sheet: Worksheet, needle: str):
             if value == needle_lower:
                 return cell
     return None
+
+
+class MergedCellIndex:
+    """Индекс объединенных диапазонов листа по номерам строк.
+
+    Поиск диапазона по ячейке — O(диапазонов в строке) вместо перебора всех
+    объединений листа. После сдвига строк индекс нужно перестроить.
+    """
+
+    def __init__(self, sheet: Worksheet) -> None:
+        self._sheet = sheet
+        self._by_row: dict[int, list[CellRange]] = {}
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        by_row: dict[int, list[CellRange]] = {}
+        for merged_range in self._sheet.merged_cells.ranges:
+            for row in range(merged_range.min_row, merged_range.max_row + 1):
+                by_row.setdefault(row, []).append(merged_range)
+        self._by_row = by_row
+
+    def find(self, row: int, col: int) -> CellRange | None:
+        for merged_range in self._by_row.get(row, ()):
+            if merged_range.min_col <= col <= merged_range.max_col:
+                return merged_range
+        return None
+
+    def shift_rows(self, from_row: int, delta: int) -> int:
+        moved = shift_rows(self._sheet, from_row, delta)
+        self.rebuild()
+        return moved
+
+
+def shift_rows(sheet: Worksheet, from_row: int, delta: int) -> int:
+    """Сдвигает блок строк начиная с from_row на delta за один проход.
+
+    В отличие от insert_rows/delete_rows openpyxl вместе с ячейками переносит
+    объединения, высоты строк, разрывы страниц, проверки данных, условное
+    форматирование и ссылки в формулах. При delta < 0 строки
+    [from_row + delta, from_row) удаляются. Возвращает число перенесенных ячеек.
+    """
+    if not delta:
+        return 0
+
+    from openpyxl.cell.cell import MergedCell
+    from openpyxl.formatting.formatting import ConditionalFormattingList
+    from openpyxl.worksheet.cell_range import MultiCellRange
+
+    def new_row(row: int) -> int | None:
+        if row >= from_row:
+            return row + delta
+        if delta < 0 and row >= from_row + delta:
+            return None
+        return row
+
+    first_affected = min(from_row, from_row + delta)
+
+    moved = [key for key in sheet._cells if key[0] >= first_affected]
+    cells = [sheet._cells.pop(key) for key in moved]
+    moved_count = 0
+    for cell in cells:
+        row = new_row(cell.row)
+        if row is None:
+            continue
+        # Пустые ячейки объединений openpyxl создает сам при загрузке, в шаблоне их нет
+        if row != cell.row and not isinstance(cell, MergedCell) and (cell._value is not None or cell.has_style):
+            moved_count += 1
+        cell.row = row
+        sheet._cells[(row, cell.column)] = cell
+        hyperlink = getattr(cell, "_hyperlink", None)  # у MergedCell ссылок нет
+        if hyperlink is not None:
+            hyperlink.ref = cell.coordinate
+
+    # Формулы во всем листе: ссылки на сдвинутые строки должны указывать на новые адреса
+    for cell in sheet._cells.values():
+        if cell.data_type == "f" and isinstance(cell._value, str):
+            cell._value = shift_formula_rows(cell._value, from_row, delta)
+
+    dimensions = [(row, sheet.row_dimensions.pop(row)) for row in list(sheet.row_dimensions) if row >= first_affected]
+    for row, dimension in dimensions:
+        target = new_row(row)
+        if target is not None:
+            dimension.index = target
+            sheet.row_dimensions[target] = dimension
+
+    merged: list[CellRange] = []
+    for merged_range in sheet.merged_cells.ranges:
+        rows = [row for row in (new_row(r) for r in _surviving_bounds(merged_range, from_row, delta)) if row is not None]
+        if not rows:
+            continue
+        merged_range.min_row, merged_range.max_row = min(rows), max(rows)
+        merged.append(merged_range)
+    # Диапазоны хешируются по координатам, поэтому набор собирается заново
+    sheet.merged_cells = MultiCellRange(merged)
+
+    for validation in sheet.data_validations.dataValidation:
+        validation.sqref = MultiCellRange(shift_sqref(str(validation.sqref), from_row, delta))
+
+    formatting = sheet.conditional_formatting
+    sheet.conditional_formatting = ConditionalFormattingList()
+    for conditional in formatting:
+        sqref = shift_sqref(str(conditional.sqref), from_row, delta)
+        for rule in conditional.rules:
+            rule.formula = [shift_formula_rows(text, from_row, delta) for text in rule.formula]
+            sheet.conditional_formatting.add(sqref, rule)
+
+    for page_break in sheet.row_breaks.brk:
+        if page_break.id >= from_row:
+            page_break.id += delta
+    return moved_count
+
+
+def _surviving_bounds(merged_range: CellRange, from_row: int, delta: int) -> tuple[int, ...]:
+    # Первая и последняя строки диапазона, не попавшие в удаляемый блок
+    min_row, max_row = merged_range.min_row, merged_range.max_row
+    if delta < 0:
+        removed_from, removed_to = from_row + delta, from_row - 1
+        if removed_from <= min_row <= removed_to:
+            min_row = removed_to + 1
+        if removed_from <= max_row <= removed_to:
+            max_row = removed_from - 1
+        if min_row > max_row:
+            return ()
+    return min_row, max_row
+
+
+_CUSTOMER_LABEL = "заказчик"
+_ADDRESS_LABEL = "адрес доставки"
+_HEADER_MARK = "№"
+_TOTAL_MARK = "всего"
+_TABLE_LAST_COL = 8
+_DEFAULT_START_ROW = 14
+
+
+@dataclass
+class TemplateLayout:
+    """Разметка шаблона заявки, собранная за один проход по заполненным ячейкам."""
+
+    merged: MergedCellIndex
+    customer_cell: tuple[int, int] | None = None
+    address_cell: tuple[int, int] | None = None
+    header_row: int | None = None
+    total_row: int | None = None
+
+    @property
+    def start_row(self) -> int:
+        return self.header_row + 1 if self.header_row is not None else _DEFAULT_START_ROW
+
+    @classmethod
+    def scan(cls, sheet: Worksheet) -> TemplateLayout:
+        customer: tuple[int, int] | None = None
+        address: tuple[int, int] | None = None
+        header_row: int | None = None
+        total_rows: set[int] = set()
+
+        # Обходим только существующие ячейки: sheet.cell()/iter_rows создали бы пустые ячейки в модели.
+        # Порядок словаря не гарантирует построчный обход, поэтому берем минимум по (строка, колонка)
+        for (row, col), cell in sheet._cells.items():
+            value = cell.value
+            if value is None:
+                continue
+            text = str(value).strip()
+            lowered = text.lower()
+
+            if lowered == _CUSTOMER_LABEL and (customer is None or (row, col) < customer):
+                customer = (row, col)
+            elif lowered == _ADDRESS_LABEL and (address is None or (row, col) < address):
+                address = (row, col)
+
+            if col <= _TABLE_LAST_COL:
+                if text == _HEADER_MARK and (header_row is None or row < header_row):
+                    header_row = row
+                if _TOTAL_MARK in lowered:
+                    total_rows.add(row)
+
+        layout = cls(
+            merged=MergedCellIndex(sheet),
+            customer_cell=customer,
+            address_cell=address,
+            header_row=header_row,
+        )
+        layout.total_row = min((row for row in total_rows if row >= layout.start_row), default=None)
+        return layout
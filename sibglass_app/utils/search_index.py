@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import re
+from typing import Iterable
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_search_text(text: str) -> str:
+    return _SPACES.sub(" ", text.strip()).casefold()
+
+
+class NgramIndex:
+    """Поиск строк по подстроке без перебора всего списка.
+
+    Индексируются все n-граммы длиной до GRAM символов. Запрос не длиннее GRAM
+    находится одним обращением к словарю; для длинного запроса пересекаются
+    наборы его n-грамм, а совпадение проверяется только у оставшихся кандидатов.
+    """
+
+    GRAM = 3
+
+    def __init__(self, values: Iterable[str] = ()) -> None:
+        self._values: list[str] = []
+        self._keys: list[str] = []
+        self._positions: dict[str, int] = {}
+        self._grams: dict[str, set[int]] = {}
+        for value in values:
+            self.add(value)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, value: str) -> bool:
+        if value in self._positions:
+            return False
+        position = len(self._values)
+        key = normalize_search_text(value)
+        self._positions[value] = position
+        self._values.append(value)
+        self._keys.append(key)
+        for size in range(1, self.GRAM + 1):
+            for start in range(len(key) - size + 1):
+                self._grams.setdefault(key[start:start + size], set()).add(position)
+        return True
+
+    def search(self, query: str, limit: int | None = None) -> list[str]:
+        """Значения, содержащие query; сначала начинающиеся с него, внутри групп — в порядке добавления."""
+        key = normalize_search_text(query)
+        if not key:
+            return self._values[:limit]
+
+        if len(key) <= self.GRAM:
+            candidates = self._grams.get(key, set())
+        else:
+            postings = sorted(
+                (self._grams.get(key[start:start + self.GRAM], set()) for start in range(len(key) - self.GRAM + 1)),
+                key=len,
+            )
+            candidates = set.intersection(*postings)
+
+        prefixed: list[int] = []
+        contained: list[int] = []
+        for position in sorted(candidates):
+            item_key = self._keys[position]
+            if item_key.startswith(key):
+                prefixed.append(position)
+            elif key in item_key:
+                contained.append(position)
+        return [self._values[position] for position in (prefixed + contained)[:limit]]
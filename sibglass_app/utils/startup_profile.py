@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+# Порядок импорта при запуске GUI: каждый модуль замеряется вместе с еще не загруженными зависимостями
+STARTUP_MODULES = (
+    "PySide6.QtCore",
+    "PySide6.QtWidgets",
+    "sibglass_app.views.main_window",
+    "sibglass_app.repositories.excel_repository",
+    "sibglass_app.services.generation_service",
+    "sibglass_app.controllers.main_controller",
+    "sibglass_app.app",
+)
+
+
+@dataclass
+class StartupRecord:
+    kind: str
+    name: str
+    seconds: float
+    new_modules: int
+    thread: str
+
+
+class StartupProfile:
+    """Замер запуска приложения (--startup-profile): импорты и шаги инициализации."""
+
+    def __init__(self) -> None:
+        self._origin = time.perf_counter()
+        self._records: list[StartupRecord] = []
+        self._marks: list[tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, kind: str, name: str) -> Iterator[None]:
+        loaded = len(sys.modules)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = StartupRecord(
+                kind=kind,
+                name=name,
+                seconds=time.perf_counter() - started,
+                new_modules=len(sys.modules) - loaded,
+                thread=threading.current_thread().name,
+            )
+            with self._lock:
+                self._records.append(record)
+
+    def import_module(self, name: str) -> None:
+        with self.measure("import", name):
+            importlib.import_module(name)
+
+    def mark(self, name: str) -> None:
+        """Момент от начала замера, например показ окна."""
+        with self._lock:
+            self._marks.append((name, time.perf_counter() - self._origin))
+
+    def report(self) -> str:
+        with self._lock:
+            records, marks = list(self._records), list(self._marks)
+        lines = ["Профиль запуска:", f"{'этап':<8} {'модуль/шаг':<46} {'мс':>9} {'модулей':>8}  поток"]
+        for record in records:
+            lines.append(
+                f"{record.kind:<8} {record.name:<46} {record.seconds * 1000:>9.1f} {record.new_modules:>8}  {record.thread}"
+            )
+        for name, seconds in marks:
+            lines.append(f"{'отметка':<8} {name:<46} {seconds * 1000:>9.1f}")
+        heavy = [name for name in ("openpyxl", "xlrd", "pandas") if name in sys.modules]
+        lines.append(f"Загружено модулей: {len(sys.modules)}; тяжелые библиотеки: {', '.join(heavy) or 'нет'}")
+        return "\n".join(lines)
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import re
+
+_CELL_REF = re.compile(r"^(\$?)([A-Za-z]{1,3})(\$?)(\d+)$")
+_RANGE_ON_SHEET = r"\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?"
+# Ссылка на ячейку внутри формулы: не часть имени или функции (LOG10().
+# Ссылка на другой лист ('Лист 2'!A1:B2, Other!A1) захватывается целиком вместе с обоими
+# концами диапазона и остается как есть; &apos; — кавычки в тексте формулы внутри XML листа
+_FORMULA_REF = re.compile(
+    r"(?P<other>(?:'(?:[^']|'')+'|&apos;(?:(?!&apos;).)+&apos;|[\w.]+)!" + _RANGE_ON_SHEET + r")"
+    r"|(?<![A-Za-z0-9_.!$'\"])(\$?)([A-Z]{1,3})(\$?)(\d+)(?![A-Za-z0-9_(!])"
+)
+_STRING_LITERAL = re.compile(r'("(?:[^"]|"")*")')
+
+
+def xml_escape(text: str, quote: bool = False) -> str:
+    # Замена xml.sax.saxutils.escape: тот тянет за собой urllib и http.client (~50 мс при старте)
+    text = text.replace("&", "&amp;").replace(">", "&gt;").replace("<", "&lt;")
+    if quote:
+        text = text.replace('"', "&quot;").replace("'", "&apos;")
+    return text
+
+
+def column_index(letters: str) -> int:
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + (ord(char) - 64)
+    return index
+
+
+def column_letter(index: int) -> str:
+    letters = ""
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def split_cell_ref(ref: str) -> tuple[int, int]:
+    match = _CELL_REF.match(ref)
+    if not match:
+        raise ValueError(f"Некорректный адрес ячейки: {ref}")
+    return int(match.group(4)), column_index(match.group(2))
+
+
+def cell_ref(row: int, col: int) -> str:
+    return f"{column_letter(col)}{row}"
+
+
+def _shift_row(row: int, from_row: int, delta: int) -> int:
+    return row + delta if row >= from_row else row
+
+
+def shift_range_ref(ref: str, from_row: int, delta: int) -> str:
+    """Сдвигает строки >= from_row на delta в адресе вида "A1" или "A1:H5"."""
+    parts = []
+    for part in ref.split(":"):
+        match = _CELL_REF.match(part)
+        if not match:
+            parts.append(part)
+            continue
+        col_abs, letters, row_abs, row = match.groups()
+        parts.append(f"{col_abs}{letters}{row_abs}{_shift_row(int(row), from_row, delta)}")
+    return ":".join(parts)
+
+
+def shift_sqref(sqref: str, from_row: int, delta: int) -> str:
+    return " ".join(shift_range_ref(ref, from_row, delta) for ref in sqref.split())
+
+
+def shift_formula_rows(formula: str, from_row: int, delta: int) -> str:
+    """Сдвигает ссылки на строки текущего листа так же, как Excel при вставке/удалении строк.
+
+    Ссылки на другие листы и текст в строковых литералах не трогаются.
+    """
+    if not delta:
+        return formula
+
+    def replace(match: re.Match) -> str:
+        if match.group("other"):
+            return match.group("other")
+        col_abs, letters, row_abs, row = match.group(2, 3, 4, 5)
+        return f"{col_abs}{letters}{row_abs}{_shift_row(int(row), from_row, delta)}"
+
+    chunks = _STRING_LITERAL.split(formula)
+    for idx in range(0, len(chunks), 2):
+        chunks[idx] = _FORMULA_REF.sub(replace, chunks[idx])
+    return "".join(chunks)
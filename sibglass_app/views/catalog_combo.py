@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from PySide6.QtCore import QStringListModel, Qt
+from PySide6.QtWidgets import QComboBox, QCompleter
+
+from sibglass_app.utils.search_index import NgramIndex
+
+
+class CatalogComboBox(QComboBox):
+    """Список выбора из справочника с поиском по подстроке.
+
+    Подсказки берутся из NgramIndex, а не фильтром QCompleter по всей модели;
+    ввести значение вне справочника нельзя — при уходе из поля текст
+    возвращается к выбранному пункту.
+    """
+
+    COMPLETION_LIMIT = 50
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setEditable(True)
+        self.setInsertPolicy(QComboBox.NoInsert)
+        self._index = NgramIndex()
+
+        self._completion_model = QStringListModel(self)
+        self._completer = QCompleter(self._completion_model, self)
+        # Список уже отфильтрован индексом — повторная фильтрация QCompleter не нужна
+        self._completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self._completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self.lineEdit().setCompleter(self._completer)
+
+        self._completer.activated.connect(self._select_text)
+        self.lineEdit().textEdited.connect(self._update_completions)
+        self.lineEdit().editingFinished.connect(self._restore_if_unknown)
+
+    def set_values(self, values: Iterable[str]) -> None:
+        self._index = NgramIndex(values)
+        self.clear()
+        self.addItems(self._index.search(""))
+
+    def add_value(self, value: str) -> None:
+        if self._index.add(value):
+            self.addItem(value)
+
+    def _update_completions(self, text: str) -> None:
+        self._completion_model.setStringList(self._index.search(text, self.COMPLETION_LIMIT))
+        if text:
+            self._completer.complete()
+
+    def _select_text(self, text: str) -> None:
+        idx = self.findText(text)
+        if idx >= 0:
+            self.setCurrentIndex(idx)
+            # Индекс мог не измениться, а текст в поле уже отредактирован
+            self.setEditText(text)
+
+    def _restore_if_unknown(self) -> None:
+        if self.findText(self.currentText()) < 0:
+            self.setEditText(self.itemText(self.currentIndex()) if self.currentIndex() >= 0 else "")
@@ -1,55 +1,147 @@
 from __future__ import annotations
 
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QColor
-from PySide6.QtWidgets import QHeaderView, QTableWidget, QTableWidgetItem
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal
+from PySide6.QtGui import QBrush, QColor, QPalette
+from PySide6.QtWidgets import QHeaderView, QStyledItemDelegate, QTableView
 
 from sibglass_app.models.formula_item import FormulaRowState
 
+MODIFIED_ROLE = Qt.UserRole + 1
+
+_MODIFIED_COLOR = QColor("#fff59d")
+_RESOLVED_COLOR = QColor("white")
+_TEXT_COLOR = QColor("black")
+
+
+class FormulaTableModel(QAbstractTableModel):
+    """Формулы заявки: состояние строк хранится в списках, признаки изменения — отдельными полями."""
 
-class FormulaTableWidget(QTableWidget):
     HEADERS = ["Исходная формула", "Итоговая формула"]
+    SOURCE_COLUMN = 0
+    RESOLVED_COLUMN = 1
+
+    # Строка изменена пользователем в таблице
+    edited = Signal(int)
 
     def __init__(self, parent=None) -> None:
-        super().__init__(0, len(self.HEADERS), parent)
-        self.setHorizontalHeaderLabels(self.HEADERS)
-        self.setColumnWidth(0, 360)
-        self.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
-        self.itemChanged.connect(self._on_item_changed)
-        self._updating = False
+        super().__init__(parent)
+        self._sources: list[str] = []
+        self._resolved: list[str] = []
+        self._modified: list[bool] = []
+        # Правка руками: такие строки автоматическое обновление не трогает
+        self._manual: list[bool] = []
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._sources)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self._sources[row] if index.column() == self.SOURCE_COLUMN else self._resolved[row]
+        if role == MODIFIED_ROLE:
+            return self._modified[row]
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == self.RESOLVED_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.EditRole) -> bool:
+        if not index.isValid() or role != Qt.EditRole or index.column() != self.RESOLVED_COLUMN:
+            return False
+        row = index.row()
+        text = str(value or "")
+        if text == self._resolved[row]:
+            return True
+        self._resolved[row] = text
+        self._modified[row] = True
+        self._manual[row] = True
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole, MODIFIED_ROLE])
+        self.edited.emit(row)
+        return True
 
     def set_rows(self, rows: list[FormulaRowState]) -> None:
-        self._updating = True
-        self.setRowCount(len(rows))
-        for row_idx, row in enumerate(rows):
-            source_item = QTableWidgetItem(row.source_formula)
-            source_item.setFlags(source_item.flags() & ~Qt.ItemIsEditable)
-
-            target_item = QTableWidgetItem(row.resolved_formula)
-            target_item.setForeground(QColor("black"))
-
-            self.setItem(row_idx, 0, source_item)
-            self.setItem(row_idx, 1, target_item)
-            self._apply_highlight(row_idx, row.modified)
-        self._updating = False
-
-    def collect_rows(self) -> list[FormulaRowState]:
-        rows: list[FormulaRowState] = []
-        for row in range(self.rowCount()):
-            source = self.item(row, 0).text().strip()
-            resolved = self.item(row, 1).text().strip()
-            modified = self.item(row, 1).background().color() == QColor("#fff59d")
-            rows.append(FormulaRowState(source_formula=source, resolved_formula=resolved, modified=modified))
-        return rows
-
-    def _on_item_changed(self, item: QTableWidgetItem) -> None:
-        if self._updating or item.column() != 1:
+        self.beginResetModel()
+        self._sources = [row.source_formula for row in rows]
+        self._resolved = [row.resolved_formula for row in rows]
+        self._modified = [row.modified for row in rows]
+        self._manual = [False] * len(rows)
+        self.endResetModel()
+
+    def auto_rows(self) -> list[tuple[int, str]]:
+        """(номер строки, исходная формула) для строк, не исправленных вручную."""
+        return [(row, source) for row, (source, manual) in enumerate(zip(self._sources, self._manual)) if not manual]
+
+    def resolved_formula(self, row: int) -> str:
+        return self._resolved[row]
+
+    def update_resolved(self, updates: dict[int, str]) -> None:
+        """Обновляет итоговые формулы строк; dataChanged — по одному на каждый непрерывный блок строк."""
+        if not updates:
             return
-        item.setForeground(QColor("black"))
-        self._apply_highlight(item.row(), True)
-
-    def _apply_highlight(self, row: int, modified: bool) -> None:
-        color = QColor("#fff59d") if modified else QColor("white")
-        if self.item(row, 1):
-            self.item(row, 1).setBackground(color)
-            self.item(row, 1).setForeground(QColor("black"))
+        for row, value in updates.items():
+            self._resolved[row] = value
+            self._modified[row] = True
+
+        rows = sorted(updates)
+        start = previous = rows[0]
+        for row in rows[1:] + [None]:
+            if row is not None and row == previous + 1:
+                previous = row
+                continue
+            self.dataChanged.emit(
+                self.index(start, self.RESOLVED_COLUMN),
+                self.index(previous, self.RESOLVED_COLUMN),
+                [Qt.DisplayRole, Qt.EditRole, MODIFIED_ROLE],
+            )
+            if row is not None:
+                start = previous = row
+
+    def rows(self) -> list[FormulaRowState]:
+        return [
+            FormulaRowState(source_formula=source.strip(), resolved_formula=resolved.strip(), modified=modified)
+            for source, resolved, modified in zip(self._sources, self._resolved, self._modified)
+        ]
+
+    def resolved_map(self) -> dict[str, str]:
+        resolved_map: dict[str, str] = {}
+        for source, resolved in zip(self._sources, self._resolved):
+            resolved = resolved.strip()
+            if resolved:
+                resolved_map[source.strip()] = resolved
+        return resolved_map
+
+
+class FormulaItemDelegate(QStyledItemDelegate):
+    """Подсветка итоговых формул, измененных вручную или при обновлении."""
+
+    def initStyleOption(self, option, index: QModelIndex) -> None:
+        super().initStyleOption(option, index)
+        if index.column() != FormulaTableModel.RESOLVED_COLUMN:
+            return
+        modified = index.data(MODIFIED_ROLE)
+        option.backgroundBrush = QBrush(_MODIFIED_COLOR if modified else _RESOLVED_COLOR)
+        option.palette.setColor(QPalette.Text, _TEXT_COLOR)
+
+
+class FormulaTableView(QTableView):
+    def __init__(self, model: FormulaTableModel, parent=None) -> None:
+        super().__init__(parent)
+        self.setModel(model)
+        self.setItemDelegate(FormulaItemDelegate(self))
+        self.setColumnWidth(FormulaTableModel.SOURCE_COLUMN, 360)
+        self.horizontalHeader().setSectionResizeMode(FormulaTableModel.RESOLVED_COLUMN, QHeaderView.Stretch)
+        # Фиксированная высота строк: виду не нужно измерять содержимое каждой строки
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
@@ -21,7 +21,8 @@ from PySide6.QtWidgets import (
     QFileDialog,
 )
 
-from sibglass_app.views.formula_table import FormulaTableWidget
+from sibglass_app.views.catalog_combo import CatalogComboBox
+from sibglass_app.views.formula_table import FormulaTableModel, FormulaTableView
 
 
 class MainWindow(QMainWindow):
@@ -61,10 +62,10 @@ class MainWindow(QMainWindow):
         self.zak_inner = QCheckBox("Зак", self)
         self.argon = QCheckBox("Арг", self)
 
-        self.outer_combo = QComboBox(self)
-        self.middle_combo = QComboBox(self)
-        self.inner_combo = QComboBox(self)
-        self.spacer_combo = QComboBox(self)
+        self.outer_combo = CatalogComboBox(self)
+        self.middle_combo = CatalogComboBox(self)
+        self.inner_combo = CatalogComboBox(self)
+        self.spacer_combo = CatalogComboBox(self)
 
         self.manual_outer_btn = QPushButton("Ручной ввод", self)
         self.manual_middle_btn = QPushButton("Ручной ввод", self)
@@ -79,7 +80,8 @@ class MainWindow(QMainWindow):
         self._add_option_row(options_grid, 3, "Рамка", self.argon, self.spacer_combo, self.manual_spacer_btn)
         main_layout.addWidget(options_box)
 
-        self.formula_table = FormulaTableWidget(self)
+        self.formula_model = FormulaTableModel(self)
+        self.formula_table = FormulaTableView(self.formula_model, self)
         formulas_header = QHBoxLayout()
         formulas_header.addWidget(QLabel("Найденные формулы", self))
         formulas_header.addStretch(1)
@@ -91,8 +93,11 @@ class MainWindow(QMainWindow):
         bottom_row = QHBoxLayout()
         self.open_glass_btn = QPushButton("Открыть список стекол", self)
         self.save_btn = QPushButton("Сохранить заявку", self)
+        self.cancel_btn = QPushButton("Отмена", self)
+        self.cancel_btn.setEnabled(False)
         bottom_row.addWidget(self.open_glass_btn)
         bottom_row.addStretch(1)
+        bottom_row.addWidget(self.cancel_btn)
         bottom_row.addWidget(self.save_btn)
         main_layout.addLayout(bottom_row)
 
@@ -143,4 +148,37 @@ class MainWindow(QMainWindow):
             self.refresh_formula_btn,
         ]:
             widget.setDisabled(busy)
-        self.setCursor(Qt.WaitCursor if busy else Qt.ArrowCursor)
+        self.cancel_btn.setEnabled(busy)
+        self.setCursor(Qt.BusyCursor if busy else Qt.ArrowCursor)
+
+    def set_loading(self, loading: bool) -> None:
+        # Пока читаются настройки и справочник, недоступно все, что от них зависит; поля ввода работают
+        for widget in [
+            self.select_alupro_btn,
+            self.select_sibglass_btn,
+            self.save_btn,
+            self.outer_combo,
+            self.middle_combo,
+            self.inner_combo,
+            self.spacer_combo,
+            self.manual_outer_btn,
+            self.manual_middle_btn,
+            self.manual_inner_btn,
+            self.manual_spacer_btn,
+            self.open_glass_btn,
+            self.refresh_formula_btn,
+        ]:
+            widget.setDisabled(loading)
+        if loading:
+            self.progress_bar.setRange(0, 0)
+            self.progress_bar.setFormat("Загрузка справочника стекол и настроек...")
+        else:
+            self.progress_bar.setRange(0, 100)
+            self.set_progress(0)
+
+    def show_status(self, text: str) -> None:
+        self.statusBar().showMessage(text)
+
+    def set_progress(self, value: int, text: str = "") -> None:
+        self.progress_bar.setFormat(f"{text} — %p%" if text else "%p%")
+        self.progress_bar.setValue(value)
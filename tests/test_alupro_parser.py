@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import pytest
+
+from sibglass_app.repositories.excel_repository import ExcelRepository, _xls_cell_text
+from sibglass_app.services.alupro_parser import AluProParserService
+
+_HEADER = ["№", "Наименование", "Примечание", "Ширина", "Высота", "Кол-во"]
+
+
+def _parse_formula(name: str, note: str, index: str = "1") -> str:
+    rows = [_HEADER, [index, name, note, "700", "800", "2"], ["", "Сумма:", "", "", "", ""]]
+    (item,) = AluProParserService(ExcelRepository()).parse_rows(rows)
+    assert (item.width, item.height, item.count) == (700, 800, 2)
+    return item.formula
+
+
+@pytest.mark.parametrize(
+    ("name", "note", "index", "expected"),
+    [
+        # Как и раньше: формула из "Наименование", если это лучший кандидат строки
+        ("4М1-16Ar-4", "", "1", "4М1-16Ar-4"),
+        # Как и раньше: "Наименование" без формулы — берется лучший кандидат остальной строки
+        ("Стеклопакет", "4-16-4", "1", "4-16-4"),
+        ("", "4-10-4-10-4", "7", "4-10-4-10-4"),
+    ],
+)
+def test_table_formula_same_as_before(name: str, note: str, index: str, expected: str) -> None:
+    assert _parse_formula(name, note, index) == expected
+
+
+@pytest.mark.parametrize(
+    ("name", "note", "index", "expected", "before"),
+    [
+        # Номер позиции 5..24 раньше выигрывал у однокамерной формулы
+        ("6", "", "13", "6", "13"),
+        # Более длинная формула в соседней колонке раньше вытесняла "Наименование"
+        ("4-16-4", "4-16-4-16-4 замена", "1", "4-16-4", "4-16-4-16-4 замена"),
+    ],
+)
+def test_table_formula_prefers_name_column(name: str, note: str, index: str, expected: str, before: str) -> None:
+    formula = _parse_formula(name, note, index)
+    assert formula == expected
+    # Прежний выбор: максимум по всей строке вместе с "Наименование"
+    assert AluProParserService._extract_formula([name, index, name, note]) == before
+
+
+@pytest.mark.parametrize(("value", "text"), [(6.0, "6"), (13.0, "13"), (4.5, "4.5"), (" 4-16-4 ", "4-16-4"), ("", "")])
+def test_xls_numbers_read_like_xlsx(value, text: str) -> None:
+    assert _xls_cell_text(value) == text
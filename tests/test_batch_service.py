@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from benchmarks.synthetic import LAYOUT_HEADER, write_alupro_export, write_template
+from sibglass_app.services.batch_service import BatchConverterService, BatchJob, GlassOptions, convert_file
+
+
+def _touch(directory: Path, *names: str) -> None:
+    for name in names:
+        (directory / name).write_bytes(b"")
+
+
+def _outputs(jobs) -> list[str]:
+    return sorted(Path(job.output_path).name for job in jobs)
+
+
+def test_plan_jobs_names_outputs_by_stem(tmp_path: Path) -> None:
+    _touch(tmp_path, "a.xlsx", "b.xls", "template.xlsx")
+    jobs = BatchConverterService().plan_jobs(
+        str(tmp_path), str(tmp_path / "template.xlsx"), str(tmp_path / "out"), GlassOptions()
+    )
+    assert _outputs(jobs) == ["a.xlsx", "b.xlsx"]
+
+
+def test_plan_jobs_keeps_suffix_for_same_stem(tmp_path: Path) -> None:
+    _touch(tmp_path, "a.xls", "a.xlsx", "template.xlsx")
+    jobs = BatchConverterService().plan_jobs(
+        str(tmp_path), str(tmp_path / "template.xlsx"), str(tmp_path / "out"), GlassOptions()
+    )
+    assert _outputs(jobs) == ["a_xls.xlsx", "a_xlsx.xlsx"]
+
+
+def test_plan_jobs_refuses_to_overwrite_source(tmp_path: Path) -> None:
+    _touch(tmp_path, "a.xlsx", "template.xlsx")
+    with pytest.raises(ValueError, match="перезаписал бы исходный файл"):
+        BatchConverterService().plan_jobs(str(tmp_path), str(tmp_path / "template.xlsx"), str(tmp_path), GlassOptions())
+
+
+def test_plan_jobs_refuses_duplicate_outputs(tmp_path: Path) -> None:
+    _touch(tmp_path, "a.xls", "a.xlsx", "a_xls.xlsx", "template.xlsx")
+    with pytest.raises(ValueError, match="один и тот же результат"):
+        BatchConverterService().plan_jobs(
+            str(tmp_path), str(tmp_path / "template.xlsx"), str(tmp_path / "out"), GlassOptions()
+        )
+
+
+def test_convert_file_parses_the_export_once(tmp_path: Path) -> None:
+    source = write_alupro_export(tmp_path / "a.xlsx", LAYOUT_HEADER, 20)
+    template = write_template(tmp_path / "template.xlsx", existing_rows=3, footer_rows=5)
+    job = BatchJob(str(source), str(template), str(tmp_path / "out" / "a.xlsx"), GlassOptions(outer="4М1"))
+
+    result = convert_file(job)
+
+    assert result.ok, result.error
+    phases = [phase["name"] for phase in result.metrics["phases"]]
+    assert phases.count("parse") == 1
+    assert result.metrics["items"] == 20
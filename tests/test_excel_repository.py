@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import re
+import zipfile
+from pathlib import Path
+
+from openpyxl import Workbook
+
+from sibglass_app.repositories.excel_repository import ExcelRepository
+
+
+def _export_with_stale_dimension(path: Path) -> str:
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet["A1"] = "Формула"
+    sheet["B1"] = "Ширина"
+    sheet["A10"] = "4-16-4"
+    sheet["E10"] = 700
+    workbook.save(path)
+
+    # Выгрузки AluPro иногда оставляют <dimension> от исходного диапазона
+    with zipfile.ZipFile(path) as source:
+        entries = {info.filename: source.read(info) for info in source.infolist()}
+    sheet_xml = entries["xl/worksheets/sheet1.xml"].decode("utf-8")
+    entries["xl/worksheets/sheet1.xml"] = re.sub(r'<dimension ref="[^"]*"', '<dimension ref="A1:B2"', sheet_xml).encode("utf-8")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as target:
+        for name, data in entries.items():
+            target.writestr(name, data)
+    return str(path)
+
+
+def test_iter_rows_ignores_stale_dimension(tmp_path: Path) -> None:
+    path = _export_with_stale_dimension(tmp_path / "export.xlsx")
+
+    rows = [row for row in ExcelRepository().iter_rows(path) if any(row)]
+
+    assert rows[0][:2] == ["Формула", "Ширина"]
+    assert rows[-1] == ["4-16-4", "", "", "", "700"]
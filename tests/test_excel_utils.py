@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.formatting.rule import FormulaRule
+
+from sibglass_app.models.order_item import OrderItem
+from sibglass_app.services.xlsx_stream_writer import XlsxStreamWriter
+from sibglass_app.utils.excel_utils import shift_rows
+
+
+def _template() -> Workbook:
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Заявка"
+    workbook.create_sheet("Прайс")
+    workbook.create_sheet("Лист 2")
+    sheet.cell(13, 1, "№")
+    sheet.cell(14, 1, 1)
+    sheet.cell(17, 1, "ВСЕГО")
+    sheet.cell(17, 6, "=SUM(F14:F16)")
+    # Подвал ссылается и на свой лист, и на другие: чужие диапазоны сдвигаться не должны
+    sheet.cell(20, 2, "=SUM(Прайс!A14:B30)+F17")
+    sheet.cell(21, 2, "=SUM('Лист 2'!A14:A30)*2")
+    sheet.merge_cells("A20:A21")
+    sheet.conditional_formatting.add("F17", FormulaRule(formula=["Прайс!$A$20>F17"]))
+    return workbook
+
+
+def test_shift_rows_moves_footer_and_keeps_cross_sheet_formulas() -> None:
+    workbook = _template()
+    sheet = workbook["Заявка"]
+
+    shift_rows(sheet, 17, 5)
+
+    assert sheet.cell(22, 1).value == "ВСЕГО"
+    assert sheet.cell(22, 6).value == "=SUM(F14:F16)"
+    assert sheet.cell(25, 2).value == "=SUM(Прайс!A14:B30)+F22"
+    assert sheet.cell(26, 2).value == "=SUM('Лист 2'!A14:A30)*2"
+    assert [str(merged) for merged in sheet.merged_cells.ranges] == ["A25:A26"]
+    (conditional,) = list(sheet.conditional_formatting)
+    assert str(conditional.sqref) == "F22"
+    assert conditional.rules[0].formula == ["Прайс!$A$20>F22"]
+
+
+def test_shift_rows_delete_block() -> None:
+    workbook = _template()
+    sheet = workbook["Заявка"]
+
+    shift_rows(sheet, 17, -2)
+
+    assert sheet.cell(15, 1).value == "ВСЕГО"
+    assert sheet.cell(18, 2).value == "=SUM(Прайс!A14:B30)+F15"
+    assert sheet.cell(19, 2).value == "=SUM('Лист 2'!A14:A30)*2"
+
+
+def test_stream_writer_keeps_cross_sheet_formulas(tmp_path) -> None:
+    template = tmp_path / "template.xlsx"
+    output = tmp_path / "output.xlsx"
+    _template().save(template)
+    items = [OrderItem(index=i + 1, formula="4-16-4", width=700, height=800, count=1) for i in range(8)]
+
+    XlsxStreamWriter().write_file(str(template), str(output), customer="Заказчик", address="Адрес", items=items)
+
+    sheet = load_workbook(output)["Заявка"]
+    footer = {cell.value for row in sheet.iter_rows(min_row=18) for cell in row if isinstance(cell.value, str)}
+    assert any(value.startswith("=SUM(Прайс!A14:B30)+F") for value in footer)
+    assert "=SUM('Лист 2'!A14:A30)*2" in footer
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from sibglass_app.repositories import glass_file_repository
+from sibglass_app.repositories.glass_file_repository import GlassFileRepository
+from sibglass_app.services.glass_catalog_service import GlassCatalogService
+
+
+@pytest.fixture
+def service(tmp_path: Path, monkeypatch) -> GlassCatalogService:
+    glass_file = tmp_path / "glass.txt"
+    glass_file.write_text("Стекло наружное:\n4М1\n", encoding="utf-8")
+    monkeypatch.setattr(glass_file_repository, "GLASS_FILE", glass_file)
+    service = GlassCatalogService(GlassFileRepository())
+    service.load_or_empty()
+    return service
+
+
+def test_add_value_appends_to_file(service: GlassCatalogService) -> None:
+    assert service.add_value("outer_glass", "6М1")
+
+    assert list(service.catalog.outer_glass) == ["4М1", "6М1"]
+    assert list(GlassFileRepository().load().outer_glass) == ["4М1", "6М1"]
+
+
+def test_failed_append_leaves_catalog_unchanged(service: GlassCatalogService, monkeypatch) -> None:
+    def fail(*args) -> None:
+        raise OSError("Диск переполнен")
+
+    monkeypatch.setattr(GlassFileRepository, "append", fail)
+
+    with pytest.raises(OSError):
+        service.add_value("outer_glass", "6М1")
+
+    assert list(service.catalog.outer_glass) == ["4М1"]
+    assert list(GlassFileRepository().load().outer_glass) == ["4М1"]
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from openpyxl import Workbook
+
+from sibglass_app.repositories.template_pool import TemplatePool
+
+
+def _template(path: Path) -> str:
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet["A1"] = "ЗАЯВКА"
+    sheet.column_dimensions["C"].width = 31
+    sheet.row_dimensions[20].height = 42
+    workbook.save(path)
+    return str(path)
+
+
+def test_checkout_copy_keeps_dimensions(tmp_path: Path) -> None:
+    pool = TemplatePool()
+    template = _template(tmp_path / "template.xlsx")
+    pool.checkout(template)
+
+    sheet = pool.checkout(template).active
+
+    assert pool.stats.hits == 1
+    assert sheet.column_dimensions["C"].width == 31
+    assert sheet.row_dimensions[20].height == 42
+    assert sheet.row_dimensions.worksheet is sheet
+    # Как и у загруженной книги, обращение к новой строке создает ее размеры
+    assert sheet.row_dimensions[500].height is None
+
+
+def test_remembered_workbook_survives_saving_over_template(tmp_path: Path) -> None:
+    pool = TemplatePool()
+    template = _template(tmp_path / "template.xlsx")
+    for order in range(3):
+        workbook = pool.checkout(template)
+        workbook.active["B2"] = f"Заявка {order}"
+        workbook.save(template)
+        pool.remember(template, workbook)
+
+    assert pool.checkout(template).active["B2"].value == "Заявка 2"
+    assert (pool.stats.hits, pool.stats.misses) == (3, 1)
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from sibglass_app.repositories import workbook_cache
+from sibglass_app.repositories.workbook_cache import WorkbookCache
+
+
+def test_hit_does_not_rehash_unchanged_file(tmp_path: Path, monkeypatch) -> None:
+    path = tmp_path / "export.xlsx"
+    path.write_bytes(b"first")
+    hashed: list[str] = []
+    original = workbook_cache.fingerprint_file
+    monkeypatch.setattr(workbook_cache, "fingerprint_file", lambda name: hashed.append(name) or original(name))
+    cache = WorkbookCache()
+
+    assert cache.get_or_load(str(path), "rows", lambda: 1) == 1
+    assert cache.get_or_load(str(path), "rows", lambda: 2) == 1
+    assert cache.get_or_load(str(path), "formulas", lambda: 3) == 3
+    assert len(hashed) == 1
+
+    path.write_bytes(b"second")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cache.get_or_load(str(path), "rows", lambda: 4) == 4
+    assert len(hashed) == 2
+    assert cache.stats.hits == 1
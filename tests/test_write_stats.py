@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import pytest
+from openpyxl import load_workbook
+
+from benchmarks.synthetic import build_items, write_template
+from sibglass_app.services.sibglass_writer import SibglassWriterService, WriteStats
+from sibglass_app.services.xlsx_stream_writer import XlsxStreamWriter
+
+
+@pytest.mark.parametrize("count", [0, 2, 40])
+def test_writers_report_the_same_cells(tmp_path, count: int) -> None:
+    template = write_template(tmp_path / "template.xlsx", existing_rows=3, footer_rows=10, merges_per_row=4)
+    items = build_items(count)
+
+    openpyxl_stats = SibglassWriterService().write(load_workbook(template), "Заказчик", "Адрес", items)
+    stream_stats = XlsxStreamWriter().write_file(
+        str(template), str(tmp_path / "output.xlsx"), customer="Заказчик", address="Адрес", items=items
+    )
+
+    # Заказчик, адрес и три итога; 8 ячеек на позицию; подвал — "ВСЕГО" и 10 примечаний
+    expected = WriteStats(values=5 + 8 * count, styled=3 + 8 * count, moved=11 if count != 3 else 0)
+    assert openpyxl_stats == expected
+    assert stream_stats == expected
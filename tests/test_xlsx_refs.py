@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import pytest
+
+from sibglass_app.utils.xlsx_refs import shift_formula_rows, shift_range_ref, shift_sqref
+
+
+@pytest.mark.parametrize(
+    ("formula", "expected"),
+    [
+        # Ссылки текущего листа: строки от from_row сдвигаются, выше — нет
+        ("=SUM(A20:B30)", "=SUM(A25:B35)"),
+        ("=A17+A18", "=A17+A23"),
+        ("=SUM(A15:A20)", "=SUM(A15:A25)"),
+        # Абсолютные ссылки сдвигаются так же, знаки $ сохраняются
+        ("=$A$20+A$19+$B21", "=$A$25+A$24+$B26"),
+        # Имена функций с цифрами не являются ссылками
+        ("=LOG10(A20)", "=LOG10(A25)"),
+    ],
+)
+def test_shift_formula_rows_same_sheet(formula: str, expected: str) -> None:
+    assert shift_formula_rows(formula, 18, 5) == expected
+
+
+@pytest.mark.parametrize(
+    ("formula", "expected"),
+    [
+        ("=SUM(Other!A20:B30)", "=SUM(Other!A20:B30)"),
+        ("=Other!$A$20*2", "=Other!$A$20*2"),
+        ("=Лист2!A20+A20", "=Лист2!A20+A25"),
+        ("=SUM('Лист 2'!A20:A30)+A20", "=SUM('Лист 2'!A20:A30)+A25"),
+        ("='It''s'!A20:B30*C30", "='It''s'!A20:B30*C35"),
+        # Текст формулы из XML листа: кавычки имени листа экранированы
+        ("=SUM(&apos;Лист 2&apos;!A20:A30)+A20", "=SUM(&apos;Лист 2&apos;!A20:A30)+A25"),
+    ],
+)
+def test_shift_formula_rows_keeps_other_sheets(formula: str, expected: str) -> None:
+    assert shift_formula_rows(formula, 18, 5) == expected
+
+
+def test_shift_formula_rows_keeps_string_literals() -> None:
+    assert shift_formula_rows('="A20"&A20&"B30:""C40"""', 18, 5) == '="A20"&A25&"B30:""C40"""'
+
+
+def test_shift_formula_rows_zero_delta() -> None:
+    assert shift_formula_rows("=Other!A20:B30+A20", 18, 0) == "=Other!A20:B30+A20"
+
+
+def test_shift_range_ref_and_sqref() -> None:
+    assert shift_range_ref("A17:H20", 18, 2) == "A17:H22"
+    assert shift_range_ref("$A$20", 18, 2) == "$A$22"
+    assert shift_sqref("A1:B2 C20:D21", 18, 2) == "A1:B2 C22:D23"
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import re
+import zipfile
+from pathlib import Path
+
+from openpyxl.worksheet.pagebreak import Break
+
+from benchmarks.synthetic import build_items, build_template
+from sibglass_app.services.xlsx_stream_writer import XlsxStreamWriter
+
+_EXT_LST = (
+    '<extLst><ext uri="{78C0D931-6437-407d-A8EE-F0AAD7539E65}" '
+    'xmlns:x14="http://schemas.microsoft.com/office/spreadsheetml/2009/9/main">'
+    '<x14:conditionalFormattings><x14:conditionalFormatting '
+    'xmlns:xm="http://schemas.microsoft.com/office/excel/2006/main">'
+    '<x14:cfRule type="expression" priority="1" id="{00000000-0000-0000-0000-000000000001}">'
+    "<xm:f>$A$20&gt;A2</xm:f></x14:cfRule><xm:sqref>A2 B20:C21</xm:sqref>"
+    "</x14:conditionalFormatting></x14:conditionalFormattings></ext></extLst>"
+)
+
+
+def _replace_entry(path: Path, name: str, edit) -> None:
+    with zipfile.ZipFile(path) as source:
+        entries = {info.filename: source.read(info) for info in source.infolist()}
+    entries[name] = edit(entries[name].decode("utf-8")).encode("utf-8")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as target:
+        for entry, data in entries.items():
+            target.writestr(entry, data)
+
+
+def _template(tmp_path: Path, prepare=None) -> str:
+    # Шаблон: 3 строки таблицы (14–16), "ВСЕГО" в 17-й, подвал с 19-й строки
+    workbook = build_template(existing_rows=3, footer_rows=5, merges_per_row=2)
+    if prepare is not None:
+        prepare(workbook.active)
+    template = tmp_path / "template.xlsx"
+    workbook.save(template)
+    return str(template)
+
+
+def _sheet_xml(path: Path) -> str:
+    with zipfile.ZipFile(path) as archive:
+        return archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+
+
+def _convert(template: str, tmp_path: Path, count: int) -> Path:
+    output = tmp_path / "output.xlsx"
+    XlsxStreamWriter().write_file(template, str(output), customer="Заказчик", address="Адрес", items=build_items(count))
+    return output
+
+
+def test_growing_order_keeps_rows_ascending(tmp_path: Path) -> None:
+    output = _convert(_template(tmp_path), tmp_path, 10)
+
+    rows = [int(value) for value in re.findall(r'<row\b[^>]*\br="(\d+)"', _sheet_xml(output))]
+    assert rows == sorted(set(rows))
+    # Строки заявки 14–23, "ВСЕГО" сдвинулась в 24-ю
+    assert set(range(14, 25)) <= set(rows)
+
+
+def test_only_row_breaks_are_shifted(tmp_path: Path) -> None:
+    def prepare(sheet) -> None:
+        sheet.row_breaks.append(Break(id=20))
+        sheet.col_breaks.append(Break(id=20))
+
+    output = _convert(_template(tmp_path, prepare), tmp_path, 10)
+
+    xml = _sheet_xml(output)
+    assert re.search(r'<rowBreaks\b.*?<brk id="27"', xml, re.S)
+    assert re.search(r'<colBreaks\b.*?<brk id="20"', xml, re.S)
+
+
+def test_ext_lst_ranges_are_shifted(tmp_path: Path) -> None:
+    template = _template(tmp_path)
+    _replace_entry(Path(template), "xl/worksheets/sheet1.xml", lambda xml: xml.replace("</worksheet>", _EXT_LST + "</worksheet>"))
+
+    xml = _sheet_xml(_convert(template, tmp_path, 10))
+
+    assert "<xm:f>$A$27&gt;A2</xm:f>" in xml
+    assert "<xm:sqref>A2 B27:C28</xm:sqref>" in xml
+
+
+def test_calc_pr_element_with_closing_tag(tmp_path: Path) -> None:
+    template = _template(tmp_path)
+    _replace_entry(
+        Path(template),
+        "xl/workbook.xml",
+        lambda xml: re.sub(r"<calcPr\b[^>]*?/>", '<calcPr calcId="124519"></calcPr>', xml),
+    )
+
+    output = _convert(template, tmp_path, 2)
+
+    with zipfile.ZipFile(output) as archive:
+        workbook = archive.read("xl/workbook.xml").decode("utf-8")
+    assert workbook.count("<calcPr") == 1
+    assert '<calcPr calcId="124519" fullCalcOnLoad="1"></calcPr>' in workbook